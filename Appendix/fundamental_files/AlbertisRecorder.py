@@ -2,6 +2,7 @@ import opensees.utils.tcl_input as tclin
 import PyMpc.App
 import PyMpc.Units as u
 import csv
+import json
 import importlib
 
 from PyMpc import *
@@ -323,7 +324,7 @@ def makeXObjectMetaData():
 	at_dT.description = (
 		html_par(html_begin()) +
 		html_par(html_boldtext('dT')+'<br/>') +
-		html_par('Using this option will instruct the recorder to invoke a close on the data handler after every timestep. If this is a file it will close the file on every step and then re-open it for the next step. Note, this greatly slows the execution time, but is useful if you need to monitor the data during the analysis') +
+		html_par('Records the response every deltaT seconds instead of every analysis step.') +
 		html_par(html_href('https://opensees.berkeley.edu/wiki/index.php/Node_Recorder','Node Recorder')+'<br/>') +
 		html_end()
 		)
@@ -336,12 +337,40 @@ def makeXObjectMetaData():
 	at_deltaT.description = (
 		html_par(html_begin()) +
 		html_par(html_boldtext('deltaT')+'<br/>') +
-		html_par('Using this option will instruct the recorder to invoke a close on the data handler after every timestep. If this is a file it will close the file on every step and then re-open it for the next step. Note, this greatly slows the execution time, but is useful if you need to monitor the data during the analysis') +
+		html_par('Time interval of the recorded response, it should be a multiple of the analysis time step.') +
 		html_par(html_href('https://opensees.berkeley.edu/wiki/index.php/Node_Recorder','Node Recorder')+'<br/>') +
 		html_end()
 		)
 	at_deltaT.setDefault(1.0)
 
+	# -compact
+	at_compact = MpcAttributeMetaData()
+	at_compact.type = MpcAttributeType.Boolean
+	at_compact.name = '-compact'
+	at_compact.group = 'Recording Plan'
+	at_compact.description = (
+		html_par(html_begin()) +
+		html_par(html_boldtext('compact')+'<br/>') +
+		html_par('Writes one multi-node recorder per partition instead of one recorder per node, and a recording plan (PartitionsInfo/plan) with the nodes of each recorder and their story and corner.') +
+		html_par(html_href('https://opensees.berkeley.edu/wiki/index.php/Node_Recorder','Node Recorder')+'<br/>') +
+		html_end()
+		)
+	at_compact.setDefault(True)
+
+	# -corners
+	at_corners = MpcAttributeMetaData()
+	at_corners.type = MpcAttributeType.Boolean
+	at_corners.name = '-corners'
+	at_corners.group = 'Recording Plan'
+	at_corners.description = (
+		html_par(html_begin()) +
+		html_par(html_boldtext('corners')+'<br/>') +
+		html_par('Records only the 4 corner nodes of each story (level of equal z), the nodes used to compute drifts, spectra and base shear.') +
+		html_par(html_href('https://opensees.berkeley.edu/wiki/index.php/Node_Recorder','Node Recorder')+'<br/>') +
+		html_end()
+		)
+	at_corners.setDefault(False)
+
 
 	xom = MpcXObjectMetaData()
 	xom.name = 'AlbertisRecorder'
@@ -380,14 +409,96 @@ def makeXObjectMetaData():
 	xom.addAttribute(at_deltaT)
 	xom.setVisibilityDependency(at_dT, at_deltaT)
 	xom.addAttribute(at_CloseOnWrite)
+	#Recording Plan
+	xom.addAttribute(at_compact)
+	xom.addAttribute(at_corners)
+	xom.setVisibilityDependency(at_compact, at_corners)
 	return xom
 
 def extract_tags(pinfo, domain, tag, xobj):
+	# tag is a set, so each node is added once without searching the previous ones
 	for elem in domain.elements:
-		for node in elem.nodes:
-			if node.id not in tag:
-				tag.append(node.id)
-	tag.sort()
+		tag.update(node.id for node in elem.nodes)
+
+def bucket_partitions(doc, nodes_tags, process_count):
+	# One partition lookup per node, the nodes of each partition keep the sorted order of nodes_tags
+	buckets = {process_id: [] for process_id in range(process_count)}
+	node_partition = doc.mesh.partitionData.nodePartition
+	for node_id in nodes_tags:
+		buckets[node_partition(node_id)].append(node_id)
+	return buckets
+
+def level_corners(nodes):
+	# Nearest node to each corner of a level (the (x, y, node_id) of the nodes with the same z), sorted by x and y
+	xs = [x for x, _, _ in nodes]
+	ys = [y for _, y, _ in nodes]
+	corners = set()
+	for cx in (min(xs), max(xs)):
+		for cy in (min(ys), max(ys)):
+			corners.add(min(nodes, key=lambda n: (n[0]-cx)**2 + (n[1]-cy)**2))
+	return sorted(corners)
+
+def story_corner_nodes(doc, nodes_tags):
+	# Keep the nearest node to each corner of every level (nodes with the same z)
+	levels = {}
+	for node_id in nodes_tags:
+		node = doc.mesh.nodes[node_id]
+		levels.setdefault(round(node.z, 1), []).append((node.x, node.y, node_id))
+	return sorted(node_id for nodes in levels.values() for _, _, node_id in level_corners(nodes))
+
+def classify_stories(doc, nodes_tags):
+	# Level of each node (position of its z from the bottom) and corner (0 to 3 for the corner nodes of its level
+	# sorted by x and y, None for the other nodes)
+	levels = {}
+	for node_id in nodes_tags:
+		node = doc.mesh.nodes[node_id]
+		levels.setdefault(round(node.z, 1), []).append((round(node.x, 1), round(node.y, 1), node_id))
+	stories = {}
+	for level, z in enumerate(sorted(levels)):
+		corners = {node_id: corner for corner, (_, _, node_id) in enumerate(level_corners(levels[z]))}
+		for _, _, node_id in levels[z]:
+			stories[str(node_id)] = {'level': level, 'z': z, 'corner': corners.get(node_id)}
+	return stories
+
+def write_plan(path, resp_name, file_type, dofs, sopt, delta_t, recorders, stories):
+	# Recording plan of the compact recorders, read by pyseestko.recorder_io
+	os.makedirs(f'{path}/PartitionsInfo/plan', exist_ok=True)
+	plan = {
+		'response'  : resp_name,
+		'file_type' : file_type,
+		'dofs'      : [int(dof) for dof in dofs.split()],
+		'time'      : '-time' in sopt,
+		'dT'        : delta_t,
+		'recorders' : recorders,
+		'stories'   : stories,
+	}
+	with open(f'{path}/PartitionsInfo/plan/{resp_name}.json', 'w') as plan_file:
+		json.dump(plan, plan_file, indent=1)
+def write_manifest(path, doc, resp_name, buckets, nodes_number, ele_number, partitions):
+	# Partitions manifest read by pyseestko.model_info.ModelInfo, each recorder (response) adds its nodes to it.
+	# A manifest of a different model (other counts) is replaced instead of updated.
+	manifest_path = f'{path}/PartitionsInfo/manifest.json'
+	counts = {'nodes': nodes_number, 'elements': ele_number, 'partitions': partitions}
+	manifest = None
+	if os.path.exists(manifest_path):
+		with open(manifest_path, 'r') as manifest_file:
+			manifest = json.load(manifest_file)
+		if manifest.get('counts') != counts:
+			manifest = None
+	if manifest is None:
+		manifest = {'counts': counts, 'responses': {}, 'coords': {}, 'stories': {}}
+
+	# Nodes of each partition and coordinates of every recorded node
+	manifest['responses'][resp_name] = {str(process_id): nodes for process_id, nodes in buckets.items()}
+	for nodes in buckets.values():
+		for node_id in nodes:
+			node = doc.mesh.nodes[node_id]
+			manifest['coords'][str(node_id)] = [node.x, node.y, node.z]
+	all_nodes = sorted(int(node_id) for node_id in manifest['coords'])
+	manifest['stories'] = classify_stories(doc, all_nodes)
+	with open(manifest_path, 'w') as manifest_file:
+		json.dump(manifest, manifest_file)
+
 """
 def extract_eletags(pinfo, domain, tag, xobj):
 	for elem in domain.elements:
@@ -476,8 +587,7 @@ def writeTcl(pinfo):
 	SelectionSets = nodes_at.indexVector
 
 	# Get node tags
-	nodes_tags = []
-	ele_tags = []
+	nodes_tags = set()
 	for selection_set_id in SelectionSets:
 		if not selection_set_id in doc.selectionSets:
 			continue
@@ -488,19 +598,17 @@ def writeTcl(pinfo):
 
 			for domain_id in geometry_subset.vertices:
 				domain = mesh_of_geom.vertices[domain_id]
-				if domain.id not in nodes_tags:
-					nodes_tags.append(domain.id)
-			nodes_tags.sort()
+				nodes_tags.add(domain.id)
 			for domain_id in geometry_subset.edges:
 				domain = mesh_of_geom.edges[domain_id]
 				extract_tags(pinfo, domain, nodes_tags, xobj)
 				#extract_eletags(pinfo, domain, nodes_tags, xobj)
-
+			# The nodes of the faces were collected apart and never recorded
+			"""
 			for domain_id in geometry_subset.faces:
 				domain = mesh_of_geom.faces[domain_id]
 				extract_tags(pinfo, domain, ele_tags, xobj)
 				#extract_eletags(pinfo, domain, ele_tags, xobj)
-			"""
 			for domain_id in geometry_subset.solids:
 				domain = mesh_of_geom.solids[domain_id]
 				extract_tags(pinfo, domain, nodes_tags, xobj)
@@ -508,6 +616,7 @@ def writeTcl(pinfo):
 		for interaction_id in selection_set.interactions:
 			domain = doc.mesh.meshedInteractions[interaction_id]
 			extract_tags(pinfo, domain, nodes_tags, xobj)
+	nodes_tags = sorted(nodes_tags)
 
 	# Defining responses types
 	respType = ''
@@ -554,6 +663,23 @@ def writeTcl(pinfo):
 		raise Exception('Error: cannot find "precision" attribute')
 	sopt += ' -precision {}'.format(at_nSD.integer) if at_precision.boolean else ''
 
+	# Optionals 3
+	at_dT = xobj.getAttribute('-dT')
+	at_deltaT = xobj.getAttribute('$deltaT')
+	if(at_dT is None):
+		raise Exception('Error: cannot find "-dT" attribute')
+	delta_t = at_deltaT.real if at_dT.boolean else None
+	sopt += ' -dT {}'.format(delta_t) if at_dT.boolean else ''
+
+	# Recording plan (documents created before these options use the one recorder per node layout)
+	at_compact = xobj.getAttribute('-compact')
+	at_corners = xobj.getAttribute('-corners')
+	compact = at_compact is not None and at_compact.boolean
+	corners = compact and at_corners is not None and at_corners.boolean
+	if corners:
+		nodes_tags = story_corner_nodes(doc, nodes_tags)
+	recorders = []
+
 	#Write TCL
 	str_tcl = ''
 	node_str = ''
@@ -580,52 +706,50 @@ def writeTcl(pinfo):
 
 	# Parallel computing
 	if pinfo.process_count > 1:
-		process_block_count = 0
-		for process_id in range(pinfo.process_count):
-			first_done = False
-			#Check if directories exist and create them if not
-			os.makedirs(f'{path}/PartitionsInfo/coords', exist_ok=True)
-			os.makedirs(f'{path}/PartitionsInfo/{respType[1:]}', exist_ok=True)
-
+		# Bucket the nodes by partition once, then write every file from its bucket in a single pass
+		buckets = bucket_partitions(doc, nodes_tags, pinfo.process_count)
+		os.makedirs(f'{path}/PartitionsInfo/coords', exist_ok=True)
+		os.makedirs(f'{path}/PartitionsInfo/{respType[1:]}', exist_ok=True)
+		if respType == ' disp': os.makedirs(f'{path}/Displacements', exist_ok=True)
+		elif respType == ' accel': os.makedirs(f'{path}/Accelerations', exist_ok=True)
+		elif respType == ' reaction': os.makedirs(f'{path}/Reactions', exist_ok=True)
+
+		tcl_lines = []
+		for process_id, partition_nodes in buckets.items():
 			#Add coordinate info
 			if respType == ' disp':
-				os.makedirs(f'{path}/Displacements', exist_ok=True)
 				with open(f'{path}/PartitionsInfo/coords/coords_{process_id}.csv','w') as coords_file:
 					coords_file.write('Node ID, X, Y, Z \n')
-					for node_id in nodes_tags:
-						if doc.mesh.partitionData.nodePartition(node_id) != process_id:
-							continue
-						nodex = doc.mesh.nodes[node_id].x
-						nodey = doc.mesh.nodes[node_id].y
-						nodez = doc.mesh.nodes[node_id].z
-						coords_file.write("{} {} {} {} \n".format(node_id, nodex,nodey,nodez))
-			elif respType == ' accel': os.makedirs(f'{path}/Accelerations', exist_ok=True)
-			elif respType == ' reaction': os.makedirs(f'{path}/Reactions', exist_ok=True)
+					for node_id in partition_nodes:
+						node = doc.mesh.nodes[node_id]
+						coords_file.write("{} {} {} {} \n".format(node_id, node.x, node.y, node.z))
 
 			#Add info about accelerations, displacements and reactions
 			with open(f'{path}/PartitionsInfo/{respType[1:]}/{respType[1:]}_nodes_part-{process_id}.csv','w') as results_file:
-				for node_id in nodes_tags:
-					#In short, this line of code ensures that only nodes belonging to the current process running in parallel are processed.
-					if doc.mesh.partitionData.nodePartition(node_id) != process_id:
-						continue
-					results_file.write(f'{node_id}\n')
-
-					#This lines are about getting the output
-					if not first_done:
-						if process_block_count == 0:
-							str_tcl += '\n{}{}{}{}\n'.format(pinfo.indent, 'if {$STKO_VAR_process_id == ', process_id, '} {')
-						else:
-							str_tcl += '{}{}{}{}\n'.format(pinfo.indent, ' elseif {$STKO_VAR_process_id == ', process_id, '} {')
-						first_done = True
-					str_tcl += '{}{}recorder Node {} "{}-node_{}-part_$STKO_VAR_process_id{}" -node {}{} -dof{}{}\n'.format(pinfo.indent, pinfo.tabIndent,file_type,file_name, node_id,extension, node_id , sopt,dofs, respType)
-					if first_done:
-						process_block_count += 1
-				if process_block_count > 0 and first_done:
-					str_tcl += '{}{}'.format(pinfo.indent, '}')
+				results_file.writelines(f'{node_id}\n' for node_id in partition_nodes)
+			if not partition_nodes:
+				continue
+
+			#This lines are about getting the output, one block per partition with nodes
+			if not tcl_lines:
+				tcl_lines.append('\n{}{}{}{}\n'.format(pinfo.indent, 'if {$STKO_VAR_process_id == ', process_id, '} {'))
+			else:
+				tcl_lines.append('{}{}{}{}\n'.format(pinfo.indent, ' elseif {$STKO_VAR_process_id == ', process_id, '} {'))
+			if compact:
+				#One multi-node recorder for all the nodes of the partition
+				node_str = ' '.join(str(node_id) for node_id in partition_nodes)
+				tcl_lines.append('{}{}recorder Node {} "{}-part_$STKO_VAR_process_id{}"{} -node {} -dof{}{}\n'.format(pinfo.indent, pinfo.tabIndent,file_type,file_name,extension, sopt, node_str,dofs, respType))
+				recorders.append({'partition': process_id, 'file': f'{file_name}-part_{process_id}{extension}', 'nodes': partition_nodes})
+			else:
+				tcl_lines.extend('{}{}recorder Node {} "{}-node_{}-part_$STKO_VAR_process_id{}" -node {}{} -dof{}{}\n'.format(pinfo.indent, pinfo.tabIndent,file_type,file_name, node_id,extension, node_id , sopt,dofs, respType)
+								 for node_id in partition_nodes)
+			tcl_lines.append('{}{}'.format(pinfo.indent, '}'))
+		str_tcl += ''.join(tcl_lines)
 
  	#TODO: this is not well implement
 	# Secuencial computing
 	else:
+		buckets = {0: nodes_tags}
 		os.makedirs(f'{path}/coords', exist_ok=True)
 		os.makedirs(f'{path}/{respType[1:]}', exist_ok=True)
 		if respType == ' disp':
@@ -641,8 +765,19 @@ def writeTcl(pinfo):
 			for node_id in nodes_tags:
 				results_file.write(f'{node_id}\n')
 				node_str += f' {node_id}'
-				str_tcl += '{}recorder Node {} "{}{}" -node {}{} -dof{}{}'.format(pinfo.indent,file_type,file_name,extension, node_str , sopt,dofs, respType,'\n')
+				if not compact:
+					str_tcl += '{}recorder Node {} "{}{}" -node {}{} -dof{}{}'.format(pinfo.indent,file_type,file_name,extension, node_str , sopt,dofs, respType,'\n')
+		if compact:
+			str_tcl += '{}recorder Node {} "{}{}"{} -node{} -dof{}{}\n'.format(pinfo.indent,file_type,file_name,extension, sopt, node_str,dofs, respType)
+			recorders.append({'partition': 0, 'file': f'{file_name}{extension}', 'nodes': list(nodes_tags)})
 	str_tcl += '{}{}'.format(pinfo.indent,'\n')
+
+	# Write the recording plan with the nodes of each recorder and their story and corner
+	if compact:
+		write_plan(path, respType[1:], file_type, dofs, sopt, delta_t, recorders, classify_stories(doc, nodes_tags))
+
+	# Write the partitions manifest with the nodes, coordinates, stories and global counts of the model
+	write_manifest(path, doc, respType[1:], buckets, nodes_number, ele_number, partitions)
 	pinfo.out_file.write(str_tcl)
 
 
@@ -1,53 +1,26 @@
-import pandas as pd 
+from pyseestko.records import preprocessRecord, loadRecord # type: ignore
+from pathlib import Path
+import numpy as np
 import matplotlib.pyplot as plt
 
-def getRecordSeries(txt_file_path:str, direction:str)->pd.Series:
-    """
-    This function returns a Pandas Series with the acceleration data from a
-    
-    Parameters
-    ----------
-    file : str
-        Path to the file with the acceleration data.
-    
-    Returns
-    -------
-    Pandas Series
-        Acceleration data.
-    """
-    if direction not in ['n', 'e', 'z']:
-        raise ValueError('Direction must be "n", "e" or "z"')
-    
-    with open(txt_file_path, 'r') as file:
-        data = file.readlines()[1:]  # Ignorar la primera línea con metadatos
-    data = [float(line.strip()) * 9.81 for line in data] #type: ignore
-    dt = 0.005  # Paso de tiempo en segundos
-    tiempo = [i * dt for i in range(len(data))]
-    series = pd.Series(data, index=tiempo)
-    
-    # Determinar el intervalo de muestreo
-    longitud_total = len(series)
-    puntos_deseados = 2000
-    intervalo = int(longitud_total / puntos_deseados)
+# Record files of each channel, the accelerations are in g and the header line has the dt of the record
+record_paths = {
+    'e': Path('Valpo_1985_accelerations_X.txt'),
+    'n': Path('Valpo_1985_accelerations_Y.txt'),
+    'z': Path('Valpo_1985_accelerations_Z.txt'),
+}
 
-    # Muestrear la serie cada 'intervalo' puntos
-    serie_muestreada = series.iloc[::intervalo]
-
-    # Exportar los índices y valores a archivos .txt
-    serie_muestreada.index.to_series().to_csv(f'time_series_{direction}.txt', index=False, header=False)
-    serie_muestreada.to_csv(f'acceleration_{direction}.txt', index=False, header=False)
-    return series
-
-
-txt_file_path = 'Valpo_1985_accelerations_Z.txt'
-record_ss = getRecordSeries(txt_file_path, direction='z')
+# Scale, resample to dt = 0.03 (anti-aliased) and write acceleration_[e/n/z].txt and time_series_[e/n/z].txt
+preprocessRecord(record_paths, output_path=Path('.'), target_dt=0.03)
 
 # Plot
+record, dt = loadRecord({'z': record_paths['z']})
+tiempo = np.arange(len(record)) * dt
 plt.figure(figsize=(10, 6))
-plt.plot(record_ss.index, record_ss.values)#, label='Aceleración (m/s²)')
+plt.plot(tiempo, record[:, 0])#, label='Aceleración (m/s²)')
 plt.ylabel('Aceleración (m/s²)')
 plt.xlabel('Tiempo (s)')
 plt.title('Registro Sísmico de Valparaíso 1985')
 plt.legend()
 plt.grid(True)
-plt.show()
\ No newline at end of file
+plt.show()
@@ -0,0 +1,225 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from concurrent.futures   import ProcessPoolExecutor
+from pyseestko.utilities  import assignZonesToStationsInDF  #type: ignore
+from itertools            import combinations
+from typing               import List, Tuple
+
+import scipy.stats as stats
+import pandas      as pd
+import numpy       as np
+# ==================================================================================
+# TIDY RESULTS
+# ==================================================================================
+# The statistics of this module work on a tidy (long) results table, with one row per value:
+# | Sim_Type | Nsubs | Station | Iteration | Metric | Dir | Story | Value |
+# The base shear is stored as Story 0 (the base of the structure).
+FACTORS = ['Sim_Type', 'Nsubs', 'Station', 'Iteration']
+TESTS   = ['Metric', 'Dir', 'Story']
+
+def tidyFromResultsDFs(drift_dfs:Tuple[pd.DataFrame, pd.DataFrame]|None = None,
+                       spectra_dfs:Tuple[pd.DataFrame, pd.DataFrame]|None = None,
+                       base_shear_dfs:Tuple[pd.DataFrame, pd.DataFrame]|None = None)->pd.DataFrame:
+    """
+    Builds the tidy results table from the (x, y) wide dataframes of getDriftResultsDF, getSpectraResultsDF
+    and getSBaseResultsDF (or the csv files saved from them).
+    """
+    dfs = []
+    for metric, wide_dfs in [('drift', drift_dfs), ('spectra', spectra_dfs), ('base_shear', base_shear_dfs)]:
+        if wide_dfs is None:
+            continue
+        for direction, wide_df in zip(['x', 'y'], wide_dfs):
+            value_cols = [col for col in wide_df.columns if col not in FACTORS + ['Zone']]
+            df = wide_df.melt(id_vars=FACTORS, value_vars=value_cols, var_name='Story', value_name='Value')
+            df['Story']  = 0 if metric == 'base_shear' else df['Story'].str.lstrip('s').astype(int)
+            df['Metric'] = metric
+            df['Dir']    = direction
+            dfs.append(df[FACTORS + TESTS + ['Value']])
+    return pd.concat(dfs, ignore_index=True)
+
+
+# ==================================================================================
+# ASSUMPTIONS TESTS
+# ==================================================================================
+def runAssumptionTests(
+    tidy_df          : pd.DataFrame,
+    aggregate        : bool      = False,
+    levene_factors   : List[str] = ['Sim_Type'],
+    fligner_factors  : List[str] = ['Sim_Type', 'Nsubs', 'Station'],
+    workers          : int|None  = 1,
+    )->Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Runs the ANOVA/MANOVA assumptions tests of analyze_anova_assumptions and analyze_manova_assumptions
+    for every (Metric, Dir, Story) of the tidy results table at once: Box-Cox transform, Shapiro-Wilk
+    normality test and Levene and Fligner-Killeen homogeneity of variances tests.
+
+    Parameters
+    ----------
+    tidy_df : pd.DataFrame
+        Tidy results table, see tidyFromResultsDFs.
+    aggregate : bool, optional
+        If True, the replicas are averaged by (Sim_Type, Nsubs, Station) before the tests, as in
+        analyze_anova_assumptions. The default is False, as in analyze_manova_assumptions.
+    levene_factors : List[str], optional
+        Factors that define the groups of the Levene test. The default is ['Sim_Type'].
+    fligner_factors : List[str], optional
+        Factors that define the groups of the Fligner-Killeen test. The default is ['Sim_Type', 'Nsubs', 'Station'].
+    workers : int, optional
+        Number of processes, each one runs the tests of a (Metric, Dir). 1 runs in this process and
+        None uses all the cores. The default is 1.
+
+    Returns
+    -------
+    results_df : pd.DataFrame
+        One row per (Metric, Dir, Story) with the Box-Cox lambda, the statistics and the p-values of the tests.
+    transformed_df : pd.DataFrame
+        The tested values, with the Box-Cox transformed (and standardized) value in the 'BoxCox' column.
+    """
+    # Average the replicas if needed
+    tidy_df = tidy_df.copy()
+    for col in FACTORS + TESTS:
+        if col in tidy_df and isinstance(tidy_df[col].dtype, pd.CategoricalDtype):
+            tidy_df[col] = tidy_df[col].astype(tidy_df[col].cat.categories.dtype)
+    if aggregate:
+        tidy_df = tidy_df.groupby(TESTS + ['Sim_Type', 'Nsubs', 'Station'], observed=True, sort=False)['Value'].mean().reset_index()
+
+    # Each task tests all the stories of a (Metric, Dir)
+    tasks = [(df, levene_factors, fligner_factors) for _, df in tidy_df.groupby(['Metric', 'Dir'], sort=False)]
+    if workers == 1:
+        outputs = [_testMetricDirection(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outputs = list(executor.map(_testMetricDirection, *zip(*tasks)))
+    results_df     = pd.DataFrame([row for rows, _ in outputs for row in rows])
+    transformed_df = pd.concat([df for _, df in outputs], ignore_index=True)
+    return results_df, transformed_df
+
+def _testMetricDirection(df:pd.DataFrame, levene_factors:List[str], fligner_factors:List[str])->Tuple[List[dict], pd.DataFrame]:
+    rows, dfs = [], []
+    for (metric, direction, story), story_df in df.groupby(TESTS, sort=False):
+        # Box-Cox transform, standardized as the PowerTransformer of analyze_manova_assumptions
+        transformed, fitted_lambda = stats.boxcox(story_df['Value'].to_numpy(dtype=float))
+        transformed = (transformed - transformed.mean()) / transformed.std()
+        story_df    = story_df.assign(BoxCox=transformed)
+
+        # Normality and homogeneity of variances tests
+        shapiro_test = stats.shapiro(transformed)
+        levene_stat,  levene_p  = _groupsTest(stats.levene,  story_df, levene_factors)
+        fligner_stat, fligner_p = _groupsTest(stats.fligner, story_df, fligner_factors)
+        rows.append({'Metric'          : metric,
+                     'Dir'             : direction,
+                     'Story'           : story,
+                     'N'               : len(story_df),
+                     'Lambda'          : fitted_lambda,
+                     'Shapiro_W'       : shapiro_test.statistic,
+                     'Shapiro_p'       : shapiro_test.pvalue,
+                     'Levene_stat'     : levene_stat,
+                     'Levene_p'        : levene_p,
+                     'Fligner_stat'    : fligner_stat,
+                     'Fligner_p'       : fligner_p})
+        dfs.append(story_df)
+    return rows, pd.concat(dfs, ignore_index=True)
+
+def _groupsTest(test, df:pd.DataFrame, factors:List[str])->Tuple[float, float]:
+    # The homogeneity tests need at least two groups with more than one value each
+    groups = [group.to_numpy() for _, group in df.groupby(factors)['BoxCox']]
+    if len(groups) < 2 or min(len(group) for group in groups) < 2:
+        return np.nan, np.nan
+    result = test(*groups)
+    return result.statistic, result.pvalue
+
+
+# ==================================================================================
+# GROUPED ANOVA
+# ==================================================================================
+def groupedAnova(
+    tidy_df : pd.DataFrame,
+    factors : List[str],
+    by      : List[str] = TESTS,
+    value   : str       = 'Value',
+    )->pd.DataFrame:
+    """
+    One-way or two-way (with interaction) ANOVA of value for every group of by at once. Instead of fitting
+    an ols model per group, the sums of squares are computed from the group-wise sums, sums of squares and
+    counts of a few groupby, so thousands of groups cost about the same as one.
+    The two-way sums of squares are the ones of a balanced design (the campaign is a full factorial with
+    the same number of replicas per case), where the type I, II and III sums of squares are the same.
+
+    Parameters
+    ----------
+    tidy_df : pd.DataFrame
+        Tidy results table, see tidyFromResultsDFs.
+    factors : List[str]
+        One or two factors, e.g. ['Iteration'] or ['Sim_Type', 'Nsubs'].
+    by : List[str], optional
+        Columns that define the groups, one ANOVA is computed for each. The default is ['Metric', 'Dir', 'Story'].
+    value : str, optional
+        Response column. The default is 'Value'.
+
+    Returns
+    -------
+    anova_df : pd.DataFrame
+        One row per group and source (each factor, their interaction and the Residual) with the
+        sum_sq, df, F and PR(>F) columns of statsmodels anova_lm.
+    """
+    # Check input
+    if len(factors) not in [1, 2]:
+        raise ValueError(f'Only one-way or two-way ANOVA are supported, current factors: {factors}')
+    
+    # Moments of each group and of each level of the factors
+    df     = tidy_df[by + factors + [value]].astype({value: float})
+    df     = df.assign(_sq=df[value]**2)
+    total  = df.groupby(by, observed=True, sort=True).agg(N=(value, 'size'), S=(value, 'sum'), Q=('_sq', 'sum'))
+    correction = total['S']**2 / total['N']
+    ss_total   = total['Q'] - correction
+    def between(columns:List[str])->Tuple[pd.Series, pd.Series]:
+        # Sum of squares between the levels of columns and their number of levels
+        levels = df.groupby(by + columns, observed=True, sort=True)[value].agg(['sum', 'size'])
+        levels = (levels['sum']**2 / levels['size']).groupby(level=list(range(len(by)))).agg(['sum', 'size'])
+        return levels['sum'] - correction, levels['size']
+    
+    # Sums of squares and degrees of freedom of each source
+    sources = {}
+    ss_a, levels_a = between(factors[:1])
+    sources[factors[0]] = (ss_a, levels_a - 1)
+    if len(factors) == 2:
+        ss_b,     levels_b = between(factors[1:])
+        ss_cells, cells    = between(factors)
+        sources[factors[1]]        = (ss_b, levels_b - 1)
+        sources[':'.join(factors)] = (ss_cells - ss_a - ss_b, (cells - 1) - (levels_a - 1) - (levels_b - 1))
+        residual = (ss_total - ss_cells, total['N'] - cells)
+    else:
+        residual = (ss_total - ss_a, total['N'] - levels_a)
+    
+    # F statistics and p-values
+    ms_residual = residual[0] / residual[1]
+    dfs = []
+    for source, (sum_sq, dof) in sources.items():
+        F = (sum_sq / dof) / ms_residual
+        dfs.append(pd.DataFrame({'Source': source, 'sum_sq': sum_sq, 'df': dof, 'F': F, 'PR(>F)': stats.f.sf(F, dof, residual[1])}))
+    dfs.append(pd.DataFrame({'Source': 'Residual', 'sum_sq': residual[0], 'df': residual[1], 'F': np.nan, 'PR(>F)': np.nan}))
+    anova_df = pd.concat(dfs).reset_index()
+    anova_df['Source'] = pd.Categorical(anova_df['Source'], categories=list(sources) + ['Residual'])
+    return anova_df.sort_values(by + ['Source'], kind='stable').reset_index(drop=True)
+
+def screenFactors(
+    tidy_df      : pd.DataFrame,
+    factors      : List[str] = ['Sim_Type', 'Nsubs', 'Zone'],
+    by           : List[str] = TESTS,
+    interactions : bool      = True,
+    value        : str       = 'Value',
+    )->pd.DataFrame:
+    """
+    Exhaustive factor screening: the one-way ANOVA of each factor and (if interactions) the two-way ANOVA
+    of each pair of factors, for every group of by. The Zone of each station is added if it's not in the table.
+    Returns the groupedAnova tables concatenated, with a 'Model' column such as 'Sim_Type' or 'Sim_Type*Nsubs'.
+    """
+    if 'Zone' in factors + by and 'Zone' not in tidy_df:
+        tidy_df = tidy_df.assign(Zone=tidy_df['Station'].astype(str).map(assignZonesToStationsInDF))
+    models  = [[factor] for factor in factors]
+    models += [list(pair) for pair in combinations(factors, 2)] if interactions else []
+    dfs = [groupedAnova(tidy_df, model, by, value).assign(Model='*'.join(model)) for model in models]
+    anova_df = pd.concat(dfs, ignore_index=True)
+    anova_df['Source'] = anova_df['Source'].astype(str)
+    return anova_df[['Model'] + [col for col in anova_df.columns if col != 'Model']]
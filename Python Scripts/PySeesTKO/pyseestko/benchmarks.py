@@ -0,0 +1,256 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from pyseestko.db_functions import ModelSimulation                                          #type: ignore
+from pyseestko.db_manager   import DataBaseManager                                          #type: ignore
+from pyseestko.synthetic    import SCALES, generateStation, simulationKwargs, stationPath   #type: ignore
+from pyseestko.utilities    import getDriftResultsDF, getSpectraResultsDF, getSBaseResultsDF #type: ignore
+from pyseestko.queries      import ProjectQueries, renderGridPlots, getResultsTable          #type: ignore
+from pyseestko.queries      import _driftResultsDF, _spectraResultsDF, _baseShearResultsDF   #type: ignore
+from contextlib             import redirect_stdout
+from pathlib                import Path
+from typing                 import Callable, Dict, List, Tuple
+
+import pandas as pd
+import subprocess
+import tracemalloc
+import platform
+import datetime
+import shutil
+import json
+import time
+import io
+import os
+# ==================================================================================
+# BENCHMARK SUITE
+# ==================================================================================
+# Benchmarks of each stage of the pipeline, run on a synthetic FixBase station (see synthetic.py) with the
+# number of steps of the scale, and on the case grid of the scale for the reshaping and plotting stages:
+#     model_info    : ModelSimulation.loadModelInfo (ModelInfo parsing, run.sh, log and folder sizes)
+#     ingest        : ModelSimulation.loadDataFrames (recorders reading and the response DataFrames)
+#     spectra       : stories spectra (pwl) of the story accelerations, as stored in the database
+#     drift         : max inter-storey drift per floor
+#     base_shear    : base shear by accelerations
+#     serialization : pickling of the story accelerations and story nodes
+#     upload        : ModelSimulation.simulation
+#     query         : ProjectQueries fetch and decode of the drift, spectra and base shear
+#     reshape       : getDriftResultsDF, getSpectraResultsDF, getSBaseResultsDF and getResultsTable
+#     plot          : renderGridPlots in this process with the matplotlib mathtext
+# The upload and query stages run on a new local SQLite database in the work folder by default (see the
+# sqlite backend of db_manager.py), or on the given database.
+# Each stage is run once with tracemalloc (peak of the python allocations) and then repeat times for the
+# wall and CPU times. The runs are appended to a JSON history file to compare them across commits.
+STAGES = ['model_info', 'ingest', 'spectra', 'drift', 'base_shear', 'serialization', 'upload', 'query', 'reshape', 'plot']
+DATABASE_STAGES = ['upload', 'query']
+
+def measure(func:Callable, repeat:int = 3)->Tuple[object, Dict[str, float]]:
+    """
+    Runs func once with tracemalloc and then repeat (at least 1) times without it.
+    Returns the result of the last run and the stats: min and mean wall time, min CPU time (s) and the peak
+    of the traced memory (MB).
+    """
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    walls, cpus = [], []
+    for _ in range(max(repeat, 1)):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result    = func()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+    return result, {'wall'     : min(walls),
+                    'wall_mean': sum(walls) / len(walls),
+                    'cpu'      : min(cpus),
+                    'peak_mb'  : peak / (1024 * 1024),
+                    'repeat'   : repeat}
+
+def runBenchmarks(
+    work_path   : Path,
+    scale       : str              = 'small',
+    stages      : List[str]|None   = None,
+    repeat      : int              = 3,
+    database    : Dict[str, str]|None = None,
+    backend     : str              = 'sqlite',
+    history_path: Path|None        = None,
+    label       : str              = '',
+    seed        : int              = 0,
+    keep        : bool             = False,
+    verbose     : bool             = True,
+    )->dict:
+    """
+    Runs the benchmarks of the stages and returns the run (see STAGES).
+
+    Parameters
+    ----------
+    work_path : Path
+        Folder for the synthetic station and the figures, it's deleted at the end unless keep is True.
+    scale : str, optional
+        'small', 'medium' or 'campaign' (see synthetic.SCALES), it defines the steps of the station and the
+        case grid of the reshape and plot stages. The default is 'small'.
+    stages : List[str], optional
+        Stages to measure, the stages they depend on are run without measuring them. All by default.
+    repeat : int, optional
+        Timed runs of each stage. The default is 3.
+    database : Dict[str, str], optional
+        user, password, host and database of DataBaseManager for the upload and query stages, the rows
+        uploaded by the benchmark stay in the database. None uses a new SQLite file in the work folder with
+        the sqlite backend and skips these stages with the other backends.
+    backend : str, optional
+        Database backend, 'sqlite' or 'mysql'. The default is 'sqlite'.
+    history_path : Path, optional
+        JSON file where the run is appended.
+    label : str, optional
+        Label of the run, e.g. the change being measured.
+    seed : int, optional
+        Seed of the synthetic station. The default is 0.
+    keep : bool, optional
+        If True, the work folder is not deleted. The default is False.
+    verbose : bool, optional
+        If True, prints the stats of each stage, the output of the pipeline is always silenced. The default is True.
+    """
+    # Init params
+    if scale not in SCALES:
+        raise ValueError(f'Unknown scale {scale}, it must be one of {list(SCALES)}')
+    stages  = list(STAGES) if stages is None else list(stages)
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f'Unknown stages {sorted(unknown)}, they must be in {STAGES}')
+    if repeat < 1:
+        raise ValueError('repeat must be at least 1')
+    params    = SCALES[scale]
+    work_path = Path(work_path)
+    run       = {**runInfo(), 'label': label, 'backend': backend, 'scale': scale, 'nsteps': params['nsteps'], 'repeat': repeat, 'stages': {}, 'skipped': []}
+
+    def step(stage:str, func:Callable):
+        # Measure the stage if it was asked, otherwise just run it for the next stages
+        with redirect_stdout(io.StringIO()):
+            if stage not in stages:
+                return func()
+            result, stats = measure(func, repeat)
+        run['stages'][stage] = stats
+        if verbose: print(f"{stage:<14}: wall {stats['wall']:.4f} s | cpu {stats['cpu']:.4f} s | peak {stats['peak_mb']:.2f} MB")
+        return result
+
+    try:
+        # Synthetic station and simulation without the DataFrames
+        main_path = generateStation(stationPath(work_path / 'campaign', 1, 20, 2, 6.7, 1, 1), nsteps=params['nsteps'], seed=seed)
+        if database is None and backend == 'sqlite':
+            (work_path / 'benchmarks.sqlite').unlink(missing_ok=True)
+            database = {'user': '', 'password': '', 'host': '', 'database': str(work_path / 'benchmarks.sqlite')}
+        manager = DataBaseManager(**database, backend=backend) if database is not None else None
+        kwargs    = simulationKwargs(params['nsteps'])
+        with redirect_stdout(io.StringIO()):
+            sim = ModelSimulation(main_path, sim_type=1, load_df_info=False, manager=manager, **kwargs)
+
+        # Ingest and derive stages
+        step('model_info',    lambda: sim.loadModelInfo(main_path, verbose=False))
+        step('ingest',        sim.loadDataFrames)
+        spectra_df = step('spectra', lambda: _spectraResultsDF(sim.accel_mdf[::sim._jump], sim.story_nodes_df.iloc[8:]))
+        drifts     = step('drift',   sim._computeMaxDriftsPerFloor)
+        shears     = step('base_shear', lambda: _resetBaseShear(sim)._computeBaseShearByAccelerations()[0])
+        step('serialization', lambda: sim.paralelize_serialization([sim.accel_mdf[::sim._jump], sim.story_nodes_df.iloc[8:]]))
+
+        # Database stages
+        if manager is None:
+            run['skipped'] += [stage for stage in DATABASE_STAGES if stage in stages]
+        else:
+            step('upload', sim.simulation)
+            query = ProjectQueries(**database, sim_type=sim._sim_type, linearity=sim._linearity, magnitude=sim.magnitude,
+                                   rupture_type=sim.rupture, iteration=sim.iteration, location=sim.location,
+                                   stories=sim.stories, subs=sim.subs, plotter=None, windows=False, verbose=False, backend=backend)
+            step('query', lambda: query.fetchAllResults('', '', ''))
+            query.close_connection()
+            manager.close_connection()
+
+        # Results of the case, replicated over the case grid of the scale. The legend of the grid plots
+        # needs 2 iterations of the station 1, so the grid has at least 2 iterations
+        sim_type_map = {1: 'FixBase', 2: 'AbsBound', 3: 'DRM'}
+        grid  = dict(sim_types=params['sim_types'], nsubs_lst=params['nsubs_lst'], stations=params['stations'],
+                     iterations=params['iterations'] if len(params['iterations']) > 1 else [1, 2])
+        names = [f'{sim_type_map[sim_type]}_20f{nsubs}s_rup_bl_{iteration}_s{station}'
+                 for sim_type in grid['sim_types'] for nsubs in grid['nsubs_lst']
+                 for station in grid['stations'] for iteration in grid['iterations']]
+        drift_df        = _driftResultsDF(drifts[0][0], drifts[0][1], drifts[1][0], drifts[1][1])
+        base_shear_df   = _baseShearResultsDF(sim.timeseries[::sim._jump], *[shear[::sim._jump] for shear in shears])
+        drifts_dict     = {name: drift_df      for name in names}
+        spectra_dict    = {name: spectra_df    for name in names}
+        base_shear_dict = {name: base_shear_df for name in names}
+        run['ncases']   = len(names)
+
+        # Analysis stages
+        step('reshape', lambda: (getDriftResultsDF(drifts_dict), getSpectraResultsDF(spectra_dict), getSBaseResultsDF(base_shear_dict),
+                                 getResultsTable(drifts_dict, spectra_dict, base_shear_dict, **grid)))
+        step('plot',    lambda: renderGridPlots(drifts_dict, spectra_dict, base_shear_dict, **grid, project_path=work_path / 'plots',
+                                                usetex=False, workers=1))
+    finally:
+        if not keep:
+            shutil.rmtree(work_path / 'campaign', ignore_errors=True)
+            shutil.rmtree(work_path / 'plots',    ignore_errors=True)
+            if backend == 'sqlite' and database is not None and Path(database['database']) == work_path / 'benchmarks.sqlite':
+                (work_path / 'benchmarks.sqlite').unlink(missing_ok=True)
+
+    # Save the run
+    if history_path is not None:
+        appendHistory(history_path, run)
+    return run
+
+def _resetBaseShear(sim:ModelSimulation)->ModelSimulation:
+    # The base shear is cached by the simulation, drop it so every run computes it
+    sim._base_shear_results = None
+    return sim
+
+# ==================================================================================
+# HISTORY
+# ==================================================================================
+def runInfo()->dict:
+    """
+    Returns the commit (None outside a git repo), date and machine of a run.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty  = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=Path(__file__).parent,
+                                     capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {'commit'  : commit,
+            'dirty'   : dirty,
+            'date'    : datetime.datetime.now().isoformat(timespec='seconds'),
+            'python'  : platform.python_version(),
+            'platform': platform.platform(),
+            'cpus'    : os.cpu_count()}
+
+def loadHistory(history_path:Path)->List[dict]:
+    history_path = Path(history_path)
+    if not history_path.exists():
+        return []
+    with open(history_path) as file:
+        return json.load(file)
+
+def appendHistory(history_path:Path, run:dict)->None:
+    history = loadHistory(history_path)
+    history.append(run)
+    with open(history_path, 'w') as file:
+        json.dump(history, file, indent=2)
+
+def compareRuns(history:List[dict], base:int = -2, new:int = -1)->pd.DataFrame:
+    """
+    Compares two runs of the history (by default the last two), one row per stage measured in both runs:
+    | wall base | wall new | wall ratio | peak_mb base | peak_mb new | peak_mb ratio |
+    A ratio below 1 means the new run is faster (or uses less memory).
+    """
+    base_run, new_run = history[base], history[new]
+    stages = [stage for stage in STAGES if stage in base_run['stages'] and stage in new_run['stages']]
+    rows   = {}
+    for stage in stages:
+        row = {}
+        for stat in ['wall', 'peak_mb']:
+            old, cur = base_run['stages'][stage][stat], new_run['stages'][stage][stat]
+            row[f'{stat} base']  = old
+            row[f'{stat} new']   = cur
+            row[f'{stat} ratio'] = cur / old if old else float('nan')
+        rows[stage] = row
+    return pd.DataFrame.from_dict(rows, orient='index').rename_axis('Stage')
@@ -0,0 +1,250 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from pyseestko.errors import ResultsStoreError #type: ignore
+from pathlib          import Path
+from typing           import Dict, List, Tuple
+
+import pandas as pd
+import numpy  as np
+import h5py
+import re
+# ==================================================================================
+# CAMPAIGN CUBE
+# ==================================================================================
+# The results of the whole campaign as dense arrays in a chunked HDF5 file, one dataset per variable:
+# | Variable     | Dimensions                                                             |
+# | drift_center | sim_type, nsubs, station, iteration, story, direction                  |
+# | drift_corner | sim_type, nsubs, station, iteration, story, direction                  |
+# | spectra      | sim_type, nsubs, station, iteration, spectra_story, direction, period  |
+# | base_shear   | sim_type, nsubs, station, iteration, component, time                   |
+# The dimensions are HDF5 dimension scales (the coordinates are datasets at the root of the file), so the
+# file can also be opened with xarray (engine='h5netcdf'). Each chunk holds every iteration of a case
+# (sim_type, nsubs, station), so a reduction over the replicas or over the time reads contiguous chunks.
+# The cases without results are NaN.
+CASE_DIMS    = ['sim_type', 'nsubs', 'station', 'iteration']
+SIM_TYPES    = {'FixBase': 1, 'AbsBound': 2, 'DRM': 3}
+CASE_PATTERN = re.compile(r'(?P<sim_type>[A-Za-z]+)_(?P<stories>\d+)f(?P<nsubs>\d+)s_rup_bl_(?P<iteration>\d+)_s(?P<station>\d+)')
+
+def parseCaseName(sim_name:str)->Dict[str, int]:
+    """
+    Returns the sim_type, nsubs, station and iteration of a case name of the results dicts, e.g. 'DRM_20f2s_rup_bl_3_s5'.
+    """
+    match = CASE_PATTERN.fullmatch(sim_name)
+    if match is None:
+        raise ResultsStoreError(f'The case name {sim_name} is not like DRM_20f2s_rup_bl_3_s5')
+    return {'sim_type' : SIM_TYPES[match['sim_type']], 'nsubs': int(match['nsubs']),
+            'station'  : int(match['station']),        'iteration': int(match['iteration'])}
+
+def buildCampaignCube(
+    cube_path          : Path,
+    drifts_df_dict     : Dict[str, pd.DataFrame|None]|None = None,
+    spectra_df_dict    : Dict[str, pd.DataFrame|None]|None = None,
+    base_shear_df_dict : Dict[str, pd.DataFrame|None]|None = None,
+    compression        : str|None = 'gzip',
+    )->Path:
+    """
+    Builds the campaign cube from the results dicts of executeMainQuery (or queryMetricsData).
+
+    Parameters
+    ----------
+    cube_path : Path
+        HDF5 file of the cube, it's replaced if it exists.
+    drifts_df_dict : Dict[str, pd.DataFrame], optional
+        Drift results of each case, indexed by Story with the 'CM x', 'CM y', 'Max x' and 'Max y' columns.
+    spectra_df_dict : Dict[str, pd.DataFrame], optional
+        Spectra results of each case, indexed by the period with 'Story {story} {direction}' columns.
+    base_shear_df_dict : Dict[str, pd.DataFrame], optional
+        Base shear results of each case, indexed by the time step with the 'Shear X', 'Shear Y' and 'Shear Z' columns.
+    compression : str, optional
+        Compression filter of the datasets. The default is 'gzip'.
+
+    Returns
+    -------
+    cube_path : Path
+        Path of the cube.
+    """
+    # The case coordinates are the union of the cases of every dict
+    dicts = {name: {case: df for case, df in df_dict.items() if df is not None}
+             for name, df_dict in [('drift', drifts_df_dict), ('spectra', spectra_df_dict), ('base_shear', base_shear_df_dict)]
+             if df_dict is not None}
+    cases = {case: parseCaseName(case) for df_dict in dicts.values() for case in df_dict}
+    if not cases:
+        raise ResultsStoreError('There are no results to build the cube')
+    coords = {dim: np.array(sorted({keys[dim] for keys in cases.values()}), dtype=np.int16) for dim in CASE_DIMS}
+    shape  = tuple(len(coords[dim]) for dim in CASE_DIMS)
+    def position(case:str)->Tuple[int, ...]:
+        return tuple(int(np.searchsorted(coords[dim], cases[case][dim])) for dim in CASE_DIMS)
+
+    with h5py.File(cube_path, 'w') as cube:
+        for dim, values in coords.items():
+            cube.create_dataset(dim, data=values).make_scale(dim)
+        def create(name:str, dims:List[str], case_shape:Tuple[int, ...]):
+            dataset = cube.create_dataset(name, shape=shape + case_shape, dtype='f8', fillvalue=np.nan,
+                                          chunks=(1, 1, 1, shape[3]) + case_shape, compression=compression)
+            dataset.attrs['dims'] = np.array(CASE_DIMS + dims, dtype='S')
+            for axis, dim in enumerate(CASE_DIMS + dims):
+                dataset.dims[axis].attach_scale(cube[dim])
+            return dataset
+
+        # Drift: story x direction, for the center of mass and the corner
+        if dicts.get('drift'):
+            stories = next(iter(dicts['drift'].values())).index.to_numpy(dtype=np.int16)
+            cube.create_dataset('story', data=stories).make_scale('story')
+            cube.create_dataset('direction', data=np.array(['x', 'y'], dtype='S1')).make_scale('direction')
+            center = create('drift_center', ['story', 'direction'], (len(stories), 2))
+            corner = create('drift_corner', ['story', 'direction'], (len(stories), 2))
+            for case, df in dicts['drift'].items():
+                df = df.reindex(stories)
+                center[position(case)] = df[['CM x', 'CM y']].to_numpy(dtype=float)
+                corner[position(case)] = df[['Max x', 'Max y']].to_numpy(dtype=float)
+
+        # Spectra: story x direction x period
+        if dicts.get('spectra'):
+            first   = next(iter(dicts['spectra'].values()))
+            periods = first.index.to_numpy(dtype=float)
+            stories = np.array(sorted({int(col.split()[1]) for col in first.columns}), dtype=np.int16)
+            if 'direction' not in cube:
+                cube.create_dataset('direction', data=np.array(['x', 'y'], dtype='S1')).make_scale('direction')
+            cube.create_dataset('spectra_story', data=stories).make_scale('spectra_story')
+            cube.create_dataset('period', data=periods).make_scale('period')
+            spectra = create('spectra', ['spectra_story', 'direction', 'period'], (len(stories), 2, len(periods)))
+            columns = [f'Story {story} {direction}' for story in stories for direction in ['x', 'y']]
+            for case, df in dicts['spectra'].items():
+                _checkIndex(case, df.index, periods)
+                spectra[position(case)] = df[columns].to_numpy(dtype=float).T.reshape(len(stories), 2, len(periods))
+
+        # Base shear: component x time, the shorter time series are padded with NaN
+        if dicts.get('base_shear'):
+            times = max((df.index for df in dicts['base_shear'].values()), key=len).to_numpy(dtype=float)
+            cube.create_dataset('component', data=np.array(['x', 'y', 'z'], dtype='S1')).make_scale('component')
+            cube.create_dataset('time', data=times).make_scale('time')
+            base_shear = create('base_shear', ['component', 'time'], (3, len(times)))
+            for case, df in dicts['base_shear'].items():
+                _checkIndex(case, df.index, times[:len(df)])
+                values = np.full((3, len(times)), np.nan)
+                values[:, :len(df)] = df[['Shear X', 'Shear Y', 'Shear Z']].to_numpy(dtype=float).T
+                base_shear[position(case)] = values
+    return Path(cube_path)
+
+def _checkIndex(case:str, index:pd.Index, expected:np.ndarray)->None:
+    if len(index) != len(expected) or not np.allclose(index.to_numpy(dtype=float), expected):
+        raise ResultsStoreError(f'The index of the case {case} is not the same as the one of the other cases')
+
+
+class CampaignCube:
+    """
+    This class reads sub-cubes of the campaign cube lazily: only the hyperslab that bounds the selection
+    is read from the file. The selections are made by coordinate value, e.g.
+    cube.select('drift_center', sim_type=3, station=[1, 2, 3], direction='x')
+    returns an array of dimensions (nsubs, station, iteration, story), the dimensions selected with a
+    scalar are dropped.
+
+    Parameters
+    ----------
+    cube_path : Path
+        HDF5 file written by buildCampaignCube.
+    """
+    def __init__(self, cube_path:Path):
+        self.cube_path = Path(cube_path)
+        self.file      = h5py.File(self.cube_path, 'r')
+        self.variables = [name for name, item in self.file.items() if isinstance(item, h5py.Dataset) and 'dims' in item.attrs]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def dims(self, variable:str)->List[str]:
+        return [dim.decode() for dim in self._dataset(variable).attrs['dims']]
+
+    def coords(self, variable:str)->Dict[str, np.ndarray]:
+        return {dim: self._coord(dim) for dim in self.dims(variable)}
+
+    def _dataset(self, variable:str)->h5py.Dataset:
+        if variable not in self.variables:
+            raise ResultsStoreError(f'Unknown variable {variable}, it must be one of {self.variables}')
+        return self.file[variable]
+
+    def _coord(self, dim:str)->np.ndarray:
+        values = self.file[dim][()]
+        return values.astype(str) if values.dtype.kind == 'S' else values
+
+    def _indexer(self, variable:str, selectors:dict)->Tuple[List[np.ndarray], List[str], Dict[str, np.ndarray]]:
+        # Positions of the selected coordinates of each dimension, and the dimensions kept in the result
+        dims = self.dims(variable)
+        unknown = set(selectors) - set(dims)
+        if unknown:
+            raise ResultsStoreError(f'The variable {variable} has no dimensions {sorted(unknown)}, its dimensions are {dims}')
+        positions, kept, coords = [], [], {}
+        for dim in dims:
+            values = self._coord(dim)
+            if dim not in selectors:
+                positions.append(np.arange(len(values)))
+                kept.append(dim)
+                coords[dim] = values
+                continue
+            selected = selectors[dim]
+            scalar   = np.ndim(selected) == 0
+            selected = np.atleast_1d(selected)
+            lookup   = {value: i for i, value in enumerate(values.tolist())}
+            missing  = [value for value in selected.tolist() if value not in lookup]
+            if missing:
+                raise ResultsStoreError(f'The values {missing} are not in the {dim} coordinate {values.tolist()}')
+            positions.append(np.array([lookup[value] for value in selected.tolist()]))
+            if not scalar:
+                kept.append(dim)
+                coords[dim] = values[positions[-1]]
+        return positions, kept, coords
+
+    def select(self, variable:str, **selectors)->Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Returns the selected sub-cube of a variable and its coordinates. Only the bounding hyperslab is read.
+        """
+        positions, kept, coords = self._indexer(variable, selectors)
+        dataset = self._dataset(variable)
+        bounds  = tuple(slice(int(pos.min()), int(pos.max()) + 1) for pos in positions)
+        values  = dataset[bounds]
+        values  = values[np.ix_(*[pos - bound.start for pos, bound in zip(positions, bounds)])]
+        dims    = self.dims(variable)
+        values  = values.reshape([len(pos) for dim, pos in zip(dims, positions) if dim in kept])
+        return values, coords
+
+    def reduce(self, variable:str, dim:str, how:str = 'mean', **selectors)->Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Reduces the selected sub-cube over a dimension with a NaN aware numpy reduction ('mean', 'max', 'min',
+        'std', 'median' or 'sum'), e.g. the mean over the replicas is reduce('drift_center', 'iteration').
+        The sub-cube is read one value of its first other dimension at a time, so only one slab is in memory.
+        """
+        func = getattr(np, f'nan{how}', None)
+        if func is None:
+            raise ResultsStoreError(f'Unknown reduction {how}')
+        positions, kept, coords = self._indexer(variable, selectors)
+        if dim not in kept:
+            raise ResultsStoreError(f'The dimension {dim} is not in the selection of {variable}, current: {kept}')
+
+        # Iterate over the first kept dimension that is not reduced
+        block_dim = next((d for d in kept if d != dim), None)
+        if block_dim is None:
+            values, _ = self.select(variable, **selectors)
+            return func(values, axis=0), {}
+        axis   = [d for d in kept if d != block_dim].index(dim)
+        blocks = []
+        for value in coords[block_dim].tolist():
+            values, _ = self.select(variable, **{**selectors, block_dim: value})
+            with np.errstate(all='ignore'):
+                blocks.append(func(values, axis=axis))
+        coords = {d: values for d, values in coords.items() if d != dim}
+        return np.stack(blocks, axis=0), coords
+
+    def toDataFrame(self, variable:str, **selectors)->pd.DataFrame:
+        """
+        Returns the selected sub-cube as a long DataFrame, with one column per kept dimension and a 'Value' column.
+        """
+        values, coords = self.select(variable, **selectors)
+        index = pd.MultiIndex.from_product(list(coords.values()), names=list(coords.keys()))
+        return pd.DataFrame({'Value': values.ravel()}, index=index).reset_index()
@@ -2,19 +2,22 @@
 # IMPORT LIBRARIES
 # ==================================================================================
 # Objects
-from mysql.connector.errors import DatabaseError
 from concurrent.futures     import ThreadPoolExecutor
 from pathlib                import Path
-from pyseestko.errors       import SQLFunctionError, DataBaseError
-from pyseestko.db_manager   import DataBaseManager
+from pyseestko.errors       import SQLFunctionError, DataBaseError, ModelInfoError
+from pyseestko.db_manager   import DataBaseManager, isRemoteBackend
 from pyseestko.model_info   import ModelInfo
+from pyseestko.mass_models  import getStoryMasses, buildingType
+from pyseestko.recorder_io  import readRecordingPlan, readCompactRecorders, storyCornerNodes
+from pyseestko.h5drm        import loadInputMotion
+from pyseestko.exporters    import exportNodesXLSX
+from pyseestko.profiling    import StageProfiler, profiled
 from pyseestko              import utilities as utl
 
 # Packages
 import pandas as pd
 import numpy  as np
 import subprocess
-import xlsxwriter 
 import datetime
 import warnings
 import pickle
@@ -51,9 +54,11 @@ class ModelSimulation:
     host : str, optional
         Host of the database. The default is 'localhost'.
     database : str, optional
-        Database name. The default is 'stkodatabase'.
+        Database name, or the path of the file with the kwarg db_backend='sqlite'. The default is 'stkodatabase'.
     kwargs : dict, optional
         Dictionary with the parameters of the simulation. There are a lot of parameters, so it's better to see the code.
+        With profile=True the stages (loadModelInfo, each _compute*DF, each table insert and the serialization) are
+        measured by the StageProfiler in the profiler attribute, see profiling.py.
     """
     
     
@@ -107,6 +112,13 @@ class ModelSimulation:
         self._material          = kwargs.get("soil_mat_name", "Elastoisotropic")
         self._soil_ele_type     = kwargs.get("soil_ele_type", "SSPBrick Element")
         self._mesh_struct       = kwargs.get("mesh_struct", "Structured")
+        self._input_store       = kwargs.get("input_store", None)
+        self._manager           = kwargs.get("manager", None) # An already connected DataBaseManager
+        self._db_backend        = kwargs.get("db_backend", "mysql") # 'sqlite' uses the file database as a local database
+        self._save_profile      = kwargs.get("save_profile", False) # True saves profile.json next to the results, or a path
+        self._profile_benchmark = kwargs.get("profile_benchmark", False) # Store the profile summary in model_benchmark.Profile
+        self.profiler           = kwargs.get("profiler", None) or StageProfiler(enabled=kwargs.get("profile", False),
+                                                                              trace_memory=kwargs.get("trace_memory", False))
         print(f'=========== {self._model_name} =============')
         print('=============================================')
 
@@ -131,11 +143,12 @@ class ModelSimulation:
             self.loadDataFrames()
 
         # Init database tables in case they are not created
-        try:
-            self.model_linearity()
-            self.simulation_type()
-        except DatabaseError as e:
-            pass
+        if self.Manager is not None:
+            try:
+                self.model_linearity()
+                self.simulation_type()
+            except self.Manager.errors:
+                pass
 
 
 
@@ -159,29 +172,30 @@ class ModelSimulation:
         print("----------EXPORTING INTO DATABASE------------|")
         print("---------------------------------------------|")
 
-        # Fills simulation and simulation_sm_input tables
-        self.simulation_model()
-        Model = cursor.lastrowid
-        self.model_specs_box(Model)
-        self.model_specs_global(Model)
+        # Fills simulation and simulation_sm_input tables, the upload is profiled as the simulation stage
+        with self.profiler.stage('simulation'):
+            self.simulation_model()
+            Model = cursor.lastrowid
+            self.model_specs_box(Model)
+            self.model_specs_global(Model)
 
-        SM_Input = self.simulation_sm_input()
+            SM_Input = self.simulation_sm_input()
 
-        # Fet date
-        date = datetime.datetime.now()
-        date = date.strftime("%B %d, %Y")
+            # Fet date
+            date = datetime.datetime.now()
+            date = date.strftime("%B %d, %Y")
 
-        # Insert data into database
-        insert_query = (
-            "INSERT INTO simulation("
-            "idModel, idSM_Input,"
-            "idType, SimStage, SimOptions, Simdate,"
-            "Comments) VALUES(%s,%s,%s,%s,%s,%s,%s)")
-        values = (Model, SM_Input,sim_type, sim_stage, sim_opt, date, sim_comments)
-        try:
-            self.Manager.insert_data(insert_query, values)
-        except Exception as e:
-            raise SQLFunctionError("Error while updating simulation table") from e
+            # Insert data into database
+            insert_query = (
+                "INSERT INTO simulation("
+                "idModel, idSM_Input,"
+                "idType, SimStage, SimOptions, Simdate,"
+                "Comments) VALUES(%s,%s,%s,%s,%s,%s,%s)")
+            values = (Model, SM_Input,sim_type, sim_stage, sim_opt, date, sim_comments)
+            try:
+                self.Manager.insert_data(insert_query, values)
+            except Exception as e:
+                raise SQLFunctionError("Error while updating simulation table") from e
         end_time = time.time()
         print("simulation table updated correctly!\n")
         print(f"Time elapsed: {end_time-init_time:.2f} seconds")
@@ -189,6 +203,10 @@ class ModelSimulation:
         print("---------------------------------------------|")
         print("---------------------------------------------|\n")
 
+        # Save the profile of the stages
+        self._exportProfile()
+
+    @profiled()
     def simulation_sm_input(self, **kwargs):
         """
         This function is used to export the simulation sm input into the database.
@@ -229,6 +247,7 @@ class ModelSimulation:
                 raise SQLFunctionError("Error while updating simulation_sm_input table") from e
         return sm_input_id
 
+    @profiled()
     def simulation_model(self, **kwargs):
         """
         This function is used to export data into the simulation_model table database.
@@ -241,6 +260,7 @@ class ModelSimulation:
         # Fills benchmark, structure perfomance and specs structure tables
         self.model_benchmark()
         Benchmark = cursor.lastrowid
+        self._benchmark_id = Benchmark
         self.model_structure_perfomance()
         StructurePerfomance = cursor.lastrowid
         SpecsStructure = self.model_specs_structure()
@@ -256,6 +276,7 @@ class ModelSimulation:
         except Exception as e:
                 raise SQLFunctionError("Error while updating simulation_model table") from e
 
+    @profiled()
     def model_benchmark(self, **kwargs):
         # ------------------------------------------------------------------------------------------------------------------------------------
         # Get calculus time from log file, nodes, threads and comments
@@ -287,6 +308,7 @@ class ModelSimulation:
         except Exception as e:
                 raise SQLFunctionError("Error while updating model_benchmark table") from e
 
+    @profiled()
     def model_specs_structure(self, **kwargs):
         """
         This function is used to export data into the model_specs_structure table database.
@@ -322,6 +344,7 @@ class ModelSimulation:
         print("model_specs_structure table updated correctly!\n")
         return model_specs_structure_id
 
+    @profiled()
     def model_specs_box(self, idModel, **kwargs):
         """
         This function is used to export data into the model_specs_box table database.
@@ -341,6 +364,7 @@ class ModelSimulation:
         except Exception as e:
                 raise SQLFunctionError("Error while updating model_specs_box table") from e
 
+    @profiled()
     def model_specs_global(self, idModel, **kwargs):
         cursor = self.Manager.cursor
         comments = kwargs.get("gspecs_comments", self._gspecs_comments)
@@ -357,6 +381,7 @@ class ModelSimulation:
         except Exception as e:
                 raise SQLFunctionError("Error while updating model_specs_global table") from e
 
+    @profiled()
     def model_structure_perfomance(self, **kwargs):
         """
         This function is used to export data into the model_structure_perfomance table database.
@@ -386,7 +411,8 @@ class ModelSimulation:
         MaxDriftPerFloor = cursor.lastrowid
 
         # Fills the story accelerations
-        dump_data = self.paralelize_serialization([self.accel_mdf[::self._jump], self.story_nodes_df.iloc[8:]])
+        with self.profiler.stage('serialization'):
+            dump_data = self.paralelize_serialization([self.accel_mdf[::self._jump], self.story_nodes_df.iloc[8:]])
         #StoryAccelerations = pickle.dumps(self.accel_mdf[::self._jump])
         StoryAccelerations = dump_data[0]
 
@@ -408,6 +434,7 @@ class ModelSimulation:
         except Exception as e:
             raise SQLFunctionError("Error while updating model_structure_perfomance table") from e
 
+    @profiled()
     def structure_abs_acceleration(self, **kwargs):
         """
         This function is used to export data into the structure_abs_acceleration table database.
@@ -431,6 +458,7 @@ class ModelSimulation:
         except Exception as e:
                 raise SQLFunctionError("Error while updating structure_abs_acceleration table") from e
 
+    @profiled()
     def structure_relative_displacements(self, **kwargs):
         """
         This function is used to export data into the structure_relative_displacements table database.
@@ -454,6 +482,7 @@ class ModelSimulation:
         except Exception as e:
             raise SQLFunctionError("Error while updating structure_relative_displacements table") from e
 
+    @profiled()
     def structure_max_drift_per_floor(self, **kwargs):
         """
         This function is used to export data into the structure_max_drift_per_floor table database.
@@ -465,6 +494,25 @@ class ModelSimulation:
         # Initialize parameters
         cursor = self.Manager.cursor
         units = kwargs.get("max_drift_units", self._max_drift_units)
+        center_drifts, corner_drifts = self._computeMaxDriftsPerFloor()
+
+        # Upload results to the database
+        insert_query = ("INSERT INTO structure_max_drift_per_floor ("
+                        "MaxDriftCornerX, MaxDriftCornerY, MaxDriftCenterX, "
+                        "MaxDriftCenterY, Units) VALUES (%s,%s,%s,%s,%s)")
+        values = (pickle.dumps(corner_drifts[0]),pickle.dumps(corner_drifts[1]),pickle.dumps(center_drifts[0]),pickle.dumps(center_drifts[1]),units)
+        try:
+            cursor.execute(insert_query, values)
+            print("structure_max_drift_per_floor table updated correctly!\n")
+        except Exception as e:
+                raise SQLFunctionError("Error while updating structure_max_drift_per_floor table") from e
+
+    @profiled()
+    def _computeMaxDriftsPerFloor(self):
+        """
+        This function is used to compute the max inter-storey drift of each story, in the center (mean of the
+        4 corners) and in the corners, for the X (loc 0) and Y (loc 1) directions.
+        """
         displacements = self.displ_dfs
         center_drifts = [[], []]
         corner_drifts = [[], []]
@@ -484,17 +532,9 @@ class ModelSimulation:
                 corner_drifts[loc].append(corner)
             center_drifts[loc].reverse()
             corner_drifts[loc].reverse()
-        # Upload results to the database
-        insert_query = ("INSERT INTO structure_max_drift_per_floor ("
-                        "MaxDriftCornerX, MaxDriftCornerY, MaxDriftCenterX, "
-                        "MaxDriftCenterY, Units) VALUES (%s,%s,%s,%s,%s)")
-        values = (pickle.dumps(corner_drifts[0]),pickle.dumps(corner_drifts[1]),pickle.dumps(center_drifts[0]),pickle.dumps(center_drifts[1]),units)
-        try:
-            cursor.execute(insert_query, values)
-            print("structure_max_drift_per_floor table updated correctly!\n")
-        except Exception as e:
-                raise SQLFunctionError("Error while updating structure_max_drift_per_floor table") from e
+        return center_drifts, corner_drifts
 
+    @profiled()
     def structure_base_shear(self, **kwargs):
         """
         This function is used to export data into the structure_base_shear table database using
@@ -525,6 +565,7 @@ class ModelSimulation:
         except Exception as e:
                 raise SQLFunctionError("Error while updating structure_base_shear table") from e
 
+    @profiled()
     def structure_max_base_shear(self, **kwargs):
         """
         This function is used to export data into the structure_max_base_shear table database.
@@ -555,6 +596,7 @@ class ModelSimulation:
         except Exception as e:
                 raise SQLFunctionError("Error while updating structure_max_base_shear table") from e
 
+    @profiled()
     def sm_input_pga(self, **kwargs):
         """
         This function is used to export data into the sm_input_pga table database.
@@ -597,6 +639,7 @@ class ModelSimulation:
         except Exception as e:
                 raise SQLFunctionError("Error while updating sm_input_pga table") from e
 
+    @profiled()
     def sm_input_spectrum(self, **kwargs):
         """
         This function is used to export data into the sm_input_spectrum table database.
@@ -637,6 +680,7 @@ class ModelSimulation:
     # ==================================================================================
     # LOAD SIMULATION INFORMATION AND DATA POST PROCESSING IN PANDAS DATAFRAMES
     # ==================================================================================
+    @profiled()
     def loadModelInfo(self, main_path, verbose=True):
         # Initialize Model Info
         self.model_info = ModelInfo(main_path, sim_type=self._sim_type,verbose=verbose)
@@ -758,19 +802,25 @@ class ModelSimulation:
         self.npartitions    = self.model_info.npartitions
         self.glob_nnodes    = self.model_info.glob_nnodes
         self.glob_nelements = self.model_info.glob_nelements
-        self.str_nnodes,\
-        self.str_nelements,\
-        self.soil_nnodes,\
-        self.soil_nelements = self.Manager.get_nodes_and_elements(self.glob_nnodes,
-                                                                  self.glob_nelements,
-                                                                  self.stories,
-                                                                  self.subs,
-                                                                  self._sim_type)
+        if self.Manager is not None:
+            self.str_nnodes,\
+            self.str_nelements,\
+            self.soil_nnodes,\
+            self.soil_nelements = self.Manager.get_nodes_and_elements(self.glob_nnodes,
+                                                                      self.glob_nelements,
+                                                                      self.stories,
+                                                                      self.subs,
+                                                                      self._sim_type)
+        else:
+            # Without a database the structure counts of the soil models are unknown, they are only used by the uploads
+            self.str_nnodes, self.str_nelements, self.soil_nnodes, self.soil_nelements = self.glob_nnodes, self.glob_nelements, 0, 0
         if verbose: print('Done!\n')
 
+    @profiled()
     def loadDataFrames(self):
     # Compute DataFrames
         print('Computing DataFrames...')
+        self._input_acce_df            = None
         self.accel_mdf, self.accel_dfs = self._computeAbsAccelerationsDF()
         self.displ_mdf, self.displ_dfs = self._computeRelativeDisplacementsDF()
         self.react_mdf, self.react_dfs = self._computeReactionForcesDF()
@@ -780,6 +830,7 @@ class ModelSimulation:
         self.base_story_df             = self._computeBaseDF()[0]
         self.base_displ_df             = self._computeBaseDF()[1]
         self.input_df                  = self._computeInputAccelerationsDF()
+        self._base_shear_results       = None
         print('Done!\n')
 
     def model_linearity(self):
@@ -826,21 +877,51 @@ class ModelSimulation:
         This function is used to connect to the database.
         """
         import time
-        if self._test_mode:
+        self.Manager = self._manager
+        if self.Manager is None and not isRemoteBackend(self._db_backend):
+            # Local databases don't need the ssh tunnel
+            print('Connecting to the database...')
+            self.Manager = DataBaseManager(self.db_user, self.db_password, self.db_host,
+                                                self.db_database, backend=self._db_backend)
+            print(f"Succesfully connected to '{self.db_database}' {self._db_backend} database.")
+        elif self.Manager is None and self._test_mode:
             print('Connecting to the database...')
             ModelSimulation.initialize_ssh_tunnel()
             time.sleep(1)
             self.Manager = DataBaseManager(self.db_user, self.db_password, self.db_host,
-                                                self.db_database)
+                                                self.db_database, backend=self._db_backend)
             print(f"Succesfully connected to '{self.db_database}' database as '{self.db_user}'.")
         print('Done!\n')
 
+    def _exportProfile(self):
+        """
+        This function is used to save the profile of the stages after the upload, as profile.json next to the
+        results (or in the save_profile path) and its summary (one row per stage) in the Profile column of the
+        model_benchmark row of the upload. The databases created without that column have to be migrated once
+        with DataBaseManager.add_benchmark_profile_column.
+        """
+        if not self.profiler.enabled:
+            return
+        if self._save_profile:
+            file_path = self.path / 'profile.json' if self._save_profile is True else Path(self._save_profile)
+            self.profiler.save(file_path)
+            print(f"Profile saved in {file_path}\n")
+        if self._profile_benchmark and getattr(self, '_benchmark_id', None) is not None:
+            try:
+                self.Manager.insert_data("UPDATE model_benchmark SET Profile = %s WHERE IDBenchmark = %s",
+                                         (json.dumps(self.profiler.toDict(summary=True)), self._benchmark_id))
+                print("model_benchmark profile updated correctly!\n")
+            except Exception as e:
+                raise SQLFunctionError("Error while updating the profile of the model_benchmark table, if the table "
+                                       "has no Profile column run DataBaseManager.add_benchmark_profile_column once") from e
+
 
 
 
     # ==================================================================================
     # COMPUTE DATAFRAMES FOR ACCELERATIONS AND DISPLACEMENTS
     # ==================================================================================
+    @profiled()
     def _computeBaseShearByAccelerations(self):
         """
         This function is used to export data into the structure_base_shear table database using
@@ -850,88 +931,32 @@ class ModelSimulation:
         Story shear is computed as:
           -> The mean of the acceleration in the 4 nodes of the story dot mass of the story
           -> Story mass: Area * Thickness * Density + Core Area * Core Thickness * Density
-        Then, summ all the story shears to get the base shear
+        Then, summ all the story shears to get the base shear.
+        The story masses come from the mass models registry (see mass_models.py) and the result
+        is computed once per loaded DataFrames, since it's used by several tables.
         """
-        # Initialize parameters
-        density  = 2.4 # Megagramos/m3
-        density1 = 4.1
-        density2 = 5.45
-        model_dic = {20:{
-                        'areas':{
-                            "slabs_area"     : 704.0  , #m2
-                            "sub_slabs_area" : 1408.0 , #m2
-                            "external_core"  : 28.0   , #m2
-                            "internal_core_x": 112.0  , #m2
-                            "internal_core_y": 94.5   , #m2
-                            'perimetral_wall': 912    , #m2
-                            'columns_sup'    : 3.5*10 , #m (10 columns of height 3.5)
-                            'columns_sub'    : 3.0*10}, #m
-                        'thickness':{
-                            "slabs_sup"      :np.array([0.15] * self.stories)                            ,
-                            "slabs_sub"      :np.array([0.15] * self.subs)                               ,
-                            "external_core"  :np.array([0.40] * 4 + [0.30] * 6 + [0.20] * 5 + [0.15] * 5),
-                            "internal_core_x":np.array([0.25] * 4 + [0.15] * 6 + [0.15] * 5 + [0.15] * 5),
-                            "internal_core_y":np.array([0.35] * 4 + [0.25] * 6 + [0.15] * 5 + [0.15] * 5),
-                            'perimetral_wall':np.array([0.45] * self.subs)                               ,
-                            "columns_sup"    :np.array([0.8**2]*6 + [0.7**2]*5 + [0.6**2]*3 + [0.5**2]*3 + [0.4**2]*3),
-                            "columns_sub"    :np.array([0.9**2]*self.subs)}}, # this is not a thickness is the area of the columns}
-                    }
-
-        # Compute Story Mases in a dict
-        mass_sup = {20: {k+1:
-                      model_dic[20]['areas']["slabs_area"]      *  model_dic[20]['thickness']["slabs_sup"][k]         * density2
-                    # Add bottom mass
-                    + model_dic[20]['areas']["external_core"]   *  model_dic[20]['thickness']["external_core"][k]     * density/2
-                    + model_dic[20]['areas']["internal_core_x"] *  model_dic[20]['thickness']["internal_core_x"][k]   * density/2
-                    + model_dic[20]['areas']["internal_core_y"] *  model_dic[20]['thickness']["internal_core_y"][k]   * density/2
-                    + model_dic[20]['areas']['columns_sup']     *  model_dic[20]['thickness']['columns_sup'][k]       * density/2
-                    # Add top mass
-                    + (0 if k == self.stories-1 else
-                    + model_dic[20]['areas']["external_core"]   *  model_dic[20]['thickness']["external_core"]  [k+1] * density/2
-                    + model_dic[20]['areas']["internal_core_x"] *  model_dic[20]['thickness']["internal_core_x"][k+1] * density/2
-                    + model_dic[20]['areas']["internal_core_y"] *  model_dic[20]['thickness']["internal_core_y"][k+1] * density/2
-                    + model_dic[20]['areas']['columns_sup']     *  model_dic[20]['thickness']['columns_sup']    [k+1] * density/2)
-                    for k in range(self.stories)}}
-        mass_base = {20:{
-                        0:
-                        model_dic[20]['areas']["sub_slabs_area"]  *  model_dic[20]['thickness']["slabs_sub"][1]       * density1   +
-                        # Add bottom mass
-                        model_dic[20]['areas']["perimetral_wall"] *  model_dic[20]['thickness']["perimetral_wall"][1] * density/2 +
-                        model_dic[20]['areas']['columns_sub']     *  model_dic[20]['thickness']['columns_sub'][1]     * density/2 +
-                        # Add top mass
-                        model_dic[20]['areas']["external_core"]   *  model_dic[20]['thickness']["external_core"][2]   * density/2 +
-                        model_dic[20]['areas']["internal_core_x"] *  model_dic[20]['thickness']["internal_core_x"][2] * density/2 +
-                        model_dic[20]['areas']["internal_core_y"] *  model_dic[20]['thickness']["internal_core_y"][2] * density/2 +
-                        model_dic[20]['areas']['columns_sup']     *  model_dic[20]['thickness']['columns_sup'][2]     * density/2}}
-        mass_sub = {20: {k-1:
-                        model_dic[20]['areas']["sub_slabs_area"]  *  model_dic[20]['thickness']["slabs_sub"][k]       * density1 +
-                        model_dic[20]['areas']["perimetral_wall"] *  model_dic[20]['thickness']["perimetral_wall"][k] * density1 +
-                        model_dic[20]['areas']['columns_sub']     *  model_dic[20]['thickness']['columns_sub'][k]     * density1
-                    for k in range(0, -(self.subs-1), -1)},
-                    }
-        factor = {20:{2:0.93, 4:0.97}} # Factor of 4 subs may change cause it's not studied yet
-        self.masses_series = pd.Series({**mass_sub[self.stories], **mass_base[self.stories], **mass_sup[self.stories]}).sort_index()*factor[self.stories][self.subs]
-
-        # For each story, compute the mean acceleration in the 4 nodes of the story
+        # Return the stored result if it was already computed
+        if getattr(self, '_base_shear_results', None) is not None:
+            return self._base_shear_results
+
+        # Get the story masses of the building, ordered from the level -subs+1 to the last story
+        masses = getStoryMasses(buildingType(self.stories, self.subs))
+
+        # For each story, get the mean acceleration in the 4 nodes of the story
         mean_accel_df = self.story_mean_accel_df[self.story_mean_accel_df.columns[1:]]
+        self.masses_series = pd.Series(masses, index=mean_accel_df.columns)
 
-        # Compute the shear for every story and direction (X,Y,Z) and every timestep
-        self.masses_series.index = mean_accel_df.columns
-        stories_shear_df = mean_accel_df.mul(self.masses_series, axis=1)
-        stories_shear_df['Shear Base'] = stories_shear_df.sum(axis=1)
+        # Compute the base shear for every direction (X,Y,Z) and every timestep: (time x story) @ (story,)
+        base_shear_ss = pd.Series(mean_accel_df.to_numpy() @ masses, index=mean_accel_df.index)
 
         # Return the base shear for every direction in the same format as the function
         # structure_base_shear
-        shear_x = stories_shear_df.xs('x',level='Dir')['Shear Base'].tolist()
-        shear_y = stories_shear_df.xs('y',level='Dir')['Shear Base'].tolist()
-        shear_z = stories_shear_df.xs('z',level='Dir')['Shear Base'].tolist()
-
-        max_shear_x = stories_shear_df.xs('x',level='Dir')['Shear Base'].abs().max()
-        max_shear_y = stories_shear_df.xs('y',level='Dir')['Shear Base'].abs().max()
-        max_shear_z = stories_shear_df.xs('z',level='Dir')['Shear Base'].abs().max()
-
-        return [shear_x, shear_y, shear_z], [max_shear_x, max_shear_y, max_shear_z]
+        shears     = [base_shear_ss.xs(direction, level='Dir') for direction in ['x', 'y', 'z']]
+        max_shears = [shear.abs().max() for shear in shears]
+        self._base_shear_results = [shear.tolist() for shear in shears], max_shears
+        return self._base_shear_results
 
+    @profiled()
     def _computeReactionForcesDF(self):
         """
         This function is used to compute the nodes accelerations DataFrame.
@@ -978,6 +1003,7 @@ class ModelSimulation:
         react_df_z = nodes_react_df.xs('z', level='Dir')
         return nodes_react_df, [react_df_x, react_df_y, react_df_z]
 
+    @profiled()
     def _computeCoordsDF(self):
         """
         This function is used to get the coordinates of the model.
@@ -987,10 +1013,18 @@ class ModelSimulation:
         df = df.sort_values('coord z')
         return df
 
+    @profiled()
     def _computeStoryNodesDF(self):
         """
         This function is used to get the nodes of each story of the model.
         """
+        # Use the corner nodes of the story classification of the plugin if the results have it
+        corner_nodes = self._storyCornerNodes()
+        if corner_nodes is not None:
+            flattened_data = [(story, f"Node {node}", *[self.coordinates[f"Node {node}"][f"coord {axis}"] for axis in "xyz"])
+                              for story, nodes in corner_nodes.items() for node in nodes]
+            return pd.DataFrame(flattened_data,columns=['Story', 'Node', 'x', 'y', 'z']).set_index(['Story', 'Node'])
+
         sort_by_story = sorted(self.coordinates.items(), key=lambda x: (x[1]["coord z"], x[1]["coord x"], x[1]["coord y"]))
         stories_nodes = {f"Level {i - self.subs}": {} for i in range(self.stories + self.subs + 1)}
 
@@ -1006,56 +1040,65 @@ class ModelSimulation:
         multi_index_df = pd.DataFrame(flattened_data,columns=['Story', 'Node', 'x', 'y', 'z']).set_index(['Story', 'Node'])
         return multi_index_df
 
+    def _storyCornerNodes(self):
+        """
+        This function is used to get the corner nodes of each story from the story classification of the
+        AlbertisRecorder plugin (the stories of the accelerations plan or of the manifest), or None if the
+        results don't have it.
+        """
+        plan    = readRecordingPlan(self.path/'PartitionsInfo', 'accel')
+        stories = plan.get('stories') if plan is not None else None
+        if not stories and self.model_info.manifest:
+            stories = self.model_info.manifest.get('stories')
+        return storyCornerNodes(stories) if stories else None
+
+    def _computeStoryNodesPermutation(self):
+        """
+        This function is used to get the positions of the nodes of each story in the columns of the accelerations
+        DataFrame, sorted by story, and the position where each story starts. The nodes of the story i are
+        accel_mdf.columns[permutation[starts[i]:starts[i+1]]].
+        """
+        level_lst   = [i for i in range(-self.subs, self.stories + 1)]
+        nodes_df    = self.story_nodes_df.loc[level_lst]
+        permutation = self.accel_mdf.columns.get_indexer(nodes_df.index.get_level_values('Node'))
+        if (permutation < 0).any():
+            raise ModelInfoError('There are story nodes without recorded accelerations')
+        counts = nodes_df.groupby(level='Story', sort=False).size().reindex(level_lst).to_numpy()
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        return permutation, starts, counts
+
+    @profiled()
     def _computeStoryMeanAccelerationsDF(self):
         """
         This function is used to compute the mean accelerations of each story.
+        The nodes are gathered sorted by story and all the story means (every time step and direction)
+        are computed at once with np.add.reduceat.
         """
-        story_mean_acceleration_df = pd.DataFrame(index=self.accel_mdf.index)
         level_lst = [i for i in range(-self.subs, self.stories + 1)]
-        for story in level_lst:
-            story_nodes_lst = self.story_nodes_df.xs(story, level='Story').index
-            story_acce_df = self.accel_mdf[story_nodes_lst].copy()
-            story_acce_df.loc[:,'Average'] = story_acce_df.mean(axis=1)
-            story_mean_acceleration_df[f'Story {story}'] = story_acce_df['Average']
-        story_mean_acceleration_df.round(4)
+        permutation, starts, counts = self._computeStoryNodesPermutation()
+        accel = self.accel_mdf.to_numpy()[:, permutation]
+        if np.isnan(accel).any():
+            # Skip the missing values as DataFrame.mean does
+            missing = np.isnan(accel)
+            means   = np.add.reduceat(np.where(missing, 0.0, accel), starts, axis=1) / np.add.reduceat(~missing, starts, axis=1)
+        else:
+            means   = np.add.reduceat(accel, starts, axis=1) / counts
+        story_mean_acceleration_df = pd.DataFrame(means, index=self.accel_mdf.index, columns=[f'Story {story}' for story in level_lst])
         return story_mean_acceleration_df
 
+    @profiled()
     def _computeRelativeDisplacementsDF(self):
         """
         This function is used to compute the nodes accelerations DataFrame.
         """
-        files = [file.name for file in (self.path/'Displacements').iterdir() if file.is_file()]
-        directions = ['x', 'y', 'z']
-        data_dict = {}
-
-        # Extract node names and sort it
-        node_numbers = [int(file_name.split("_")[1].split("-")[0]) for file_name in files]
-        node_numbers.sort()
-        num_rows = 0
-
-         # Read data from each node and store it in a dictionary
-        for node_number in node_numbers:
-            # Find the file corresponding to the node number
-            file_name = next(file for file in files if f"_{node_number}-" in file)
-            node = f"Node {node_number}"
-            file_path = f"{self.path}/Displacements/{file_name}"
-
-            # Read data with space separator
-            data = pd.read_csv(file_path, sep=' ', header=None).values.flatten()
-
-            # Add vector of results to the dictionary, key = node, values = file data
-            data_dict[node] = data[:48000]
-            num_rows = len(data)
-
-        time_steps = self.timeseries[:int(num_rows/3)]
-        multi_index = pd.MultiIndex.from_product([time_steps, directions], names=['Time Step', 'Dir'])
-        nodes_displ_df = pd.DataFrame(data_dict, index=multi_index)
+        nodes_displ_df = self._computeNodesResponseDF('disp', 'Displacements', corners_only=True)
         nodes_displ_df = nodes_displ_df.round(4)
         displ_x_df = nodes_displ_df.xs('x', level='Dir')
         displ_y_df = nodes_displ_df.xs('y', level='Dir')
         displ_z_df = nodes_displ_df.xs('z', level='Dir')
         return nodes_displ_df, [displ_x_df, displ_y_df, displ_z_df]
 
+    @profiled()
     def _computeAbsAccelerationsDF(self):
         """
         This function is used to compute the absolute accelerations DataFrame.
@@ -1070,14 +1113,19 @@ class ModelSimulation:
 
         return accel_df, [accel_df_x, accel_df_y, accel_df_z]
 
+    @profiled()
     def _computeInputAccelerationsDF(self):
         """
         This function is used to compute the input accelerations DataFrame.
+        The input is read once per loaded DataFrames from the input.h5drm file (or its sidecar cache),
+        with the acceleration_[e/n/z].txt files as fallback.
         """
-        # Read each file with soil accelerations
-        acc_e = pd.read_csv(self.path/'acceleration_e.txt', sep=" ", header=None)[:len(self.timeseries)]
-        acc_n = pd.read_csv(self.path/'acceleration_n.txt', sep=" ", header=None)[:len(self.timeseries)]
-        acc_z = pd.read_csv(self.path/'acceleration_z.txt', sep=" ", header=None)[:len(self.timeseries)]
+        # Return the stored input if it was already read
+        if getattr(self, '_input_acce_df', None) is not None:
+            return self._input_acce_df
+
+        # Read the soil accelerations (time step x channel e, n, z)
+        acc_data = loadInputMotion(self.path, 'acceleration', len(self.timeseries), store_path=self._input_store)
 
         # Create a time step series with the same length as the accelerations
         time_steps = self.timeseries
@@ -1086,18 +1134,46 @@ class ModelSimulation:
         directions = ['x', 'y', 'z']
         multi_index = pd.MultiIndex.from_product([time_steps, directions], names=['Time Step', 'Dir'])
 
-        # Concatenate and asociate the data to the multiindex
-        acc_data = np.stack((acc_e, acc_n, acc_z)).flatten('F')
-        input_acce_df = pd.DataFrame(acc_data, index=multi_index, columns=['Acceleration'])*self._cfactor
-
+        # Asociate the data to the multiindex, each time step has the e, n and z channels
+        input_acce_df = pd.DataFrame(acc_data.reshape(-1), index=multi_index, columns=['Acceleration'])*self._cfactor
+        self._input_acce_df = input_acce_df
         return input_acce_df
 
+    def _loadRecordingPlan(self, response:str):
+        """
+        This function is used to get the recording plan of the response written by the AlbertisRecorder
+        plugin (compact option), or None if the results were recorded with one file per node.
+        """
+        plan = readRecordingPlan(self.path/'PartitionsInfo', response)
+        if plan is not None and plan['dT'] is not None and not np.isclose(plan['dT'], self._time_step):
+            warnings.warn(f"The {response} results were recorded every {plan['dT']} s but the time step is {self._time_step} s.")
+        return plan
+
+    @profiled()
     def _computeNodesAccelerationsDF(self):
         """
         This function is used to compute the nodes accelerations DataFrame.
         """
+        return self._computeNodesResponseDF('accel', 'Accelerations', corners_only=True)
+
+    @profiled()
+    def _computeNodesResponseDF(self, response:str, folder:str, corners_only:bool = False):
+        """
+        This function is used to read the recorded response of every node ('accel', 'disp' or 'reaction')
+        as a DataFrame indexed by (Time Step, Dir) with one 'Node {id}' column per node.
+        With corners_only, the multi-node recorders are read only in the story corner nodes of their plan,
+        the nodes used by the analysis.
+        """
+        # Read the multi-node recorders if the results were recorded with a recording plan
+        plan = self._loadRecordingPlan(response)
+        if plan is not None:
+            nodes = None
+            if corners_only and plan.get('stories'):
+                nodes = [node for story_nodes in storyCornerNodes(plan['stories']).values() for node in story_nodes]
+            return readCompactRecorders(self.path, plan, self.timeseries, max_steps=16000, nodes=nodes)
+
         # Initialize parameters
-        files = [file.name for file in (self.path/'Accelerations').iterdir() if file.is_file()]
+        files = [file.name for file in (self.path/folder).iterdir() if file.is_file()]
         directions = ['x', 'y', 'z']
         data_dict = {}
 
@@ -1111,7 +1187,7 @@ class ModelSimulation:
             # Find the file corresponding to the node number
             file_name = next(file for file in files if f"_{node_number}-" in file)
             node = f"Node {node_number}"
-            file_path = f"{self.path}/Accelerations/{file_name}"
+            file_path = f"{self.path}/{folder}/{file_name}"
 
             # Read data with space separator
             data = pd.read_csv(file_path, sep=' ', header=None).values.flatten()
@@ -1123,14 +1199,16 @@ class ModelSimulation:
         # Create DataFrame with MultiIndex and data
         time_steps = self.timeseries[:int(num_rows/3)]
         multi_index = pd.MultiIndex.from_product([time_steps, directions], names=['Time Step', 'Dir'])
-        nodes_acce_df = pd.DataFrame(data_dict, index=multi_index)
-        return nodes_acce_df
+        nodes_df = pd.DataFrame(data_dict, index=multi_index)
+        return nodes_df
 
+    @profiled()
     def _computeBaseDF(self):
         base_story_df  = self.story_nodes_df.xs(0, level='Story')
         base_displ_df  = self.displ_mdf[base_story_df.index].xs('z',level='Dir')
         return base_story_df, base_displ_df
 
+    @profiled()
     def _computeBaseRotationDF(self):
         """
         This function is used to compute the base rotation DataFrame.
@@ -1197,257 +1275,26 @@ class ModelSimulation:
     # ==================================================================================
     # EXTERNAL FILES GENERATIONS AND COMPLEMENTARY METHODS
     # ==================================================================================
-    def create_reaction_xlsx(self):
-        import os
-
-        #create nodes sorted list
-        nodes = []
-        path = os.getcwd()
-        results = os.listdir(f'{path}/Reactions/')
-
-        #sorting nodes
-        for result in results:
-            node = (int(result.split('-')[1].split('_')[1]))
-            nodes.append(node)
-        nodes.sort()
-
-        #sorting files in list
-        results_sorted = []
-        for node in nodes:
-            nodeid = f'_{node}-'
-            for result in results:
-                if nodeid in result:
-                    results_sorted.append(result)
-
-        #define format
-        workbook = xlsxwriter.Workbook('reactions.xlsx')
-        main_format = workbook.add_format({'bold':True})
-        main_format.set_align('center')
-        second_format = workbook.add_format({'font_color': 'black'})
-        second_format.set_align('center')
-
-
-        #open book and start writing in shells
-        x_sheet = workbook.add_worksheet('Reaction East')
-        y_sheet = workbook.add_worksheet('Reaction North')
-        z_sheet = workbook.add_worksheet('Reaction Vertical')
-        x_sheet.write(0,0,'Timestep/NodeID',main_format)
-        y_sheet.write(0,0,'Timestep/NodeID',main_format)
-        z_sheet.write(0,0,'Timestep/NodeID',main_format)
-        x_sheet.set_column(0,0,17,main_format)
-        y_sheet.set_column(0,0,17,main_format)
-        z_sheet.set_column(0,0,17,main_format)
-
-
-        #fill rows names
-        row = 1
-        column = 0
-        time_step = 0.0
-        while time_step < self._total_time:
-            x_sheet.write(row,column,f'{time_step:.3f}',main_format)
-            y_sheet.write(row,column,f'{time_step:.3f}',main_format)
-            z_sheet.write(row,column,f'{time_step:.3f}',main_format)
-            time_step += self._time_step
-            row +=1
-
-        #fill columns names
-        row = 0
-        column = 1
-        files = []
-        for node in (range(len(nodes))):
-            x_sheet.write(row,column,f'Node {nodes[node]}',main_format)
-            y_sheet.write(row,column,f'Node {nodes[node]}',main_format)
-            z_sheet.write(row,column,f'Node {nodes[node]}',main_format)
-            column+=1
-
-        #fill matrix in correct values, here the file is the column and it's results are the rows
-        files = [open(f'Reactions/{file}','r') for file in results_sorted]
-        column = 1
-        for file in range(len(files)):
-            nodal_result = [[(num) for num in line.split('\n')] for line in files[file]]
-            row = 1
-            for row_val in nodal_result:
-                reaction_X = float(row_val[0].split(' ')[0])
-                reaction_Y = float(row_val[0].split(' ')[1])
-                reaction_Z = float(row_val[0].split(' ')[2])
-                x_sheet.write(row,column,reaction_X,second_format)
-                y_sheet.write(row,column,reaction_Y,second_format)
-                z_sheet.write(row,column,reaction_Z,second_format)
-                row += 1
-
-            column += 1
-
-        workbook.close()
+    def create_reaction_xlsx(self, workers:int|None = 1):
+        """
+        This function is used to export the reactions of every node to reactions.xlsx, see exporters.exportNodesXLSX.
+        """
+        nodes_df = self._computeNodesResponseDF('reaction', 'Reactions')
+        return exportNodesXLSX(nodes_df, self.path/'reactions.xlsx', 'Reaction', workers)
 
-    @staticmethod
-    def create_displacement_xlsx():
-
-        import os
-
-        #create nodes sorted list
-        nodes = []
-        path = os.getcwd()
-        results = os.listdir(f'{path}/Displacements/')
-
-        #sorting nodes
-        for result in results:
-            node = (int(result.split('-')[1].split('_')[1]))
-            nodes.append(node)
-        nodes.sort()
-
-        #sorting files in list
-        results_sorted = []
-        for node in nodes:
-            nodeid = f'_{node}-'
-            for result in results:
-                if nodeid in result:
-                    results_sorted.append(result)
-
-        #define format
-        workbook = xlsxwriter.Workbook('displacements.xlsx')
-        main_format = workbook.add_format({'bold':True})
-        main_format.set_align('center')
-        second_format = workbook.add_format({'font_color': 'black'})
-        second_format.set_align('center')
-
-        #open book and start writing in shells
-        x_sheet = workbook.add_worksheet('Displacements East')
-        y_sheet = workbook.add_worksheet('Displacements North')
-        z_sheet = workbook.add_worksheet('Displacements Vertical')
-        x_sheet.write(0,0,'Timestep/NodeID',main_format)
-        y_sheet.write(0,0,'Timestep/NodeID',main_format)
-        z_sheet.write(0,0,'Timestep/NodeID',main_format)
-
-        x_sheet.set_column(0,0,17,main_format)
-        y_sheet.set_column(0,0,17,main_format)
-        z_sheet.set_column(0,0,17,main_format)
-
-        #fill rows names
-        row = 1
-        column = 0
-        time_step = 0.0
-        while time_step < 50:
-            x_sheet.write(row,column,time_step,main_format)
-            y_sheet.write(row,column,time_step,main_format)
-            z_sheet.write(row,column,time_step,main_format)
-
-            time_step += 0.025
-            row +=1
-
-        #fill columns names
-        row = 0
-        column = 1
-        files = []
-        for node in (range(len(nodes))):
-            x_sheet.write(row,column,f'Node {nodes[node]}',main_format)
-            y_sheet.write(row,column,f'Node {nodes[node]}',main_format)
-            z_sheet.write(row,column,f'Node {nodes[node]}',main_format)
-            column+=1
-
-        #fill matrix in correct values, here the file is the column and it's results are the rows
-        files = [open(f'Displacements/{file}','r') for file in results_sorted]
-        column = 1
-        for file in range(len(files)):
-
-            nodal_result = [[(num) for num in line.split('\n')] for line in files[file]]
-            row = 1
-            for row_val in nodal_result:
-                acceleration_X = float(row_val[0].split(' ')[0])
-                acceleration_Y = float(row_val[0].split(' ')[1])
-                acceleration_Z = float(row_val[0].split(' ')[2])
-                x_sheet.write(row,column,acceleration_X,second_format)
-                y_sheet.write(row,column,acceleration_Y,second_format)
-                z_sheet.write(row,column,acceleration_Z,second_format)
-                row += 1
-
-            column += 1
-
-        workbook.close()
+    def create_displacement_xlsx(self, workers:int|None = 1):
+        """
+        This function is used to export the displacements of every node to displacements.xlsx, see exporters.exportNodesXLSX.
+        """
+        nodes_df = self._computeNodesResponseDF('disp', 'Displacements')
+        return exportNodesXLSX(nodes_df, self.path/'displacements.xlsx', 'Displacements', workers)
 
-    @staticmethod
-    def create_accelerations_xlsx():
-
-        import os
-
-        #create nodes sorted list
-        nodes = []
-        path = os.getcwd()
-        results = os.listdir(f'{path}/Accelerations/')
-
-        #sorting nodes
-        for result in results:
-            node = (int(result.split('-')[1].split('_')[1]))
-            nodes.append(node)
-        nodes.sort()
-
-        #sorting files in list
-        results_sorted = []
-        for node in nodes:
-            nodeid = f'_{node}-'
-            for result in results:
-                if nodeid in result:
-                    results_sorted.append(result)
-
-        #define format
-        workbook = xlsxwriter.Workbook('accelerations.xlsx')
-        main_format = workbook.add_format({'bold':True})
-        main_format.set_align('center')
-        second_format = workbook.add_format({'font_color': 'black'})
-        second_format.set_align('center')
-
-        #open book and start writing in shells
-        x_sheet = workbook.add_worksheet('Accelerations East')
-        y_sheet = workbook.add_worksheet('Accelerations North')
-        z_sheet = workbook.add_worksheet('Accelerations Vertical')
-        x_sheet.write(0,0,'Timestep/NodeID',main_format)
-        y_sheet.write(0,0,'Timestep/NodeID',main_format)
-        z_sheet.write(0,0,'Timestep/NodeID',main_format)
-
-        x_sheet.set_column(0,0,17,main_format)
-        y_sheet.set_column(0,0,17,main_format)
-        z_sheet.set_column(0,0,17,main_format)
-
-        #fill rows names
-        row = 1
-        column = 0
-        time_step = 0.0
-        while time_step < 50:
-            x_sheet.write(row,column,time_step,main_format)
-            y_sheet.write(row,column,time_step,main_format)
-            z_sheet.write(row,column,time_step,main_format)
-
-            time_step += 0.025
-            row +=1
-
-        #fill columns names
-        row = 0
-        column = 1
-        files = []
-        for node in (range(len(nodes))):
-            x_sheet.write(row,column,f'Node {nodes[node]}',main_format)
-            y_sheet.write(row,column,f'Node {nodes[node]}',main_format)
-            z_sheet.write(row,column,f'Node {nodes[node]}',main_format)
-            column+=1
-
-        #fill matrix in correct values, here the file is the column and it's results are the rows
-        files = [open(f'Accelerations/{file}','r') for file in results_sorted]
-        column = 1
-        for file in range(len(files)):
-
-            nodal_result = [[(num) for num in line.split('\n')] for line in files[file]]
-            row = 1
-            for row_val in nodal_result:
-                acceleration_X = float(row_val[0].split(' ')[0])
-                acceleration_Y = float(row_val[0].split(' ')[1])
-                acceleration_Z = float(row_val[0].split(' ')[2])
-                x_sheet.write(row,column,acceleration_X,second_format)
-                y_sheet.write(row,column,acceleration_Y,second_format)
-                z_sheet.write(row,column,acceleration_Z,second_format)
-                row += 1
-
-            column += 1
-
-        workbook.close()
+    def create_accelerations_xlsx(self, workers:int|None = 1):
+        """
+        This function is used to export the accelerations of every node to accelerations.xlsx, see exporters.exportNodesXLSX.
+        """
+        nodes_df = self._computeNodesResponseDF('accel', 'Accelerations')
+        return exportNodesXLSX(nodes_df, self.path/'accelerations.xlsx', 'Accelerations', workers)
 
     @staticmethod
     def initialize_ssh_tunnel(server_alive_interval=60):
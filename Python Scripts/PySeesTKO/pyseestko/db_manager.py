@@ -2,7 +2,222 @@
 # IMPORT LIBRARIES
 # ==================================================================================
 from pyseestko.errors import DataBaseError
-import mysql.connector
+import numpy as np
+import sqlite3
+
+# ==================================================================================
+# DATABASE BACKENDS
+# ==================================================================================
+# The backends connect DataBaseManager to a database engine, the queries of the package are written for MySQL
+# (%s placeholders) and each backend cursor runs them as they are:
+#     mysql  : the MySQL server of the project (mysql.connector)
+#     sqlite : a local SQLite file with the same schema, created if it doesn't exist. It doesn't need a server
+#              nor the ssh tunnel, the database param is the path of the file and user, password and host are
+#              ignored. Useful for benchmarks, tests and small single user campaigns.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS simulation_type (
+    IDType                  INTEGER PRIMARY KEY,
+    Type                    TEXT    NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS model_linearity (
+    IDLinearity             INTEGER PRIMARY KEY,
+    Type                    TEXT    NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS sm_input_pga (
+    IDPGA                   INTEGER PRIMARY KEY,
+    PGA_X                   TEXT,
+    PGA_Y                   TEXT,
+    PGA_Z                   TEXT,
+    Units                   TEXT);
+CREATE TABLE IF NOT EXISTS sm_input_spectrum (
+    IDSpectrum              INTEGER PRIMARY KEY,
+    SpectrumX               BLOB,
+    SpectrumY               BLOB,
+    SpectrumZ               BLOB,
+    Units                   TEXT);
+CREATE TABLE IF NOT EXISTS simulation_sm_input (
+    IDSM_Input              INTEGER PRIMARY KEY,
+    idPGA                   INTEGER REFERENCES sm_input_pga(IDPGA),
+    idSpectrum              INTEGER REFERENCES sm_input_spectrum(IDSpectrum),
+    Magnitude               TEXT,
+    Rupture_Type            TEXT,
+    Location                TEXT,
+    RealizationID           INTEGER,
+    Comments                TEXT);
+CREATE TABLE IF NOT EXISTS model_benchmark (
+    IDBenchmark             INTEGER PRIMARY KEY,
+    JobName                 TEXT,
+    SimulationTime          TEXT,
+    MemoryResults           TEXT,
+    MemoryModel             TEXT,
+    ClusterNodes            INTEGER,
+    CpuPerNodes             INTEGER,
+    ClusterName             TEXT,
+    Comments                TEXT,
+    Profile                 TEXT);
+CREATE TABLE IF NOT EXISTS structure_base_shear (
+    IDBaseShear             INTEGER PRIMARY KEY,
+    TimeSeries              BLOB,
+    ShearX                  BLOB,
+    ShearY                  BLOB,
+    ShearZ                  BLOB,
+    Units                   TEXT);
+CREATE TABLE IF NOT EXISTS structure_max_base_shear (
+    IDMaxBaseShear          INTEGER PRIMARY KEY,
+    MaxX                    REAL,
+    MaxY                    REAL,
+    MaxZ                    REAL,
+    Units                   TEXT);
+CREATE TABLE IF NOT EXISTS structure_abs_acceleration (
+    IDAbsAccelerations      INTEGER PRIMARY KEY,
+    TimeSeries              BLOB,
+    AbsAccX                 BLOB,
+    AbsAccY                 BLOB,
+    AbsAccZ                 BLOB,
+    Units                   TEXT);
+CREATE TABLE IF NOT EXISTS structure_relative_displacements (
+    IDRelativeDisplacements INTEGER PRIMARY KEY,
+    TimeSeries              BLOB,
+    DispX                   BLOB,
+    DispY                   BLOB,
+    DispZ                   BLOB,
+    Units                   TEXT);
+CREATE TABLE IF NOT EXISTS structure_max_drift_per_floor (
+    IDMaxDriftPerFloor      INTEGER PRIMARY KEY,
+    MaxDriftCornerX         BLOB,
+    MaxDriftCornerY         BLOB,
+    MaxDriftCenterX         BLOB,
+    MaxDriftCenterY         BLOB,
+    Units                   TEXT);
+CREATE TABLE IF NOT EXISTS model_structure_perfomance (
+    IDStructuralPerfomance  INTEGER PRIMARY KEY,
+    idBaseShear             INTEGER REFERENCES structure_base_shear(IDBaseShear),
+    idAbsAccelerations      INTEGER REFERENCES structure_abs_acceleration(IDAbsAccelerations),
+    idRelativeDisplacements INTEGER REFERENCES structure_relative_displacements(IDRelativeDisplacements),
+    idMaxBaseShear          INTEGER REFERENCES structure_max_base_shear(IDMaxBaseShear),
+    idMaxDriftPerFloor      INTEGER REFERENCES structure_max_drift_per_floor(IDMaxDriftPerFloor),
+    StoryAccelerations      BLOB,
+    StoryNodesDataFrame     BLOB,
+    Comments                TEXT);
+CREATE TABLE IF NOT EXISTS model_specs_structure (
+    IDSpecsStructure        INTEGER PRIMARY KEY,
+    idLinearity             INTEGER REFERENCES model_linearity(IDLinearity),
+    Nnodes                  INTEGER,
+    Nelements               INTEGER,
+    Nstories                INTEGER,
+    Nsubs                   INTEGER,
+    InterstoryHeight        TEXT,
+    Comments                TEXT);
+CREATE TABLE IF NOT EXISTS simulation_model (
+    IDModel                 INTEGER PRIMARY KEY,
+    idBenchmark             INTEGER REFERENCES model_benchmark(IDBenchmark),
+    idStructuralPerfomance  INTEGER REFERENCES model_structure_perfomance(IDStructuralPerfomance),
+    idSpecsStructure        INTEGER REFERENCES model_specs_structure(IDSpecsStructure),
+    ModelName               TEXT,
+    Comments                TEXT);
+CREATE TABLE IF NOT EXISTS model_specs_box (
+    IDSpecsBox              INTEGER PRIMARY KEY,
+    idModel                 INTEGER REFERENCES simulation_model(IDModel),
+    idLinearity             INTEGER REFERENCES model_linearity(IDLinearity),
+    Vs30                    REAL,
+    Nnodes                  INTEGER,
+    Nelements               INTEGER,
+    Dimentions              TEXT,
+    Material                TEXT,
+    ElementType             TEXT,
+    Comments                TEXT);
+CREATE TABLE IF NOT EXISTS model_specs_global (
+    IDSpecsGlobal           INTEGER PRIMARY KEY,
+    idModel                 INTEGER REFERENCES simulation_model(IDModel),
+    Nnodes                  INTEGER,
+    Nelements               INTEGER,
+    Npartitions             INTEGER,
+    MeshStructuration       TEXT,
+    Comments                TEXT);
+CREATE TABLE IF NOT EXISTS simulation (
+    IDSimulation            INTEGER PRIMARY KEY,
+    idModel                 INTEGER REFERENCES simulation_model(IDModel),
+    idSM_Input              INTEGER REFERENCES simulation_sm_input(IDSM_Input),
+    idType                  INTEGER REFERENCES simulation_type(IDType),
+    SimStage                TEXT,
+    SimOptions              TEXT,
+    SimDate                 TEXT,
+    Comments                TEXT);
+CREATE INDEX IF NOT EXISTS sm_input_case ON simulation_sm_input (Magnitude, Rupture_Type, Location, RealizationID);
+CREATE INDEX IF NOT EXISTS specs_case    ON model_specs_structure (idLinearity, Nstories, Nsubs);
+"""
+
+class MySQLBackend:
+    """
+    MySQL server backend, mysql.connector is imported on connection so the other backends don't need it.
+    """
+    name   = 'mysql'
+    remote = True
+
+    def connect(self, user:str, password:str, host:str, database:str):
+        import mysql.connector
+        return mysql.connector.connect(user=user, password=password, host=host, database=database)
+
+    def cursor(self, cnx):
+        return cnx.cursor()
+
+    @property
+    def errors(self)->tuple:
+        from mysql.connector.errors import DatabaseError
+        return (DatabaseError,)
+
+class SQLiteCursor:
+    """
+    Cursor of the SQLite backend, it runs the MySQL queries of the package: the %s placeholders are replaced
+    by ? and the numpy scalars are converted to python values.
+    """
+    def __init__(self, cursor:sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, query:str, values:tuple = ()):
+        values = tuple(value.item() if isinstance(value, np.generic) else value for value in values)
+        return self._cursor.execute(query.replace('%s', '?'), values)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+class SQLiteBackend:
+    """
+    Local SQLite file backend, the schema (SQLITE_SCHEMA) is created on connection.
+    """
+    name   = 'sqlite'
+    remote = False
+    errors = (sqlite3.DatabaseError,)
+
+    def connect(self, user:str, password:str, host:str, database:str):
+        cnx = sqlite3.connect(database, timeout=30)
+        cnx.executescript(SQLITE_SCHEMA)
+        return cnx
+
+    def cursor(self, cnx):
+        return SQLiteCursor(cnx.cursor())
+
+BACKENDS = {'mysql': MySQLBackend, 'sqlite': SQLiteBackend}
+
+def isRemoteBackend(backend:str)->bool:
+    """
+    True if the backend is a server (reached through the ssh tunnel on Windows), False for the local files.
+    """
+    if backend not in BACKENDS:
+        raise DataBaseError(f'Unknown database backend {backend}, it must be one of {list(BACKENDS)}')
+    return BACKENDS[backend].remote
 
 # ==================================================================================
 # SECONDARY CLASSES
@@ -10,13 +225,17 @@ import mysql.connector
 class DataBaseManager:
     """
     This class is used to manage the connection to the database.
+    The backend is 'mysql' (default) or 'sqlite', in that case database is the path of the SQLite file.
+    The cursor runs the MySQL queries of the package in every backend and errors has the exceptions of
+    the backend database errors.
     """
-    def __init__(self, user: str, password: str, host: str, database: str, verbose:bool = True):
-        self.cnx = mysql.connector.connect(user=user,
-                                           password=password,
-                                           host=host,
-                                           database=database)
-        self.cursor = self.cnx.cursor()
+    def __init__(self, user: str, password: str, host: str, database: str, verbose:bool = True, backend:str = 'mysql'):
+        if backend not in BACKENDS:
+            raise DataBaseError(f'Unknown database backend {backend}, it must be one of {list(BACKENDS)}')
+        self.backend = BACKENDS[backend]()
+        self.cnx     = self.backend.connect(user, password, host, database)
+        self.cursor  = self.backend.cursor(self.cnx)
+        self.errors  = self.backend.errors
 
     def insert_data(self, query: str, values: tuple):
         self.cursor.execute(query, values)
@@ -26,6 +245,20 @@ class DataBaseManager:
         self.cursor.close()
         self.cnx.close()
 
+    def add_benchmark_profile_column(self):
+        """
+        This function adds the Profile column (the JSON summary of the StageProfiler of the upload) to the
+        model_benchmark table of the databases created without it. It's a one-time migration of the schema, run
+        it before the uploads with profile_benchmark=True, e.g.:
+            DataBaseManager(user, password, host, database).add_benchmark_profile_column()
+        """
+        self.cursor.execute("SELECT * FROM model_benchmark LIMIT 0")
+        self.cursor.fetchall()
+        columns = [column[0].lower() for column in self.cursor.description]
+        if 'profile' not in columns:
+            self.cursor.execute("ALTER TABLE model_benchmark ADD COLUMN Profile TEXT")
+            self.cnx.commit()
+
     def get_nodes_and_elements(self, glob_nnodes:int, glob_nelements:int, stories:int, subs:int, _sim_type:int):
         """
         This function is used to get the nodes and elements of the model.
@@ -23,3 +23,9 @@ class DataBaseError(Exception):
 
 
 
+
+class MassModelError(Exception):
+    pass
+
+class ResultsStoreError(Exception):
+    pass
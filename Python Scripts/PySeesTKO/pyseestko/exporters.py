@@ -0,0 +1,70 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from concurrent.futures import ProcessPoolExecutor
+from pathlib            import Path
+from typing             import List
+
+import pandas as pd
+import numpy  as np
+import xlsxwriter
+# ==================================================================================
+# XLSX EXPORTERS
+# ==================================================================================
+# Excel exports of the recorded response of the nodes. The workbooks are written in xlsxwriter's constant_memory
+# mode, where each row is flushed to disk once the next one starts, so the rows are streamed in order with a
+# single write_row per time step and the memory doesn't grow with the size of the model.
+DIRECTION_NAMES = {'x': 'East', 'y': 'North', 'z': 'Vertical'}
+
+def exportNodesXLSX(nodes_df:pd.DataFrame, file_path:Path, sheet_prefix:str, workers:int|None = 1)->List[Path]:
+    """
+    Exports a (Time Step, Dir) x Node DataFrame, as the ones of ModelSimulation, with one sheet per direction
+    such as 'Accelerations East'. The first column has the time steps and the first row the nodes.
+
+    Parameters
+    ----------
+    nodes_df : pd.DataFrame
+        Response of the nodes indexed by (Time Step, Dir), with one column per node.
+    file_path : Path
+        Path of the workbook.
+    sheet_prefix : str
+        Prefix of the sheet names, e.g. 'Accelerations'.
+    workers : int, optional
+        1 writes a single workbook with the three sheets. Otherwise each direction is written in its own
+        workbook ({file stem}_{direction name}.xlsx) by a pool of processes, since a workbook can't be
+        written by several processes. None uses all the cores. The default is 1.
+
+    Returns
+    -------
+    paths : List[Path]
+        Paths of the written workbooks.
+    """
+    file_path  = Path(file_path)
+    directions = [direction for direction in DIRECTION_NAMES if direction in nodes_df.index.get_level_values('Dir')]
+    sheets     = [(f'{sheet_prefix} {DIRECTION_NAMES[direction]}', nodes_df.xs(direction, level='Dir')) for direction in directions]
+    if workers == 1:
+        _writeWorkbook(file_path, sheets)
+        return [file_path]
+    paths = [file_path.with_name(f'{file_path.stem}_{DIRECTION_NAMES[direction]}{file_path.suffix}') for direction in directions]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_writeWorkbook, paths, [[sheet] for sheet in sheets]))
+    return paths
+
+def _writeWorkbook(file_path:Path, sheets:List[tuple])->None:
+    # Stream the rows of every sheet, the first cell of each row is the time step
+    workbook = xlsxwriter.Workbook(str(file_path), {'constant_memory': True, 'nan_inf_to_errors': True})
+    try:
+        main_format = workbook.add_format({'bold': True, 'align': 'center'})
+        second_format = workbook.add_format({'font_color': 'black', 'align': 'center'})
+        for sheet_name, df in sheets:
+            sheet = workbook.add_worksheet(sheet_name)
+            sheet.set_column(0, 0, 17, main_format)
+            sheet.write(0, 0, 'Timestep/NodeID', main_format)
+            sheet.write_row(0, 1, [str(col) for col in df.columns], main_format)
+            times  = np.asarray(df.index, dtype=float).tolist()
+            values = df.to_numpy(dtype=float).tolist()
+            for row, (time_step, row_values) in enumerate(zip(times, values), start=1):
+                sheet.write_number(row, 0, time_step, main_format)
+                sheet.write_row(row, 1, row_values, second_format)
+    finally:
+        workbook.close()
@@ -0,0 +1,194 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from pyseestko.errors   import ModelInfoError #type: ignore
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib            import Path
+from typing             import List, Dict
+
+import numpy as np
+import h5py
+# ==================================================================================
+# H5DRM INPUT MOTION
+# ==================================================================================
+# Input motion of a station, read from the DRM_QA_Data group of its input.h5drm file (shape 3 x time steps,
+# with the e, n and z channels). The first read of each input type writes a small binary sidecar
+# (input_{input_type}.npy) with all the time steps next to the h5drm file, used while it's newer than the
+# h5drm file. If there is no h5drm file, the text files written by import_h5py.py ({input_type}_e.txt, _n.txt
+# and _z.txt) are read.
+CHANNELS = ['e', 'n', 'z']
+
+def readH5DRMInput(h5drm_path:Path, input_type:str = 'acceleration', nsteps:int|None = None)->np.ndarray:
+    """
+    Reads the first nsteps of the QA channels of the h5drm file with a single hyperslab.
+    Returns an array of shape (nsteps, 3) with the e, n and z channels.
+    """
+    with h5py.File(h5drm_path, 'r') as file:
+        dataset_path = f'DRM_QA_Data/{input_type}'
+        if dataset_path not in file:
+            raise ModelInfoError(f'The dataset {dataset_path} is not in the file {h5drm_path}')
+        return file[dataset_path][:, :nsteps].T
+
+def loadInputMotion(folder:Path, input_type:str = 'acceleration', nsteps:int|None = None, cache:bool = True,
+                    store_path:Path|None = None)->np.ndarray:
+    """
+    Loads the input motion of a station from its folder: the sidecar cache, the input.h5drm file or the text files.
+
+    Parameters
+    ----------
+    folder : Path
+        Folder of the station with the input.h5drm file or the text files.
+    input_type : str, optional
+        'acceleration', 'velocity' or 'displacement'. The default is 'acceleration'.
+    nsteps : int, optional
+        Number of time steps to read. The default is all of them.
+    cache : bool, optional
+        If True, the sidecar cache is used and written. The default is True.
+    store_path : Path, optional
+        Campaign store written by extractCampaignInputs, used first if it has the station. The default is None.
+
+    Returns
+    -------
+    motion : np.ndarray
+        Array of shape (nsteps, 3) with the e, n and z channels.
+    """
+    # Use the campaign store if it has the station
+    folder = Path(folder)
+    if store_path is not None:
+        motion = readCampaignInput(store_path, stationKey(folder), input_type)
+        if motion is not None and (nsteps is None or len(motion) >= nsteps):
+            return motion[:nsteps]
+
+    # Use the sidecar if it's up to date, it has every step of the h5drm file
+    h5drm_path   = folder / 'input.h5drm'
+    sidecar_path = folder / f'input_{input_type}.npy'
+    if cache and sidecar_path.exists():
+        if not h5drm_path.exists() or sidecar_path.stat().st_mtime >= h5drm_path.stat().st_mtime:
+            return np.load(sidecar_path)[:nsteps]
+
+    # Read the h5drm file and update the sidecar with all the steps
+    if h5drm_path.exists():
+        motion = readH5DRMInput(h5drm_path, input_type, None if cache else nsteps)
+        if cache:
+            np.save(sidecar_path, motion)
+        return motion[:nsteps]
+
+    # Fallback to the text files
+    text_paths = [folder / f'{input_type}_{channel}.txt' for channel in CHANNELS]
+    if not all(path.exists() for path in text_paths):
+        raise ModelInfoError(f'There is no input.h5drm nor {input_type} text files in {folder}')
+    channels = [np.loadtxt(path, ndmin=1, max_rows=nsteps) for path in text_paths]
+    length   = min(len(channel) for channel in channels)
+    return np.column_stack([channel[:length] for channel in channels])
+
+
+# ==================================================================================
+# CAMPAIGN INPUTS STORE
+# ==================================================================================
+# The input motions of every station of the campaign are extracted at once into a single HDF5 store, with one
+# group per station keyed as the campaign folders (sim_type/structure/magnitude/rupture/station, e.g.
+# DRM/20f2s/m6.7/rup_bl_1/station_s3) and one (time steps x 3) dataset per input type.
+def stationKey(folder:Path)->str:
+    """
+    Returns the key of a station folder in the campaign store: its last 5 folders.
+    """
+    return '/'.join(Path(folder).parts[-5:])
+
+def findH5DRMFiles(root_path:Path, pattern:str = '**/rup_*/station_s*/input.h5drm')->List[Path]:
+    """
+    Returns the sorted input.h5drm files of every station under the root path.
+    """
+    return sorted(Path(root_path).glob(pattern))
+
+def extractCampaignInputs(
+    root_path    : Path,
+    store_path   : Path,
+    input_types  : List[str] = ['acceleration', 'velocity'],
+    nsteps       : int|None  = 16000,
+    workers      : int|None  = None,
+    chunk_steps  : int       = 4000,
+    overwrite    : bool      = False,
+    verbose      : bool      = True,
+    )->List[str]:
+    """
+    Extracts the input motions of every station of the campaign into a single HDF5 store. The h5drm files are
+    read in a pool of processes, each one reads only the QA channels in hyperslabs of chunk_steps time steps,
+    and the main process writes the results in the store as they arrive.
+
+    Parameters
+    ----------
+    root_path : Path
+        Root folder of the campaign, the h5drm files are found with findH5DRMFiles.
+    store_path : Path
+        HDF5 file of the store, it's created if it doesn't exist.
+    input_types : List[str], optional
+        Input types to extract. The default is ['acceleration', 'velocity'].
+    nsteps : int, optional
+        Number of time steps to extract, None extracts all of them. The default is 16000.
+    workers : int, optional
+        Number of processes, 1 runs in this process and None uses all the cores. The default is None.
+    chunk_steps : int, optional
+        Number of time steps of each hyperslab read. The default is 4000.
+    overwrite : bool, optional
+        If False, the stations already in the store are skipped. The default is False.
+    verbose : bool, optional
+        If True, prints each extracted station. The default is True.
+
+    Returns
+    -------
+    keys : List[str]
+        Keys of the extracted stations.
+    """
+    # Find the stations that are not in the store yet
+    files = {stationKey(path.parent): path for path in findH5DRMFiles(root_path)}
+    if not overwrite and Path(store_path).exists():
+        with h5py.File(store_path, 'r') as store:
+            files = {key: path for key, path in files.items() if not all(f'{key}/{input_type}' in store for input_type in input_types)}
+
+    # Read the stations in parallel and write them in the store
+    keys = []
+    with h5py.File(store_path, 'a') as store:
+        def write(key:str, motions:Dict[str, np.ndarray]):
+            for input_type, motion in motions.items():
+                dataset_path = f'{key}/{input_type}'
+                if dataset_path in store:
+                    del store[dataset_path]
+                store.create_dataset(dataset_path, data=motion, compression='gzip')
+            keys.append(key)
+            if verbose: print(f'{key} extracted ({len(keys)}/{len(files)})')
+        if workers == 1:
+            for key, path in files.items():
+                write(key, _readStationInputs(path, input_types, nsteps, chunk_steps))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_readStationInputs, path, input_types, nsteps, chunk_steps): key for key, path in files.items()}
+                for future in as_completed(futures):
+                    write(futures[future], future.result())
+    return keys
+
+def readCampaignInput(store_path:Path, key:str, input_type:str = 'acceleration')->np.ndarray|None:
+    """
+    Returns the (time steps x 3) input motion of the station key from the campaign store, None if it's not there.
+    """
+    if not Path(store_path).exists():
+        return None
+    with h5py.File(store_path, 'r') as store:
+        dataset_path = f'{key}/{input_type}'
+        return store[dataset_path][()] if dataset_path in store else None
+
+def _readStationInputs(h5drm_path:Path, input_types:List[str], nsteps:int|None, chunk_steps:int)->Dict[str, np.ndarray]:
+    # Read the QA channels of each input type in hyperslabs of chunk_steps time steps
+    motions = {}
+    with h5py.File(h5drm_path, 'r') as file:
+        for input_type in input_types:
+            dataset_path = f'DRM_QA_Data/{input_type}'
+            if dataset_path not in file:
+                raise ModelInfoError(f'The dataset {dataset_path} is not in the file {h5drm_path}')
+            dataset = file[dataset_path]
+            length  = dataset.shape[1] if nsteps is None else min(nsteps, dataset.shape[1])
+            motion  = np.empty((length, dataset.shape[0]), dtype=dataset.dtype)
+            for start in range(0, length, chunk_steps):
+                stop = min(start + chunk_steps, length)
+                motion[start:stop] = dataset[:, start:stop].T
+            motions[input_type] = motion
+    return motions
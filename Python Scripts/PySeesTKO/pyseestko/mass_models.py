@@ -0,0 +1,100 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from pyseestko.errors import MassModelError #type: ignore
+from functools        import lru_cache
+from pathlib          import Path
+
+import numpy as np
+import json
+# ==================================================================================
+# MASS MODELS REGISTRY
+# ==================================================================================
+# Lumped story masses used to compute the base shear by accelerations. The structures (areas, thickness
+# and densities) and the building types that use them (e.g. 20f2s, the 20 stories structure with 2 subterranean
+# levels) are defined in mass_models.json. A thickness is either a single value, used in every level, or a list
+# of [value, number of levels] blocks. The columns are defined by the side of their square section.
+# The mass vector of each building type is computed once and ordered as the levels -subs+1, ..., 0, ..., stories.
+MASS_MODELS_PATH = Path(__file__).parent / 'mass_models.json'
+
+def buildingType(stories:int, subs:int)->str:
+    """
+    Returns the key of the building type, e.g. 20f2s.
+    """
+    return f'{stories}f{subs}s'
+
+@lru_cache(maxsize=None)
+def loadMassModels(path:Path|str = MASS_MODELS_PATH)->dict:
+    """
+    Loads the mass models config file.
+    """
+    with open(path, 'r') as file:
+        return json.load(file)
+
+@lru_cache(maxsize=None)
+def getStoryMasses(building:str, path:Path|str = MASS_MODELS_PATH)->np.ndarray:
+    """
+    Returns the mass of each level of the building type, ordered from the level -subs+1 to the last story.
+    The array is computed once per building type and it's read-only, copy it before modifying it.
+
+    Parameters
+    ----------
+    building : str
+        Building type, e.g. '20f2s' (see buildingType).
+    path : Path | str, optional
+        Mass models config file. The default is the mass_models.json of the package.
+
+    Returns
+    -------
+    masses : np.ndarray
+        Array of shape (subs + stories,) with the masses in Mg.
+    """
+    # Get the building type and its structure
+    config = loadMassModels(path)
+    if building not in config['buildings']:
+        raise MassModelError(f"There is no mass model for the building {building}, available: {list(config['buildings'])}")
+    building_dic  = config['buildings'][building]
+    structure_dic = config['structures'][building_dic['structure']]
+    stories, subs = structure_dic['stories'], building_dic['subs']
+
+    # Expand the thickness of every level
+    sup_levels = ['slabs_sup', 'external_core', 'internal_core_x', 'internal_core_y', 'columns_sup']
+    thickness  = {name: _levelsArray(value, stories if name in sup_levels else subs) for name, value in structure_dic['thickness'].items()}
+    thickness.update({name: _levelsArray(value, stories if name in sup_levels else subs)**2 for name, value in structure_dic['columns_side'].items()})
+    areas      = structure_dic['areas']
+    density    = structure_dic['densities']['walls']
+    density1   = structure_dic['densities']['sub_slabs']
+    density2   = structure_dic['densities']['sup_slabs']
+    def walls(name:str, index)->np.ndarray:
+        return areas[name] * thickness[name][index] * density/2
+
+    # Stories masses: the slab plus half of the walls and columns below and above the slab
+    cores     = ['external_core', 'internal_core_x', 'internal_core_y', 'columns_sup']
+    mass_sup  = areas['slabs_area'] * thickness['slabs_sup'] * density2
+    mass_sup  = mass_sup + walls(cores[0], slice(None)) + walls(cores[1], slice(None)) + walls(cores[2], slice(None)) + walls(cores[3], slice(None))
+    mass_top  = np.zeros(stories)
+    mass_top[:-1] = walls(cores[0], slice(1, None)) + walls(cores[1], slice(1, None)) + walls(cores[2], slice(1, None)) + walls(cores[3], slice(1, None))
+    mass_sup  = mass_sup + mass_top
+
+    # Base mass: the slab plus half of the subterranean walls and columns and half of the first story ones
+    mass_base = (areas['sub_slabs_area'] * thickness['slabs_sub'][1] * density1 + walls('perimetral_wall', 1) + walls('columns_sub', 1)
+                 + walls(cores[0], 2) + walls(cores[1], 2) + walls(cores[2], 2) + walls(cores[3], 2))
+
+    # Subterranean masses, from the level -subs+1 to -1
+    levels   = np.arange(0, -(subs-1), -1)[::-1]
+    mass_sub = (areas['sub_slabs_area']  * thickness['slabs_sub'][levels]       * density1
+              + areas['perimetral_wall'] * thickness['perimetral_wall'][levels] * density1
+              + areas['columns_sub']     * thickness['columns_sub'][levels]     * density1)
+
+    masses = np.concatenate([mass_sub, [mass_base], mass_sup]) * building_dic['factor']
+    masses.flags.writeable = False
+    return masses
+
+def _levelsArray(value:float|list, nlevels:int)->np.ndarray:
+    # A single value for every level or a list of [value, number of levels] blocks
+    if not isinstance(value, list):
+        return np.array([value] * nlevels)
+    array = np.array([block_value for block_value, count in value for _ in range(count)])
+    if len(array) != nlevels:
+        raise MassModelError(f'The thickness blocks define {len(array)} levels, but the structure has {nlevels}')
+    return array
@@ -4,6 +4,8 @@
 # Objects
 from pathlib import Path
 from pyseestko.errors import ModelInfoError
+from pyseestko.recorder_io import storyCornerNodes
+import json
 
 # ==================================================================================
 # SECONDARY CLASSES
@@ -28,6 +30,10 @@ class ModelInfo:
         Path to the 'PartitionsInfo/info' subfolder.
     folder_reaction : str
         Path to the 'PartitionsInfo/reaction' subfolder.
+    manifest : dict
+        Content of 'PartitionsInfo/manifest.json' written by the AlbertisRecorder plugin, None if the
+        results only have the legacy text files. When it exists, all the info is read from it, the drift
+        nodes, stories and subterranean levels from its story classification.
 
     Methods
     -------
@@ -52,6 +58,7 @@ class ModelInfo:
         if not self.path.exists():
             raise ModelInfoError("The PartitionsInfo folder does not exist!\n"
                             "Current path = {}".format(current_path))
+        self.manifest = self.give_manifest()
         if self.verbose:
             # Call the methods to initialize the data
             print("---------------------------------------------|")
@@ -74,14 +81,29 @@ class ModelInfo:
         self.subs,\
         self.heights = self.give_coords_info()
 
+    def give_manifest(self):
+        # read the manifest in a single read, or None to use the legacy files
+        manifest_path = self.path / "manifest.json"
+        if not manifest_path.exists():
+            return None
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+
+    def give_partition_nodes(self, response):
+        # nodes of each partition from the manifest, in the format of the legacy files
+        nodes = {}
+        for partition, nodes_lst in self.manifest["responses"][response].items():
+            nodes[f"Partition {partition}"] = {f"Node {nodei}": str(node) for nodei, node in enumerate(nodes_lst)}
+        return nodes
+
     def give_accelerations(self):
         # check nodes
         folder_name = "accel"
         files_accel = self.path / folder_name
-        files = [open(file, "r") for file in files_accel.iterdir() if file.is_file()]
+        files = [] if self.manifest else [open(file, "r") for file in files_accel.iterdir() if file.is_file()]
 
         # create dictionary
-        accelerations = {}
+        accelerations = self.give_partition_nodes(folder_name) if self.manifest else {}
         for file in range(len(files)):
             nodes = [[(num) for num in line.split("\n")]
                      for line in files[file]]
@@ -111,10 +133,10 @@ class ModelInfo:
         # check nodes
         folder_name = "disp"
         files_disp = self.path / folder_name
-        files = [open(file, "r") for file in files_disp.iterdir() if file.is_file()]
+        files = [] if self.manifest else [open(file, "r") for file in files_disp.iterdir() if file.is_file()]
 
         # create dictionary
-        displacements = {}
+        displacements = self.give_partition_nodes(folder_name) if self.manifest else {}
         for file in range(len(files)):
             nodes = [[(num) for num in line.split("\n")]
                      for line in files[file]]
@@ -145,10 +167,10 @@ class ModelInfo:
         # check nodes
         folder_name = "reaction"
         files_reaction = self.path / folder_name
-        files = [open(file, "r") for file in files_reaction.iterdir() if file.is_file()]
+        files = [] if self.manifest else [open(file, "r") for file in files_reaction.iterdir() if file.is_file()]
 
         # create dictionary
-        reactions = {}
+        reactions = self.give_partition_nodes(folder_name) if self.manifest else {}
         for file in range(len(files)):
             nodes = [[(num) for num in line.split("\n")]
                      for line in files[file]]
@@ -177,10 +199,20 @@ class ModelInfo:
         # check nodes
         folder_name = "coords"
         files_coords = self.path / folder_name
-        files = [open(file, "r") for file in files_coords.iterdir()if file.is_file()]
+        files = [] if self.manifest else [open(file, "r") for file in files_coords.iterdir()if file.is_file()]
 
         # create dictionary
         coordinates = {}
+        if self.manifest:
+            # the legacy coords files only have the nodes of the displacements recorder
+            responses = self.manifest["responses"]
+            node_ids = [str(node) for nodes in responses["disp"].values() for node in nodes] if "disp" in responses else self.manifest["coords"]
+            for node_id in node_ids:
+                coordinates[f"Node {node_id}"] = self.give_manifest_coords(node_id)
+
+            # the stories, their corners and the subterranean levels are classified in the manifest
+            if self.manifest.get("stories"):
+                return (coordinates, *self.give_stories_info(coordinates))
         for file in range(len(files)):
             nodes = [[(num) for num in line.split("\n")] for line in files[file]]
 
@@ -259,7 +291,41 @@ class ModelInfo:
         heights.insert(0, (coordinates[list(stories_nodes["Level 1"])[0]]["coord z"] - coordinates[list(stories_nodes["Level 0"])[0]]["coord z"]))
         return coordinates, drift_nodes, stories_nodes, stories, subs, heights
 
+    def give_manifest_coords(self, node_id):
+        # coordinates of a node of the manifest, rounded as the legacy coords files
+        return {f"coord {axis}": float(f"{round(coord, 1):.1f}") for axis, coord in zip("xyz", self.manifest["coords"][str(node_id)])}
+
+    def give_stories_info(self, coordinates):
+        # drift nodes, nodes per story, stories, subs and heights from the corner nodes of the manifest stories
+        corner_nodes = storyCornerNodes(self.manifest["stories"])
+        if 0 not in corner_nodes or 1 not in corner_nodes:
+            raise ModelInfoError("The manifest stories don't have the corners of the ground and first levels")
+        subs    = -min(corner_nodes)
+        stories = max(corner_nodes)
+
+        # nodes of each story from the ground level and corners of the stories above it
+        drift_nodes   = {f"corner{corner + 1}": [] for corner in range(4)}
+        stories_nodes = {}
+        for story in range(stories + 1):
+            nodes = {f"Node {node}": coordinates.get(f"Node {node}") or self.give_manifest_coords(node) for node in corner_nodes.get(story, [])}
+            if len(nodes) != 4:
+                raise ModelInfoError(f"The level {story} of the manifest stories has {len(nodes)} corner nodes instead of 4")
+            stories_nodes[f"Level {story}"] = nodes
+            if story > 0:
+                for corner, (node, coords) in enumerate(nodes.items()):
+                    drift_nodes[f"corner{corner + 1}"].append(f"{node}|{coords['coord z']}")
+
+        # list of heights
+        levels_z = [list(stories_nodes[f"Level {story}"].values())[0]["coord z"] for story in range(stories + 1)]
+        heights  = [levels_z[story] - levels_z[story - 1] for story in range(1, stories + 1)]
+        return drift_nodes, stories_nodes, stories, subs, heights
+
     def give_model_info(self):
+        # read the global counts from the manifest
+        if self.manifest:
+            counts = self.manifest["counts"]
+            return counts["nodes"], counts["elements"], counts["partitions"]
+
         # read file
         folder_name = "info"
         files_coords = self.path / folder_name
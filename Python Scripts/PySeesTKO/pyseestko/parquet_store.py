@@ -0,0 +1,244 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from pyseestko.errors    import ResultsStoreError  #type: ignore
+from pyseestko.utilities import getMappings        #type: ignore
+from pathlib             import Path
+from typing              import Dict, List
+
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+import pyarrow         as pa
+import pandas          as pd
+import numpy           as np
+import threading
+# ==================================================================================
+# PARQUET RESULTS STORE
+# ==================================================================================
+# Offline copy of the decoded results of the database, as a Hive partitioned Parquet dataset per table:
+# root/{table}/sim_type=3/linearity=1/stories=20/nsubs=2/magnitude=6.7/rupture=1/station=5/iteration=1/part-0.parquet
+# The tables are drift, story_accelerations, story_nodes, base_shear and pga. Every value of the case tuple is
+# a partition key (the magnitude, rupture and station are the keys of getMappings), so each case has its own
+# partition and writing a case never replaces another one. The Linearity, Magnitude, Rupture_Type and Stories
+# values are also stored as columns, so the tables read without the partitioning keep them.
+PARTITIONING = pa.schema([('sim_type', pa.int8()), ('linearity', pa.int8()), ('stories', pa.int16()), ('nsubs', pa.int8()),
+                          ('magnitude', pa.float64()), ('rupture', pa.int8()), ('station', pa.int8()), ('iteration', pa.int16())])
+CATEGORY     = pa.dictionary(pa.int8(), pa.string())
+METRICS      = {'drift'     : ['drift'],
+                'spectra'   : ['story_accelerations', 'story_nodes'],
+                'base_shear': ['base_shear'],
+                'pga'       : ['pga']}
+
+class ParquetResultsStore:
+    """
+    This class writes and reads the decoded results of the ProjectQueries class (one case at a time) in a
+    Hive partitioned Parquet dataset, so the analysis can run offline. Every case is keyed by the case tuple
+    (sim_type, linearity, magnitude, rupture_type, iteration, location, stories, subs) of ProjectQueries,
+    the results are returned in the same format as the ProjectQueries queries.
+
+    Parameters
+    ----------
+    root_path : Path
+        Folder of the dataset, each table is a subfolder.
+    verbose : bool, optional
+        If True, prints the cases that are written or read. The default is False.
+    """
+    def __init__(self, root_path:Path, verbose:bool=False):
+        self.root_path = Path(root_path)
+        self.root_path.mkdir(parents=True, exist_ok=True)
+        self.verbose   = verbose
+        magnitudes, locations, ruptures = getMappings()
+        self._magnitudes = {name: magnitude for magnitude, name in magnitudes.items()}
+        self._stations   = {location: station for station, location in locations.items()}
+        self._ruptures   = {name: rupture for rupture, name in ruptures.items()}
+        self._datasets = {}
+        self._lock     = threading.Lock()
+
+    # ==============================================================================
+    # CASE KEYS
+    # ==============================================================================
+    def partitionKeys(self, values:tuple)->Dict[str, int]:
+        """
+        Returns the partition keys of a case tuple, in the order of PARTITIONING.
+        """
+        sim_type, linearity, magnitude, rupture_type, iteration, location, stories, subs = values
+        for value, mapping, name in [(magnitude, self._magnitudes, 'magnitude'), (rupture_type, self._ruptures, 'rupture type'),
+                                     (location, self._stations, 'location')]:
+            if value not in mapping:
+                raise ResultsStoreError(f'Unknown {name} {value}, it must be one of {list(mapping)}')
+        return {'sim_type' : int(sim_type),
+                'linearity': int(linearity),
+                'stories'  : int(stories),
+                'nsubs'    : int(subs),
+                'magnitude': float(self._magnitudes[magnitude]),
+                'rupture'  : int(self._ruptures[rupture_type]),
+                'station'  : int(self._stations[location]),
+                'iteration': int(iteration)}
+
+    def casePath(self, table:str, values:tuple)->Path:
+        keys = self.partitionKeys(values)
+        return self.root_path.joinpath(table, *[f'{name}={value}' for name, value in keys.items()])
+
+    def hasCase(self, metric:str, values:tuple)->bool:
+        """
+        Returns True if every table of the metric has rows of the case.
+        """
+        expression = self._caseFilter(values)
+        for table in METRICS[metric]:
+            if not (self.root_path / table).exists() or self.dataset(table).count_rows(filter=expression) == 0:
+                return False
+        return True
+
+    def _caseFilter(self, values:tuple)->ds.Expression:
+        _, linearity, magnitude, rupture_type, _, _, stories, _ = values
+        expression = (ds.field('Linearity') == linearity) & (ds.field('Magnitude') == magnitude) &\
+                     (ds.field('Rupture_Type') == rupture_type) & (ds.field('Stories') == stories)
+        for name, value in self.partitionKeys(values).items():
+            expression &= ds.field(name) == value
+        return expression
+
+    def _caseColumns(self, values:tuple, nrows:int)->Dict[str, pa.Array]:
+        _, linearity, magnitude, rupture_type, _, _, stories, _ = values
+        columns = {name: pa.array(np.full(nrows, value), type=PARTITIONING.field(name).type)
+                   for name, value in self.partitionKeys(values).items()}
+        columns['Linearity']    = pa.array(np.full(nrows, linearity), type=pa.int8())
+        columns['Magnitude']    = pa.array([magnitude] * nrows, type=pa.string()).dictionary_encode().cast(CATEGORY)
+        columns['Rupture_Type'] = pa.array([rupture_type] * nrows, type=pa.string()).dictionary_encode().cast(CATEGORY)
+        columns['Stories']      = pa.array(np.full(nrows, stories), type=pa.int16())
+        return columns
+
+    # ==============================================================================
+    # WRITE
+    # ==============================================================================
+    def write(self, metric:str, values:tuple, data:tuple)->None:
+        """
+        Writes the results of a case, replacing the stored ones.
+
+        Parameters
+        ----------
+        metric : str
+            'drift', 'spectra', 'base_shear' or 'pga'.
+        values : tuple
+            Case tuple of ProjectQueries.
+        data : tuple
+            Results in the format of the ProjectQueries query of the metric.
+        """
+        if metric not in METRICS:
+            raise ResultsStoreError(f'Unknown metric {metric}, it must be one of {list(METRICS)}')
+        tables = getattr(self, f'_{metric}Tables')(*data)
+        for table_name, columns in zip(METRICS[metric], tables):
+            nrows = len(next(iter(columns.values())))
+            table = pa.table({**self._caseColumns(values, nrows), **columns})
+            pq.write_to_dataset(table, self.root_path / table_name,
+                                partitioning              = ds.partitioning(PARTITIONING, flavor='hive'),
+                                existing_data_behavior    = 'delete_matching',
+                                basename_template         = 'part-{i}.parquet')
+        with self._lock:
+            for table_name in METRICS[metric]:
+                self._datasets.pop(table_name, None)
+        if self.verbose: print(f'Stored: {metric} {values}')
+
+    @staticmethod
+    def _driftTables(max_center_x, max_center_y, max_corner_x, max_corner_y)->List[dict]:
+        return [{'Story'   : pa.array(np.arange(1, len(max_corner_x) + 1), type=pa.int16()),
+                 'CM x'    : pa.array(max_center_x, type=pa.float64()),
+                 'CM y'    : pa.array(max_center_y, type=pa.float64()),
+                 'Max x'   : pa.array(max_corner_x, type=pa.float64()),
+                 'Max y'   : pa.array(max_corner_y, type=pa.float64())}]
+
+    @staticmethod
+    def _spectraTables(accel_df:pd.DataFrame, story_nodes_df:pd.DataFrame)->List[dict]:
+        # Long table with one row per time step, direction and node, in the order of the accelerations
+        nodes   = np.array([int(node.split()[1]) for node in accel_df.columns], dtype=np.int32)
+        stories = pd.Series(story_nodes_df.index.get_level_values('Story'),
+                            index=story_nodes_df.index.get_level_values('Node')).reindex(accel_df.columns)
+        nrows, nnodes = accel_df.shape
+        accel = {'Time Step'   : pa.array(np.repeat(accel_df.index.get_level_values('Time Step').to_numpy(dtype=float), nnodes)),
+                 'Dir'         : pa.array(np.repeat(accel_df.index.get_level_values('Dir').to_numpy(dtype=str), nnodes)).dictionary_encode().cast(CATEGORY),
+                 'Node'        : pa.array(np.tile(nodes, nrows)),
+                 'Story'       : pa.array(np.tile(stories.to_numpy(dtype=float), nrows), type=pa.float64(), from_pandas=True).cast(pa.int16()),
+                 'Acceleration': pa.array(accel_df.to_numpy(dtype=float).ravel())}
+        story_nodes = {'Story': pa.array(story_nodes_df.index.get_level_values('Story'), type=pa.int16()),
+                       'Node' : pa.array([int(node.split()[1]) for node in story_nodes_df.index.get_level_values('Node')], type=pa.int32()),
+                       **{axis: pa.array(story_nodes_df[axis].to_numpy(dtype=float)) for axis in ['x', 'y', 'z']}}
+        return [accel, story_nodes]
+
+    @staticmethod
+    def _base_shearTables(time_series, shear_x, shear_y, shear_z)->List[dict]:
+        return [{'Time Step': pa.array(np.asarray(time_series, dtype=float)),
+                 'Shear X'  : pa.array(np.asarray(shear_x, dtype=float)),
+                 'Shear Y'  : pa.array(np.asarray(shear_y, dtype=float)),
+                 'Shear Z'  : pa.array(np.asarray(shear_z, dtype=float))}]
+
+    @staticmethod
+    def _pgaTables(pga_x:dict, pga_y:dict, pga_z:dict, units:str)->List[dict]:
+        pgas = [pga_x, pga_y, pga_z]
+        return [{'Dir'  : pa.array(['x', 'y', 'z']).dictionary_encode().cast(CATEGORY),
+                 'Max'  : pa.array([pga['max'] for pga in pgas], type=pa.float64()),
+                 'Min'  : pa.array([pga['min'] for pga in pgas], type=pa.float64()),
+                 'Units': pa.array([units] * 3, type=pa.string())}]
+
+    # ==============================================================================
+    # READ
+    # ==============================================================================
+    def dataset(self, table:str)->ds.Dataset:
+        """
+        Returns the pyarrow dataset of a table, opened once until the table is written again.
+        """
+        with self._lock:
+            if table not in self._datasets:
+                path = self.root_path / table
+                if not path.exists():
+                    raise ResultsStoreError(f'The table {table} is not in the store {self.root_path}')
+                self._datasets[table] = ds.dataset(path, format='parquet', partitioning=ds.partitioning(PARTITIONING, flavor='hive'))
+            return self._datasets[table]
+
+    def load(self, table:str, columns:List[str]|None = None, filter:ds.Expression|None = None)->pd.DataFrame:
+        """
+        Reads a table as a DataFrame, only the partitions and row groups that match the filter are read,
+        e.g. store.load('drift', filter=(ds.field('nsubs') == 2) & ds.field('station').isin([1, 2, 3])).
+        """
+        return self.dataset(table).to_table(columns=columns, filter=filter).to_pandas()
+
+    def _readCase(self, table:str, values:tuple)->pd.DataFrame:
+        df = self.load(table, filter=self._caseFilter(values))
+        if df.empty:
+            raise ResultsStoreError(f'The case {values} is not in the table {table} of the store {self.root_path}')
+        return df
+
+    def fetch(self, metric:str, values:tuple):
+        """
+        Returns the results of a case in the format of the ProjectQueries query of the metric.
+        """
+        if metric not in METRICS:
+            raise ResultsStoreError(f'Unknown metric {metric}, it must be one of {list(METRICS)}')
+        dfs = [self._readCase(table, values) for table in METRICS[metric]]
+        if self.verbose: print(f'Store hit: {metric} {values}')
+        return getattr(self, f'_{metric}Results')(*dfs)
+
+    @staticmethod
+    def _driftResults(df:pd.DataFrame)->tuple:
+        df = df.sort_values('Story')
+        return df['CM x'].tolist(), df['CM y'].tolist(), df['Max x'].tolist(), df['Max y'].tolist()
+
+    @staticmethod
+    def _spectraResults(accel_df:pd.DataFrame, story_nodes_df:pd.DataFrame)->tuple:
+        # The nodes keep the order of the stored columns
+        nodes    = pd.unique(accel_df['Node'])
+        accel_df = accel_df.assign(Dir=accel_df['Dir'].astype(str))
+        accel_df = accel_df.set_index(['Time Step', 'Dir', 'Node'])['Acceleration'].unstack('Node')[nodes]
+        accel_df.columns = pd.Index([f'Node {node}' for node in nodes])
+        story_nodes_df = story_nodes_df.assign(Node=[f'Node {node}' for node in story_nodes_df['Node']],
+                                               Story=story_nodes_df['Story'].astype(int))
+        story_nodes_df = story_nodes_df.set_index(['Story', 'Node'])[['x', 'y', 'z']]
+        return accel_df, story_nodes_df
+
+    @staticmethod
+    def _base_shearResults(df:pd.DataFrame)->tuple:
+        return (df['Time Step'].to_numpy(), df['Shear X'].to_numpy(), df['Shear Y'].to_numpy(), df['Shear Z'].to_numpy())
+
+    @staticmethod
+    def _pgaResults(df:pd.DataFrame)->tuple:
+        df   = df.set_index(df['Dir'].astype(str))
+        pgas = tuple({'max': df.loc[axis, 'Max'], 'min': df.loc[axis, 'Min']} for axis in ['x', 'y', 'z'])
+        return pgas + (df['Units'].iloc[0],)
@@ -9,13 +9,16 @@ from typing                import Union, Tuple
 from numpy.typing          import NDArray
 from scipy.signal          import savgol_filter  # Para suavizado
 from pyseestko.errors      import PlottingError
-from pyseestko.utilities   import pwl
+from pyseestko.utilities   import computeStoriesSpectra
 from typing                import List
+from matplotlib.figure     import Figure
 from sklearn.preprocessing import PowerTransformer
 from scipy.stats           import shapiro, fligner
 
 # Packages
 import statsmodels.api as sm
+import hashlib
+import json
 import scipy.stats     as stats
 import seaborn         as sns 
 import pandas          as pd
@@ -237,6 +240,46 @@ def analyze_anova_assumptions(
         print(f"Estadístico: {levene_test.statistic:.3f}, Valor p: {levene_test.pvalue:.3f}\n")
 
 
+def plotAssumptionTests(transformed_df:pd.DataFrame, project_path:Path, usetex:bool = True, file_type:str = 'pdf')->List[Path]:
+    """
+    Renders the normality figures (histogram and Q-Q plot of each story) of every (Metric, Dir) tested by
+    anova.runAssumptionTests. It's the plotting stage of the batch tests, so it can be skipped or run later.
+    Returns the paths of the saved figures.
+    """
+    plt.rcParams.update({
+        "text.usetex": usetex,
+        "font.size": 13,
+        "font.family": "serif",
+        "text.latex.preamble": r'\usepackage{amsmath}'
+    })
+    names = {'drift': 'Drift', 'spectra': 'Spectra', 'base_shear': 'Corte Basal'}
+    paths = []
+    project_path.mkdir(parents=True, exist_ok=True)
+    for (metric, direction), df in transformed_df.groupby(['Metric', 'Dir'], sort=False, observed=True):
+        stories = list(pd.unique(df['Story']))
+        fig, axes = plt.subplots(2, len(stories), figsize=(max(4, 1.8 * len(stories)), 5), squeeze=False)
+        for i, story in enumerate(stories):
+            values = df.loc[df['Story'] == story, 'BoxCox']
+            label  = 'Base' if story == 0 else f'Estación {story}'
+            
+            # Histograma en la primera fila y Q-Q plot en la segunda
+            sns.histplot(values, kde=True, ax=axes[0, i])
+            sm.qqplot(values, line='s', ax=axes[1, i])
+            axes[0, i].set_title(label)
+            axes[1, i].set_title(label)
+            axes[0, i].set_xlabel('')
+            axes[0, i].set_ylabel('Frecuencia' if i == 0 else '')
+            axes[1, i].set_xlabel('Cuantiles teóricos' if i == len(stories) // 2 else '')
+            axes[1, i].set_ylabel('Cuantiles de la muestra' if i == 0 else '')
+        fig.suptitle(f'Métrica de {names.get(metric, metric)} en dirección {direction}')
+        fig.tight_layout()
+        save_path = project_path / f'assumptions_{metric}_{direction}.{file_type}'
+        fig.savefig(save_path, dpi=100)
+        plt.close(fig)
+        paths.append(save_path)
+    return paths
+
+
 # ==================================================================================
 # PLOTTING METRICS CLASS
 # ==================================================================================
@@ -274,7 +317,8 @@ class Plotting:
             self, sim_type:int,
             stories:int, nsubs:int,
             magnitude:float, iteration:int, rupture:int, station:int, 
-            show_plots:bool = True, dpi:int = 100, grid:bool = False, file_type:str = 'png'
+            show_plots:bool = True, dpi:int = 100, grid:bool = False, file_type:str = 'png', usetex:bool = True,
+            incremental:bool = True
             ):
         sim_type_map = {
             1: 'FB',
@@ -291,6 +335,8 @@ class Plotting:
         self.direction   = None
         self.dpi         = dpi
         self.file_type   = file_type
+        self.usetex      = usetex
+        self.incremental = incremental
         self.sim_type    = sim_type_map.get(sim_type)
         self.stories     = stories
         self.magnitude   = magnitude
@@ -337,7 +383,7 @@ class Plotting:
         to add plots in a way of axes[0,0].plot() instead of ax.plot().
         """
         plt.rcParams.update({
-            "text.usetex": True,  # Habilitar LaTeX
+            "text.usetex": self.usetex,  # Habilitar LaTeX
             "font.size": 13,      # Tamaño de fuente por defecto (puedes cambiar a 12 si lo prefieres)
             "font.family": "serif",  # Usar una fuente serif que es típica en documentos LaTeX
             "text.latex.preamble": r'\usepackage{amsmath}'  # Opcional: paquete extra de LaTeX para matemáticas
@@ -358,12 +404,55 @@ class Plotting:
     def plotSave(self, fig):
         self.save_path.mkdir(parents=True, exist_ok=True)
         full_save_path = self.save_path / f'{self.file_name}.{self.file_type}'
-        fig.savefig(full_save_path, dpi=100)
+        
+        # Only render the figure if it changed since the last time it was saved in this path
+        manifest_path = self.save_path / '.render_manifest' / f'{full_save_path.name}.json'
+        fig_hash      = self.figureHash(fig)
+        if not (self.incremental and full_save_path.exists() and self.readManifest(manifest_path) == fig_hash):
+            fig.savefig(full_save_path, dpi=100)
+            manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            manifest = {'file'     : full_save_path.name, 
+                        'hash'     : fig_hash,
+                        'dpi'      : 100, 
+                        'fig_size' : [float(size) for size in fig.get_size_inches()], 
+                        'file_type': self.file_type, 
+                        'usetex'   : self.usetex}
+            manifest_path.write_text(json.dumps(manifest, indent=2))
         # Mostrar figura solo si el backend no es 'Agg'
         if plt.get_backend() != 'agg':
             plt.show()
         plt.close(fig)  # Asegúrate de cerrar la figura para liberar memoria
 
+    def figureHash(self, fig:Figure)->str:
+        """
+        Hash of everything that changes the saved file: the plotted data, the style of each line, the
+        limits, ticks and texts of each axes and the render params (dpi, fig_size, file_type, usetex).
+        """
+        sha = hashlib.sha256()
+        def add(*values):
+            for value in values:
+                sha.update(repr(value).encode())
+        add(100, self.dpi, [float(size) for size in fig.get_size_inches()], self.file_type, self.usetex)
+        add(fig._suptitle.get_text() if fig._suptitle is not None else None)
+        for ax in fig.axes:
+            add(ax.get_title(), ax.get_xlabel(), ax.get_ylabel(), ax.get_xlim(), ax.get_ylim())
+            add(ax.xaxis.get_major_formatter().format_ticks(ax.get_xticks()), 
+                ax.yaxis.get_major_formatter().format_ticks(ax.get_yticks()))
+            for line in ax.get_lines():
+                sha.update(np.ascontiguousarray(line.get_xydata(), dtype=float).tobytes())
+                add(line.get_label(), line.get_color(), line.get_linestyle(), line.get_linewidth(), 
+                    line.get_alpha(), line.get_marker(), line.get_markersize())
+        for legend in fig.legends + [ax.get_legend() for ax in fig.axes if ax.get_legend() is not None]:
+            add([text.get_text() for text in legend.get_texts()])
+        return sha.hexdigest()
+    
+    @staticmethod
+    def readManifest(manifest_path:Path)->str|None:
+        try:
+            return json.loads(manifest_path.read_text())['hash']
+        except (OSError, ValueError, KeyError):
+            return None
+
     # ==================================================================================
     # PLOT METRICS FUNCTIONS
     # ==================================================================================
@@ -451,6 +540,18 @@ class Plotting:
                             accel_df:pd.DataFrame, story_nodes_df:pd.DataFrame, direction:str, stories_lst:list[int], 
                             save_fig:bool=True, axes:plt.Axes=None, fig_size:tuple[float, float]=(19.2, 10.8)
                             )->Tuple[plt.Axes, pd.DataFrame]:   #linestyle:str='--'
+        # Check input and raise errors
+        if direction not in ['x', 'y', 'z']: raise PlottingError(f'Dir must be x, y or z! Current: {direction}')
+
+        # Compute the spectrum of each story and plot it
+        spa_df = computeStoriesSpectra(accel_df, story_nodes_df, direction, stories_lst)
+        axes   = self.plotStoriesSpectrumsDF(spa_df, direction, stories_lst, save_fig=save_fig, axes=axes, fig_size=fig_size)
+        return axes, spa_df
+
+    def plotStoriesSpectrumsDF(self,
+                            spa_df:pd.DataFrame, direction:str, stories_lst:list[int], 
+                            save_fig:bool=True, axes:plt.Axes=None, fig_size:tuple[float, float]=(19.2, 10.8)
+                            )->plt.Axes:
         # Init params
         colors         = ['blue', 'green', 'red', 'cyan', 'magenta', 'yellow', 'black', 'orange', 'purple', 'brown']
         line_styles    = ['-', '--', '-.', ':']  # Diferentes estilos de línea
@@ -479,33 +580,16 @@ class Plotting:
         ax.set_xlabel('T (s)') if self.station in [7,8,9] else ax.xaxis.set_major_formatter(formatter)
         ax.set_ylabel(f'Acceleration in {direction.upper()} (m/s/s)') if self.station in [4] else ax.set_ylabel('')
         
-        # Make plot spectrum
-        nu = 0.05
-        T = np.linspace(0.003, 2, 1000)
-        w  = 2 * np.pi / np.array(T)
-        spa_lst = []
+        # Plot the spectrum of each story
         for i, story in enumerate(stories_lst):
             # Setup color and linestyle
             color = colors[i % len(colors)]
             line_style = line_styles[i % len(line_styles)]
-
-            # Obtain the spectrum
-            df = accel_df[story_nodes_df.loc[story].index].copy()
-            df.loc[:,'Average'] = df.mean(axis=1) # We use the acceleration in the center of mass
-            adir = df.xs(direction, level='Dir')['Average'][::16]
-            Spe = [max(max(u_x), abs(min(u_x))) * wi**2 for wi in w for u_x, _ in [pwl(adir.values, wi, nu)]]
-            Spe = np.array(Spe)
-            spa_lst.append(Spe)
-
-            # Write the maximum values of the spectrum
-            ax.plot(T, Spe, label=f'Story {story}', alpha=0.1, linestyle=line_style, color=color, linewidth=0.5)
-
-        # Compute df
-        spa_df = pd.DataFrame({f'Story {story} {direction}': spa for story, spa in zip(stories_lst, spa_lst)}, index=T)
+            ax.plot(spa_df.index, spa_df[f'Story {story} {direction}'].values, label=f'Story {story}', alpha=0.1, linestyle=line_style, color=color, linewidth=0.5)
 
         if save_fig:
             self.plotSave(fig)
-        return axes, spa_df
+        return axes
     
     def plotMeanStoriesSpectrums(self,
                             mean_spectras:pd.DataFrame, direction:str, stories_lst:list[int], 
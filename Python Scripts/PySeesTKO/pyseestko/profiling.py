@@ -0,0 +1,229 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from contextlib import contextmanager
+from pathlib    import Path
+from typing     import Callable, Dict
+
+import pandas as pd
+import tracemalloc
+import functools
+import platform
+import datetime
+import json
+import time
+try:
+    import resource # Not available on Windows
+except ImportError:
+    resource = None
+# ==================================================================================
+# STAGE PROFILER
+# ==================================================================================
+# Stage level instrumentation: every stage records its wall and CPU time, the peak RSS of the process (and how
+# much the stage raised it), the peak of the python allocations (tracemalloc, only if trace_memory) and the
+# bytes read and written by the process. The stages can be nested, e.g. simulation/simulation_model/model_benchmark,
+# and the times of a stage include its children. The RSS comes from getrusage and the bytes from /proc/self/io,
+# so they are None on the systems that don't have them (e.g. Windows).
+MB = 1024 * 1024
+
+def peakRSS()->float|None:
+    """
+    Peak resident set size of the process in MB, None if it's unknown.
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / MB if platform.system() == 'Darwin' else maxrss / 1024 # bytes on macOS, KB on Linux
+
+def ioCounters()->Dict[str, int]|None:
+    """
+    Bytes read and written by the process (rchar and wchar of /proc/self/io), None if they are unknown.
+    """
+    try:
+        with open('/proc/self/io') as file:
+            counters = dict(line.split(':') for line in file)
+        return {'read': int(counters['rchar']), 'written': int(counters['wchar'])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+class StageProfiler:
+    """
+    This class records the stats of the stages of a process, each stage is a context manager or a
+    decorated function:
+        profiler = StageProfiler()
+        with profiler.stage('loadModelInfo'):
+            ...
+        @profiler.profile('spectra')
+        def spectra(...): ...
+    A disabled profiler runs the stages without measuring them.
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        If False, the stages are not measured. The default is True.
+    trace_memory : bool, optional
+        If True, the peak of the python allocations of each stage is traced with tracemalloc, it slows the
+        stages down. The default is False.
+    """
+    def __init__(self, enabled:bool = True, trace_memory:bool = False):
+        self.enabled      = enabled
+        self.trace_memory = trace_memory
+        self.records      = []
+        self._stack       = []
+        self._tracing     = False
+
+    # ==============================================================================
+    # STAGES
+    # ==============================================================================
+    @contextmanager
+    def stage(self, name:str):
+        """
+        Measures the block as the stage name, nested in the running stage if there is one.
+        """
+        if not self.enabled:
+            yield
+            return
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        frame = self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit(frame)
+
+    def profile(self, name:str|None = None)->Callable:
+        """
+        Decorator that measures every call of the function as the stage name (the function name by default).
+        """
+        def decorator(function:Callable)->Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or function.__name__):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _enter(self, name:str)->dict:
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        frame   = {'name': name, 'tracing': tracing, 'rss': peakRSS(), 'io': ioCounters(), 'traced_peak': 0, 'traced_start': 0}
+        if tracing:
+            # The peak is reset for the stage, the parent keeps the peak reached before it
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['traced_peak'] = max(self._stack[-1]['traced_peak'], peak)
+            tracemalloc.reset_peak()
+            frame['traced_start'] = current
+        self._stack.append(frame)
+        frame['wall'], frame['cpu'] = time.perf_counter(), time.process_time()
+        return frame
+
+    def _exit(self, frame:dict)->None:
+        wall, cpu = time.perf_counter() - frame['wall'], time.process_time() - frame['cpu']
+        self._stack.pop()
+        rss, counters = peakRSS(), ioCounters()
+        traced_peak   = None
+        if frame['tracing']:
+            peak        = max(frame['traced_peak'], tracemalloc.get_traced_memory()[1])
+            traced_peak = (peak - frame['traced_start']) / MB
+            tracemalloc.reset_peak()
+            if self._stack:
+                self._stack[-1]['traced_peak'] = max(self._stack[-1]['traced_peak'], peak)
+        self.records.append({
+            'stage'         : '/'.join([parent['name'] for parent in self._stack] + [frame['name']]),
+            'name'          : frame['name'],
+            'depth'         : len(self._stack),
+            'start'         : frame['wall'],
+            'wall'          : wall,
+            'cpu'           : cpu,
+            'rss_peak_mb'   : rss,
+            'rss_growth_mb' : rss - frame['rss'] if rss is not None and frame['rss'] is not None else None,
+            'traced_peak_mb': traced_peak,
+            'read_mb'       : (counters['read']    - frame['io']['read'])    / MB if counters and frame['io'] else None,
+            'written_mb'    : (counters['written'] - frame['io']['written']) / MB if counters and frame['io'] else None})
+
+    def close(self)->None:
+        """
+        Stops tracemalloc if this profiler started it.
+        """
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def reset(self)->None:
+        self.records = []
+
+    # ==============================================================================
+    # REPORTS
+    # ==============================================================================
+    def report(self)->pd.DataFrame:
+        """
+        Returns one row per measured call, in the order the stages started:
+        | stage | name | depth | wall | cpu | rss_peak_mb | rss_growth_mb | traced_peak_mb | read_mb | written_mb |
+        """
+        columns = ['stage', 'name', 'depth', 'wall', 'cpu', 'rss_peak_mb', 'rss_growth_mb', 'traced_peak_mb', 'read_mb', 'written_mb']
+        if not self.records:
+            return pd.DataFrame(columns=columns)
+        return pd.DataFrame(self.records).sort_values('start', kind='stable')[columns].reset_index(drop=True)
+
+    def summary(self)->pd.DataFrame:
+        """
+        Returns the stats of each stage over all its calls: the number of calls, the total times and bytes
+        and the max of the peaks. The stages keep the order of their first call.
+        """
+        report = self.report()
+        if report.empty:
+            return report
+        grouped = report.groupby('stage', sort=False)
+        return pd.DataFrame({
+            'calls'         : grouped.size(),
+            'depth'         : grouped['depth'].first(),
+            'wall'          : grouped['wall'].sum(),
+            'cpu'           : grouped['cpu'].sum(),
+            'rss_peak_mb'   : grouped['rss_peak_mb'].max(),
+            'rss_growth_mb' : grouped['rss_growth_mb'].sum(min_count=1),
+            'traced_peak_mb': grouped['traced_peak_mb'].max(),
+            'read_mb'       : grouped['read_mb'].sum(min_count=1),
+            'written_mb'    : grouped['written_mb'].sum(min_count=1)})
+
+    def toDict(self, summary:bool = False)->dict:
+        """
+        Returns the report as a JSON serializable dict, with the date and the totals of the top level stages.
+        With summary, the stages are the rows of summary() (one per stage) instead of one per call.
+        """
+        report = self.report()
+        top    = report[report['depth'] == 0]
+        stages = self.summary().reset_index() if summary and not report.empty else report
+        return {'date'    : datetime.datetime.now().isoformat(timespec='seconds'),
+                'platform': platform.platform(),
+                'total'   : {'wall': float(top['wall'].sum()), 'cpu': float(top['cpu'].sum())},
+                'stages'  : json.loads(stages.to_json(orient='records'))}
+
+    def save(self, file_path:Path)->Path:
+        """
+        Saves the report as JSON (.json) or CSV (any other suffix).
+        """
+        file_path = Path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        if file_path.suffix == '.json':
+            with open(file_path, 'w') as file:
+                json.dump(self.toDict(), file, indent=2)
+        else:
+            self.report().to_csv(file_path, index=False)
+        return file_path
+
+def profiled(name:str|None = None)->Callable:
+    """
+    Decorator for the methods of the classes with a profiler attribute (a StageProfiler), each call is
+    measured as the stage name (the method name by default). Without a profiler the method runs as is.
+    """
+    def decorator(method:Callable)->Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, 'profiler', None)
+            if profiler is None or not profiler.enabled:
+                return method(self, *args, **kwargs)
+            with profiler.stage(name or method.__name__):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -2,11 +2,18 @@
 # IMPORT LIBRARIES
 # ==================================================================================
 from pyseestko.db_manager import DataBaseManager        #type: ignore
+from pyseestko.db_manager import isRemoteBackend        #type: ignore
 from pyseestko.plotting   import Plotting               #type: ignore
 from pyseestko.utilities  import NCh433_2012            #type: ignore
 from pyseestko.utilities  import initialize_ssh_tunnel  #type: ignore
 from pyseestko.utilities  import checkMainQueryInput    #type: ignore
 from pyseestko.utilities  import save_df_to_csv_paths   #type: ignore
+from pyseestko.utilities  import computeStoriesSpectra  #type: ignore
+from pyseestko.utilities  import cumulativeStatistics   #type: ignore
+from pyseestko.utilities  import assignZonesToStationsInDF #type: ignore
+from pyseestko.parquet_store import ParquetResultsStore  #type: ignore
+from concurrent.futures   import ThreadPoolExecutor, ProcessPoolExecutor
+from collections          import deque
 from pathlib              import Path
 from typing               import List, Dict, Tuple 
 from tqdm                 import tqdm
@@ -14,7 +21,10 @@ from matplotlib           import pyplot as plt
 
 import numpy  as np
 import pandas as pd
+import threading
+import sqlite3
 import pickle
+import json
 import time
 # ==================================================================================================
 # MAIN FUNCTION
@@ -54,6 +64,13 @@ def executeMainQuery(
     # Logic params
     windows     : bool = True,
     project_path: Path = git_path/ 'DataBase-Outputs',
+    cache_path  : Path|None = None,
+    store_path  : Path|None = None,
+    backend     : str  = 'mysql',
+    prefetch    : int  = 4,
+    render      : bool = True,
+    render_workers: int = 0,
+    usetex      : bool = True,
     verbose     : bool = True,
     ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
     """
@@ -89,6 +106,16 @@ def executeMainQuery(
     - save_spectra: Path to save the spectra plots, if None, it will not save the plots nor the data
     - save_b_shear: Path to save the base shear plots, if None, it will not save the plots nor the data
     - windows: True if the OS is Windows, False if Linux
+    - cache_path: Folder of the local results cache, if None the database is always queried
+    - store_path: Folder of a Parquet results store written by exportCampaignParquet, if given the results are
+      read from it and the database is not used
+    - backend: Database backend, 'mysql' or 'sqlite' (database is the path of a local SQLite file, no ssh tunnel)
+    - prefetch: Number of cases fetched ahead in a pool of connections, 0 fetches case after case
+    - render: If False, only the data is queried, no figure is created. The returned dicts can be plotted
+      later with renderGridPlots
+    - render_workers: If > 0, the data is queried first and then each grid figure is rendered in a pool of 
+      render_workers processes with renderGridPlots, 0 plots each case while it is queried
+    - usetex: If False, the figures use the matplotlib mathtext instead of LaTeX, useful for fast drafts
 
     Returns:
     - drifts_df_lst: List of drift dataframes
@@ -107,16 +134,34 @@ def executeMainQuery(
     # Iterate over the subs, then over the sim_type and then over the stations so we can get all the results
     total_iterations = len(sim_types) * len(stations) * len(iterations) * len(nsubs_lst)
     pbar = tqdm(total=total_iterations, desc='Processing')
+    cache = QueryResultsCache(cache_path) if cache_path is not None else None
+    store = ParquetResultsStore(store_path) if store_path is not None else None
     
     # -------------------------------------- EXECUTE THE MAIN QUERY ---------------------------------
     # Iterate over the simulation types
-    drifts_df_dict, spectra_df_dict, base_shear_df_dict = queryMetricsInGridPlots(
-        sim_types, stations, iterations, nsubs_lst, mag_map, loc_map, rup_map, project_path, pbar,
-        user, password, host, database, 
-        save_drift, save_spectra, save_b_shear, show_plots, fig_size, xlim_sup, dpi, file_type,
-        linearity, stories, magnitude, rupture_type, 
-        windows, verbose)
+    if render and render_workers == 0:
+        drifts_df_dict, spectra_df_dict, base_shear_df_dict = queryMetricsInGridPlots(
+            sim_types, stations, iterations, nsubs_lst, mag_map, loc_map, rup_map, project_path, pbar,
+            user, password, host, database, 
+            save_drift, save_spectra, save_b_shear, show_plots, fig_size, xlim_sup, dpi, file_type,
+            linearity, stories, magnitude, rupture_type, 
+            windows, verbose, cache, prefetch, usetex, store, backend)
+    else:
+        drifts_df_dict, spectra_df_dict, base_shear_df_dict = queryMetricsData(
+            sim_types, stations, iterations, nsubs_lst, mag_map, loc_map, rup_map, pbar,
+            user, password, host, database, 
+            save_drift, save_spectra, save_b_shear,
+            linearity, stories, magnitude, rupture_type, 
+            windows, verbose, cache, prefetch, store, backend)
     pbar.close()
+    
+    # -------------------------------------- RENDER THE RESULTS -------------------------------------
+    if render and render_workers > 0:
+        print('Rendering...')
+        renderGridPlots(drifts_df_dict, spectra_df_dict, base_shear_df_dict,
+                        sim_types, stations, iterations, nsubs_lst, project_path,
+                        fig_size, xlim_sup, dpi, file_type, usetex,
+                        stories, magnitude, rupture_type, workers=render_workers)
     print('Done!')
     
     # -------------------------------------- SAVE THE RESULTS ---------------------------------------
@@ -161,6 +206,9 @@ def queryMetricsInSinglePlots(
     # Optional params
     windows     : bool = True,
     verbose     : bool = True,
+    cache       : 'QueryResultsCache|None' = None,
+    store       : 'ParquetResultsStore|None' = None,
+    backend     : str  = 'mysql',
     )-> Tuple[Dict[str, pd.DataFrame], Dict[str, List[pd.DataFrame]], Dict[str, pd.DataFrame]]:
     """
     This function will execute the main query to get the results from the database in single plots
@@ -190,7 +238,8 @@ def queryMetricsInSinglePlots(
                                             mag_map.get(magnitude,    'None'),
                                             rup_map.get(rupture_type, 'None'), iteration,
                                             loc_map.get(station,      'None'),
-                                            stories, nsubs, plotter, windows=windows, verbose=verbose)
+                                            stories, nsubs, plotter, windows=windows, verbose=verbose, cache=cache, store=store,
+                                            backend=backend)
                     
                     # Get the results for zone = 'Las Condes', soil_category = 'B' and importance = 2
                     drift, spectra, base_shear, _ = query.getAllResults(save_drift, 
@@ -243,10 +292,17 @@ def queryMetricsInGridPlots(
     # Optional params
     windows     : bool = True,
     verbose     : bool = True,
+    cache       : 'QueryResultsCache|None' = None,
+    prefetch    : int  = 4,
+    usetex      : bool = True,
+    store       : 'ParquetResultsStore|None' = None,
+    backend     : str  = 'mysql',
     )-> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
     """
     This function will execute the main query to get the results from the database in grid plots
     The grid is going to be a 3x3 grid with the drifts, spectra and base shear. 
+    If prefetch > 0, the rows of the next cases are fetched in a pool of connections while the
+    current case is decoded and plotted, the cases are still consumed in the loop order.
     """
     # Init params
     sim_type_map       = {1: 'FixBase', 2: 'AbsBound', 3: 'DRM'}
@@ -259,6 +315,30 @@ def queryMetricsInGridPlots(
     save_spectra = project_path / 'Story Spectra Output' if save_spectra else None
     save_b_shear = project_path / 'Base Shear Output'    if save_b_shear else None
     nch  = NCh433_2012('Las Condes', 'B', 2)
+    
+    # Prefetch params, the workers never plot so they don't need a plotter
+    fetch_results = not all([save_drift==None, save_spectra==None, save_b_shear==None])
+    cases = [(sim_type, nsubs, station, iteration) for sim_type in sim_types for nsubs in nsubs_lst 
+                                                   for station in stations for iteration in iterations]
+    def fetch_case(case):
+        sim_type, nsubs, station, iteration = case
+        query = ProjectQueries(user, password, host, database, sim_type, linearity,
+                               mag_map.get(magnitude,    'None'),
+                               rup_map.get(rupture_type, 'None'), 
+                               iteration,
+                               loc_map.get(station,      'None'),
+                               stories, nsubs, None, windows=False, verbose=verbose, cache=cache, store=store, backend=backend)
+        try:
+            return query.fetchAllResults(save_drift, save_spectra, save_b_shear)
+        finally:
+            query.close_connection()
+    prefetched = None
+    if fetch_results and prefetch > 0:
+        if windows and store is None and isRemoteBackend(backend):
+            initialize_ssh_tunnel(verbose=verbose)
+            time.sleep(1)
+        prefetched = _prefetchCases(cases, fetch_case, prefetch, pbar)
+    
     # Iterate over the subs, then over the sim_type and then over the stations so we can get all the results
     for sim_type in sim_types:
         for nsubs in nsubs_lst:
@@ -279,20 +359,25 @@ def queryMetricsInGridPlots(
                         plotter = Plotting(sim_type, stories,                    # The class that plots the data
                                         nsubs, magnitude,
                                         iteration, rupture_type,
-                                        station, show_plots=show_plots, grid=True, dpi=dpi, file_type=file_type)
+                                        station, show_plots=show_plots, grid=True, dpi=dpi, file_type=file_type, usetex=usetex)
                         query   = ProjectQueries(user, password, host, database, sim_type, linearity,
                                                 mag_map.get(magnitude,    'None'),
                                                 rup_map.get(rupture_type, 'None'), 
                                                 iteration,
                                                 loc_map.get(station,      'None'),
-                                                stories, nsubs, plotter, windows=windows, verbose=verbose) 
+                                                stories, nsubs, plotter, windows=windows, verbose=verbose, cache=cache, store=store,
+                                                connect=prefetched is None, backend=backend) 
+                        fetched = None
+                        if prefetched is not None:
+                            case, fetched = next(prefetched)
+                            assert case == (sim_type, nsubs, station, iteration), f'Prefetched case {case} out of order'
                         
                         # -------------------------------------- EXECUTE THE MAIN QUERY ---------------------------------
                         # Get the results for zone = 'Las Condes', soil_category = 'B' and importance = 2
                         drift, spectra, base_shear, axes = query.getAllResults(save_drift, save_spectra, save_b_shear, 
                                                                     structure_weight, xlim_sup=xlim_sup, verbose=verbose,
                                                                     drift_axes=drift_axes, spectra_axes=spectra_axes, base_shear_axes=base_shear_axes,
-                                                                    save_fig=False, fig_size=fig_size)
+                                                                    save_fig=False, fig_size=fig_size, prefetched=fetched)
                         drift_axes, spectra_axes, base_shear_axes = axes # update the axes
                         
                         # Fill dictionaries
@@ -326,62 +411,266 @@ def queryMetricsInGridPlots(
                         continue
     return drifts_df_dict, spectra_df_dict, base_shear_df_dict
 
+def queryMetricsData(
+    # Params
+    sim_types   : List[int], 
+    stations    : List[int], 
+    iterations  : List[int], 
+    nsubs_lst   : List[int], 
+    mag_map     : Dict[float, str], 
+    loc_map     : Dict[int, str], 
+    rup_map     : Dict[int, str],
+    pbar        : tqdm,
+    # DataBase params 
+    user        : str, 
+    password    : str, 
+    host        : str, 
+    database    : str,
+    # Metric params
+    get_drift   : bool  = True, 
+    get_spectra : bool  = True, 
+    get_b_shear : bool  = True, 
+    # Sim params
+    linearity   : int  = 1, 
+    stories     : int  = 20, 
+    magnitude   : int  = 6.7, 
+    rupture_type: int  = 1, 
+    # Optional params
+    windows     : bool = True,
+    verbose     : bool = True,
+    cache       : 'QueryResultsCache|None' = None,
+    prefetch    : int  = 4,
+    store       : 'ParquetResultsStore|None' = None,
+    backend     : str  = 'mysql',
+    )-> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+    """
+    This function will execute the main query in data only mode, no Plotting object nor figure is created.
+    If prefetch > 0, the cases (fetch and spectra computation) are processed in a pool of prefetch threads,
+    the dicts are still filled in the loop order. The dicts have the same keys as queryMetricsInGridPlots.
+    """
+    # Init params
+    sim_type_map       = {1: 'FixBase', 2: 'AbsBound', 3: 'DRM'}
+    drifts_df_dict     = {}
+    spectra_df_dict    = {}
+    base_shear_df_dict = {}
+    cases = [(sim_type, nsubs, station, iteration) for sim_type in sim_types for nsubs in nsubs_lst 
+                                                   for station in stations for iteration in iterations]
+    def process_case(case, windows=False):
+        sim_type, nsubs, station, iteration = case
+        query = ProjectQueries(user, password, host, database, sim_type, linearity,
+                               mag_map.get(magnitude,    'None'),
+                               rup_map.get(rupture_type, 'None'), 
+                               iteration,
+                               loc_map.get(station,      'None'),
+                               stories, nsubs, None, windows=windows, verbose=verbose, cache=cache, store=store, backend=backend)
+        return query.getAllData(get_drift, get_spectra, get_b_shear)
+    
+    # Process the cases in order, the ssh tunnel is opened once for all the workers
+    if prefetch > 0:
+        if windows and store is None and isRemoteBackend(backend):
+            initialize_ssh_tunnel(verbose=verbose)
+            time.sleep(1)
+        results = _prefetchCases(cases, process_case, prefetch, pbar)
+    else:
+        results = ((case, process_case(case, windows)) for case in cases)
+    for (sim_type, nsubs, station, iteration), (drift, spectra, base_shear) in results:
+        sim_name                     = f'{sim_type_map[sim_type]}_20f{nsubs}s_rup_bl_{iteration}_s{station}'
+        drifts_df_dict[sim_name]     = drift
+        spectra_df_dict[sim_name]    = spectra
+        base_shear_df_dict[sim_name] = base_shear
+        pbar.update(1)
+    return drifts_df_dict, spectra_df_dict, base_shear_df_dict
+
+def renderGridPlots(
+    # Data params
+    drifts_df_dict    : Dict[str, pd.DataFrame|None],
+    spectra_df_dict   : Dict[str, pd.DataFrame|None],
+    base_shear_df_dict: Dict[str, pd.DataFrame|None],
+    # Params
+    sim_types   : List[int], 
+    stations    : List[int], 
+    iterations  : List[int], 
+    nsubs_lst   : List[int], 
+    project_path: Path,
+    # Plot params
+    fig_size    : Tuple[float, float] = (19.2, 10.8),
+    xlim_sup    : float = 0.008,
+    dpi         : int   = 100,
+    file_type   : str   = 'png',
+    usetex      : bool  = True,
+    # Sim params
+    stories     : int  = 20, 
+    magnitude   : int  = 6.7, 
+    rupture_type: int  = 1, 
+    # Optional params
+    workers     : int|None = None,
+    )->List[Path]:
+    """
+    This function renders the grid plots of queryMetricsInGridPlots from the dicts returned by the data only
+    mode of executeMainQuery, so the figures can be created after (or without) the query. A metric is only
+    plotted if its dict has data, the figures are saved in the same paths as queryMetricsInGridPlots.
+    Each figure (metric, direction, sim_type, nsubs) is rendered in its own worker process with the Agg backend,
+    workers=1 renders them in this process. usetex=False uses the matplotlib mathtext for fast drafts.
+    Returns the paths of the rendered figures.
+    """
+    # Init params
+    sim_type_map = {1: 'FixBase', 2: 'AbsBound', 3: 'DRM'}
+    metrics = {'drift'     : (drifts_df_dict,     project_path / 'Drift Output'),
+               'spectra'   : (spectra_df_dict,    project_path / 'Story Spectra Output'),
+               'base_shear': (base_shear_df_dict, project_path / 'Base Shear Output')}
+    
+    # One task per figure, each one only carries the cases it plots
+    tasks = []
+    for metric, (df_dict, save_path) in metrics.items():
+        if not any(df is not None for df in df_dict.values()):
+            continue
+        for sim_type in sim_types:
+            for nsubs in nsubs_lst:
+                names    = [f'{sim_type_map[sim_type]}_20f{nsubs}s_rup_bl_{iteration}_s{station}' for station in stations for iteration in iterations]
+                case_dfs = {name: df_dict[name] for name in names}
+                for direction in ['x', 'y']:
+                    tasks.append(dict(metric=metric, direction=direction, sim_type=sim_type, nsubs=nsubs, df_dict=case_dfs,
+                                      stations=stations, iterations=iterations, save_path=save_path, fig_size=fig_size, 
+                                      xlim_sup=xlim_sup, dpi=dpi, file_type=file_type, usetex=usetex, 
+                                      stories=stories, magnitude=magnitude, rupture_type=rupture_type))
+    
+    # Render the figures
+    if workers == 1:
+        return [_renderGridFigure(**task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_renderGridFigure, **task) for task in tasks]
+        return [future.result() for future in futures]
+
+def _renderGridFigure(
+    metric      : str,
+    direction   : str,
+    sim_type    : int,
+    nsubs       : int,
+    df_dict     : Dict[str, pd.DataFrame],
+    stations    : List[int],
+    iterations  : List[int],
+    save_path   : Path,
+    fig_size    : Tuple[float, float],
+    xlim_sup    : float,
+    dpi         : int,
+    file_type   : str,
+    usetex      : bool,
+    stories     : int,
+    magnitude   : int,
+    rupture_type: int,
+    )->Path:
+    # Init params
+    sim_type_map = {1: 'FixBase', 2: 'AbsBound', 3: 'DRM'}
+    stories_lst  = [1,5,10,15,20]
+    plot_xlim    = 0.0001 # getAllResults always plots the single cases with this limit
+    x_direction  = direction == 'x'
+    index        = 0 if x_direction else 1
+    Qmax = NCh433_2012('Las Condes', 'B', 2).computeMaxBaseShear_c6_3_7_2(22241.3 if nsubs == 4 else 18032.3)
+    axes = [np.full((3, 3), None), np.full((3, 3), None)]
+    done = {}
+    
+    # Iterate in the same order as the query so the axes and the means are the same
+    for station in stations:
+        for iteration in iterations:
+            sim_name = f'{sim_type_map[sim_type]}_20f{nsubs}s_rup_bl_{iteration}_s{station}'
+            df       = df_dict[sim_name]
+            save_fig = station == stations[-1] and iteration == iterations[-1]
+            plotter  = Plotting(sim_type, stories, nsubs, magnitude, iteration, rupture_type, station, 
+                                show_plots=False, grid=True, dpi=dpi, file_type=file_type, usetex=usetex)
+            plotter.save_path = Path(save_path)
+            plotter.setup_direction(x_direction=x_direction)
+            
+            # Plot the case
+            if metric == 'drift':
+                axes[index] = plotter.plotModelDrift(df['Max x'].values, df['CM x'].values, df['Max y'].values, df['CM y'].values,
+                                                     xlim_sup=plot_xlim, axes=axes[index], legend=False, save_fig=False, fig_size=fig_size)
+            elif metric == 'spectra':
+                axes[index] = plotter.plotStoriesSpectrumsDF(df, direction, stories_lst, axes=axes[index], save_fig=False, fig_size=fig_size)
+            else:
+                axes[index] = plotter.plotShearBaseOverTime(df.index, list(df[f'Shear {direction.upper()}'].values), Qmax, direction, 
+                                                            axes=axes[index], save_fig=False, fig_size=fig_size, mean=False)
+            done[sim_name] = df
+            
+            # Plot the means of the station
+            if iteration == iterations[-1]:
+                if metric == 'drift':
+                    _plotMeanDriftColor(done, plotter, xlim_sup, axes, save_fig, fig_size, directions=[direction])
+                elif metric == 'spectra':
+                    _plotMeanSpectraColor(done, plotter, axes, save_fig, fig_size, directions=[direction])
+                else:
+                    _plotMeanBaseShearColor(done, plotter, axes, save_fig, fig_size, Qmax, directions=[direction])
+    return plotter.save_path / f'{plotter.file_name}.{file_type}'
 
-def _plotMeanDriftColor(drifts_df_dict: Dict[str, pd.DataFrame], plotter: Plotting, xlim_sup:float, drift_axes:plt.Axes, save_fig:bool, fig_size:bool):
-    mean_drifts_x = pd.concat([df['CM x'] for df in list(drifts_df_dict.values())[-5:]], axis=1).mean(axis=1).values
-    mean_drifts_y = pd.concat([df['CM y'] for df in list(drifts_df_dict.values())[-5:]], axis=1).mean(axis=1).values
-    plotter.setup_direction(x_direction=True)
-    plotter.plotModelDrift([], mean_drifts_x, [], [],
-                            xlim_sup = xlim_sup, 
-                            axes     = drift_axes[0], 
-                            legend   = True, 
-                            save_fig = save_fig,
-                            fig_size = fig_size,
-                            line_color = 'red')
-    plotter.setup_direction(x_direction=False)
-    plotter.plotModelDrift([], [], [], mean_drifts_y,
-                            xlim_sup = xlim_sup, 
-                            axes     = drift_axes[1], 
-                            legend   = True, 
-                            save_fig = save_fig,
-                            fig_size = fig_size,
-                            line_color = 'blue')
+def _prefetchCases(cases:List[tuple], fetch_case, prefetch:int, pbar:tqdm):
+    """
+    Generator that yields (case, results) in the same order as cases, while a pool of prefetch
+    threads keeps the next cases fetching in the background. The pbar counts the processed cases
+    and its postfix shows how many cases have already been fetched.
+    """
+    fetched = [0]
+    lock    = threading.Lock()
+    def done(_):
+        with lock:
+            fetched[0] += 1
     
-def _plotMeanSpectraColor(spectra_df_dict: Dict[str, pd.DataFrame], plotter: Plotting, spectra_axes:plt.Axes, save_fig:bool, fig_size:bool):
-    columns_x = [f'Story {story} x' for story in [1,5,10,15,20]]
-    columns_y = [f'Story {story} y' for story in [1,5,10,15,20]]
-    mean_spectras_x = pd.concat([df[columns_x] for df in list(spectra_df_dict.values())[-5:]], axis=1)
-    mean_spectras_y = pd.concat([df[columns_y] for df in list(spectra_df_dict.values())[-5:]], axis=1)
-    plotter.setup_direction(x_direction=True)
-    plotter.plotMeanStoriesSpectrums(mean_spectras_x, 'x', [1,5,10,15,20], save_fig, spectra_axes[0], fig_size)
-    plotter.setup_direction(x_direction=False)
-    plotter.plotMeanStoriesSpectrums(mean_spectras_y, 'y', [1,5,10,15,20], save_fig, spectra_axes[1], fig_size)
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        pending = deque()
+        def submit(case):
+            future = executor.submit(fetch_case, case)
+            future.add_done_callback(done)
+            pending.append((case, future))
+        
+        # Fill the window and then keep it full while the cases are consumed
+        remaining = iter(cases)
+        for case in remaining:
+            submit(case)
+            if len(pending) >= prefetch: break
+        while pending:
+            case, future = pending.popleft()
+            results = future.result()
+            next_case = next(remaining, None)
+            if next_case is not None: submit(next_case)
+            pbar.set_postfix(fetched=fetched[0], refresh=False)
+            yield case, results
+
+
+def _plotMeanDriftColor(drifts_df_dict: Dict[str, pd.DataFrame], plotter: Plotting, xlim_sup:float, drift_axes:plt.Axes, save_fig:bool, fig_size:bool,
+                        directions:List[str]=['x', 'y']):
+    for direction in directions:
+        x_direction = direction == 'x'
+        mean_drifts = pd.concat([df[f'CM {direction}'] for df in list(drifts_df_dict.values())[-5:]], axis=1).mean(axis=1).values
+        plotter.setup_direction(x_direction=x_direction)
+        plotter.plotModelDrift([], mean_drifts if x_direction else [], [], [] if x_direction else mean_drifts,
+                                xlim_sup = xlim_sup, 
+                                axes     = drift_axes[0 if x_direction else 1], 
+                                legend   = True, 
+                                save_fig = save_fig,
+                                fig_size = fig_size,
+                                line_color = 'red' if x_direction else 'blue')
     
-def _plotMeanBaseShearColor(base_shear_df_dict: Dict[str, pd.DataFrame], plotter: Plotting, base_shear_axes:plt.Axes, save_fig:bool, fig_size:bool, Qmax:float):
-    mean_base_shear_x = pd.concat([df['Shear X'] for df in list(base_shear_df_dict.values())[-5:]], axis=1).mean(axis=1)
-    mean_base_shear_y = pd.concat([df['Shear Y'] for df in list(base_shear_df_dict.values())[-5:]], axis=1).mean(axis=1)
-    plotter.setup_direction(x_direction=True)
-    plotter.plotShearBaseOverTime(
-                time           = mean_base_shear_x.index, 
-                time_shear_fma = mean_base_shear_x.values, 
-                Qmax           = Qmax, 
-                dir_           = 'x', 
-                axes           = base_shear_axes[0], 
-                save_fig       = save_fig, 
-                fig_size       = fig_size, 
-                leyend         = True,
-                mean           = True)
-    plotter.setup_direction(x_direction=False)
-    plotter.plotShearBaseOverTime(
-                time           = mean_base_shear_y.index, 
-                time_shear_fma = mean_base_shear_y.values, 
-                Qmax           = Qmax, 
-                dir_           = 'y', 
-                axes           = base_shear_axes[1], 
-                save_fig       = save_fig, 
-                fig_size       = fig_size, 
-                leyend         = True,
-                mean           = True)
+def _plotMeanSpectraColor(spectra_df_dict: Dict[str, pd.DataFrame], plotter: Plotting, spectra_axes:plt.Axes, save_fig:bool, fig_size:bool,
+                          directions:List[str]=['x', 'y']):
+    for direction in directions:
+        columns       = [f'Story {story} {direction}' for story in [1,5,10,15,20]]
+        mean_spectras = pd.concat([df[columns] for df in list(spectra_df_dict.values())[-5:]], axis=1)
+        plotter.setup_direction(x_direction=direction == 'x')
+        plotter.plotMeanStoriesSpectrums(mean_spectras, direction, [1,5,10,15,20], save_fig, spectra_axes[0 if direction == 'x' else 1], fig_size)
+    
+def _plotMeanBaseShearColor(base_shear_df_dict: Dict[str, pd.DataFrame], plotter: Plotting, base_shear_axes:plt.Axes, save_fig:bool, fig_size:bool, Qmax:float,
+                            directions:List[str]=['x', 'y']):
+    for direction in directions:
+        mean_base_shear = pd.concat([df[f'Shear {direction.upper()}'] for df in list(base_shear_df_dict.values())[-5:]], axis=1).mean(axis=1)
+        plotter.setup_direction(x_direction=direction == 'x')
+        plotter.plotShearBaseOverTime(
+                    time           = mean_base_shear.index, 
+                    time_shear_fma = mean_base_shear.values, 
+                    Qmax           = Qmax, 
+                    dir_           = direction, 
+                    axes           = base_shear_axes[0 if direction == 'x' else 1], 
+                    save_fig       = save_fig, 
+                    fig_size       = fig_size, 
+                    leyend         = True,
+                    mean           = True)
     
 def getDriftDFs(drifts_df_lst:List[pd.DataFrame]):
     """
@@ -447,37 +736,7 @@ def getReplicaCummStatisticDriftDFs(drifts_df_lst:List[pd.DataFrame], statistic:
     drift_df : pd.DataFrame
         Concatenation of df1 and df2.
     """
-    # Check input
-    if statistic not in ['mean', 'std']:
-        raise ValueError(f'Statistic must be mean or std, current: {statistic}')
-    
-    # Init params
-    drift_x_df, drift_y_df, drift_df = getDriftDFs(drifts_df_lst)
-    
-    #X Direction
-    stories_statistic_lst = []
-    for i, column in enumerate(drift_x_df.columns):
-        if statistic == 'mean':
-            stories_statistic_lst.append(drift_x_df[drift_x_df.columns[:i+1]].mean(axis=1).loc[[1,5,10,15,20]])
-        elif statistic == 'std':
-            stories_statistic_lst.append(drift_x_df[drift_x_df.columns[:i+1]].std(axis=1).loc[[1,5,10,15,20]])
-    df1 = pd.concat(stories_statistic_lst, axis=1)
-    df1 = df1.droplevel((1,2))
-    
-    #Y Direction
-    stories_statistic_lst = []
-    for i, column in enumerate(drift_y_df.columns):
-        if statistic == 'mean':
-            stories_statistic_lst.append(drift_y_df[drift_y_df.columns[:i+1]].mean(axis=1).loc[[1,5,10,15,20]])
-        elif statistic == 'std':
-            stories_statistic_lst.append(drift_y_df[drift_y_df.columns[:i+1]].std(axis=1).loc[[1,5,10,15,20]])
-    df2 = pd.concat(stories_statistic_lst, axis=1)
-    df2 = df2.droplevel((1,2))
-    
-    # Concatenate X and Y
-    drift_df = pd.concat([df1, df2], axis=0)
-    
-    return df1, df2, drift_df        
+    return _splitCummStatisticDF(getReplicaCummStatistics('drift', {'case': drifts_df_lst}, statistic))
 
 def DEPgetSpectraDfs(spectra_df_lst:List[pd.DataFrame]):
     """
@@ -521,6 +780,35 @@ def DEPgetSpectraDfs(spectra_df_lst:List[pd.DataFrame]):
 
     return df1, df2, spectra_df
 
+def getSpectraDFs(spectra_df_lst:List[pd.DataFrame]):
+    """
+    This function will get the max spectra dataframes of the x and y directions
+    and return the spectra dataframe of the x direction, the spectra dataframe of the y direction
+    and the concatenation of both dataframes. The max is taken over the periods of each story spectrum.
+    It's supposed to be used after the main query is executed.
+    
+    Parameters
+    ----------
+    spectra_df_lst : List[pd.DataFrame]
+        List of spectra dataframes, as returned by the main query.
+        
+    Returns
+    -------
+    df1 : pd.DataFrame
+        Spectra dataframe of the x direction.
+    df2 : pd.DataFrame
+        Spectra dataframe of the y direction.
+    spectra_df : pd.DataFrame
+        Concatenation of df1 and df2.
+    """
+    dfs = []
+    for direction in ['x', 'y']:
+        stories, values = getReplicaArray('spectra', spectra_df_lst, direction)
+        df = pd.DataFrame(values, columns=[f'rep_{i+1}' for i in range(values.shape[1])],
+                          index=pd.MultiIndex.from_product([stories, ['spectrum'], [direction]], names=['Story', 'Metric', 'Dir']))
+        dfs.append(df)
+    return dfs[0], dfs[1], pd.concat(dfs, axis=0)
+
 def getCummStatisticSpectraDFs(spectra_df_lst:List[pd.DataFrame], statistic:str='mean'):
     """
     This function will get the cummultive mean spectra dataframes of the x and y directions, for each story as index,
@@ -542,55 +830,367 @@ def getCummStatisticSpectraDFs(spectra_df_lst:List[pd.DataFrame], statistic:str=
     spectra_df : pd.DataFrame
         Concatenation of df1 and df2.
     """
-    # Check input
-    if statistic not in ['mean', 'std']:
-        raise ValueError(f'Statistic must be mean or std, current: {statistic}')
-    
-    # Init params
-    spectra_x_df, spectra_y_df, spectra_df = getSpectraDfs(spectra_df_lst)
-    
-    #X Direction
-    stories_statistic_lst = []
-    for i, column in enumerate(spectra_x_df.columns):
-        if statistic == 'mean':
-            stories_statistic_lst.append(spectra_x_df[spectra_x_df.columns[:i+1]].mean(axis=1))
-        elif statistic == 'std':
-            stories_statistic_lst.append(spectra_x_df[spectra_x_df.columns[:i+1]].std(axis=1))
-    df1 = pd.concat(stories_statistic_lst, axis=1)
-    df1 = df1.droplevel((1,2))
-    
-    #Y Direction
-    stories_statistic_lst = []
-    for i, column in enumerate(spectra_y_df.columns):
-        if statistic == 'mean':
-            stories_statistic_lst.append(spectra_y_df[spectra_y_df.columns[:i+1]].mean(axis=1))
-        elif statistic == 'std':
-            stories_statistic_lst.append(spectra_y_df[spectra_y_df.columns[:i+1]].std(axis=1))
-    df2 = pd.concat(stories_statistic_lst, axis=1)
-    df2 = df2.droplevel((1,2))
+    return _splitCummStatisticDF(getReplicaCummStatistics('spectra', {'case': spectra_df_lst}, statistic))
+
+def getReplicaCummStatisticBaseShearDFs(base_shear_df_lst:List[pd.DataFrame], statistic:str='mean'):
+    """
+    This function will get the cummultive statistic of the max base shear of the x and y directions, 
+    the first column gives the statistic given 1 replica, the second column given 2 replicas and so on.
     
-    # Concatenate X and Y
-    spectra_df = pd.concat([df1, df2], axis=0)
+    Parameters
+    ----------
+    base_shear_df_lst : List[pd.DataFrame]
+        List of base shear dataframes.
+
+    Returns
+    -------
+    df1 : pd.DataFrame
+        Statistic of the max base shear of the x direction.
+    df2 : pd.DataFrame
+        Statistic of the max base shear of the y direction.
+    base_shear_df : pd.DataFrame
+        Concatenation of df1 and df2.
+    """
+    return _splitCummStatisticDF(getReplicaCummStatistics('base_shear', {'case': base_shear_df_lst}, statistic))
+
+def groupReplicasByCase(df_dict:Dict[str, pd.DataFrame], sim_types:List[int], nsubs_lst:List[int], 
+                        stations:List[int], iterations:List[int])->Dict[str, List[pd.DataFrame]]:
+    """
+    Group the results of the main query by case (sim_type, nsubs, station), the replicas of each case are
+    the iterations in the given order. The case names are '{sim_type}_20f{nsubs}s_s{station}'.
+    """
+    sim_type_map = {1: 'FixBase', 2: 'AbsBound', 3: 'DRM'}
+    return {f'{sim_type_map[sim_type]}_20f{nsubs}s_s{station}': 
+                [df_dict[f'{sim_type_map[sim_type]}_20f{nsubs}s_rup_bl_{iteration}_s{station}'] for iteration in iterations]
+            for sim_type in sim_types for nsubs in nsubs_lst for station in stations}
+
+def getReplicaCummStatistics(metric:str, cases_df_lsts:Dict[str, List[pd.DataFrame]], statistic:str='mean')->pd.DataFrame:
+    """
+    Cumulative statistic over the replicas of every case at once. The max per replica of each case is stacked
+    in a (story x replica x case) array per direction and the running statistic is computed in one pass
+    with utilities.cumulativeStatistics.
     
-    return df1, df2, spectra_df
+    Parameters
+    ----------
+    metric : str
+        'drift', 'spectra' or 'base_shear'.
+    cases_df_lsts : Dict[str, List[pd.DataFrame]]
+        Replicas dataframes of each case, e.g. the output of groupReplicasByCase. All the cases must have
+        the same number of replicas.
+    statistic : str
+        'mean' or 'std'.
 
-def getReplicaCummStatisticBaseShearDFs(base_shear_df_lst:List[pd.DataFrame], statistic:str='mean'):
+    Returns
+    -------
+    df : pd.DataFrame
+        Dataframe indexed by (Case, Dir, Story) with one rep_i column per number of replicas.
+    """
     # Check input
     if statistic not in ['mean', 'std']:
         raise ValueError(f'Statistic must be mean or std, current: {statistic}')
+    if metric not in ['drift', 'spectra', 'base_shear']:
+        raise ValueError(f'Metric must be drift, spectra or base_shear, current: {metric}')
     
-    # Init params
-    spectra_x_lst = [df['Shear X'].max() for df in base_shear_df_lst]
-    spectra_y_lst = [df['Shear Y'].max() for df in base_shear_df_lst]
+    # Compute the statistic of all the cases and both directions
+    dfs = []
+    for direction in ['x', 'y']:
+        arrays = [getReplicaArray(metric, df_lst, direction) for df_lst in cases_df_lsts.values()]
+        stories = arrays[0][0]
+        mean, std = cumulativeStatistics(np.stack([values for _, values in arrays], axis=2), axis=1)
+        values  = mean if statistic == 'mean' else std
+        nreps   = values.shape[1]
+        values  = values.transpose(2, 0, 1).reshape(-1, nreps) # (case*story) x replica
+        index   = pd.MultiIndex.from_product([list(cases_df_lsts.keys()), [direction], stories], names=['Case', 'Dir', 'Story'])
+        dfs.append(pd.DataFrame(values, index=index, columns=[f'rep_{i+1}' for i in range(nreps)]))
+    return pd.concat(dfs, axis=0).sort_index(level=['Case', 'Dir'], sort_remaining=False)
+
+def getReplicaArray(metric:str, df_lst:List[pd.DataFrame], direction:str)->Tuple[list, np.ndarray]:
+    # The (story x replica) array of the max value of each replica
+    if metric == 'drift':
+        stories = [1,5,10,15,20]
+        values  = np.column_stack([df[f'CM {direction}'].loc[stories].values for df in df_lst])
+    elif metric == 'spectra':
+        stories = [1,5,10,15,20]
+        values  = np.column_stack([df[[f'Story {story} {direction}' for story in stories]].values.max(axis=0) for df in df_lst])
+    else:
+        stories = ['Base Shear']
+        values  = np.array([[df[f'Shear {direction.upper()}'].max() for df in df_lst]])
+    return stories, values
+
+def _splitCummStatisticDF(df:pd.DataFrame)->Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    # Single case output: x, y and both directions indexed by story
+    df1 = df.xs('x', level='Dir').droplevel('Case')
+    df2 = df.xs('y', level='Dir').droplevel('Case')
+    return df1, df2, pd.concat([df1, df2], axis=0)
 
-    # Create a one row DataFrame, with index name equal to "Base Shear"
-    max_shear_x_df = pd.DataFrame([spectra_x_lst], index=['Base Shear'], columns=[f'rep_{i}' for i in range(1,11)])
-    max_shear_y_df = pd.DataFrame([spectra_y_lst], index=['Base Shear'], columns=[f'rep_{i}' for i in range(1,11)])
+
+# ==================================================================================================
+# TIDY RESULTS TABLE
+# ==================================================================================================
+def getResultsTable(
+    drifts_df_dict    : Dict[str, pd.DataFrame|None],
+    spectra_df_dict   : Dict[str, pd.DataFrame|None],
+    base_shear_df_dict: Dict[str, pd.DataFrame|None],
+    sim_types         : List[int], 
+    nsubs_lst         : List[int], 
+    stations          : List[int], 
+    iterations        : List[int], 
+    stories_lst       : List[int] = [1,5,10,15,20],
+    spectra_period_idx: int       = 416,
+    )->pd.DataFrame:
+    """
+    This function builds a single long format table with the results of the main query, one row per value:
+    | Sim_Type | Nsubs | Iteration | Station | Zone | Metric | Dir | Story | Value |
+    The factors are categorical columns with the labels of getDriftResultsDF (e.g. 'DRM', '20f2s', '3', 's5'),
+    the cases come from the case grid (not from parsing the keys of the dicts) and the values are float32.
+    The values are the same as the legacy wide dataframes: the center of mass drift of each story, the spectra
+    at T[spectra_period_idx] (the third mode, T=0.83s) of each story and the max abs base shear as Story 0.
+    A metric is skipped if its dict has no data.
+    """
+    # Case grid, in the same order as the main query
+    sim_type_map = {1: 'FixBase', 2: 'AbsBound', 3: 'DRM'}
+    grid  = np.array([(i, j, k, l) for i in range(len(sim_types)) for j in range(len(nsubs_lst)) 
+                                   for k in range(len(stations))  for l in range(len(iterations))], dtype=np.int32).reshape(-1, 4)
+    names = [f'{sim_type_map[sim_types[i]]}_20f{nsubs_lst[j]}s_rup_bl_{iterations[l]}_s{stations[k]}' for i, j, k, l in grid]
     
-    # Concatenate X and Y
-    max_shear_df = pd.concat([max_shear_x_df, max_shear_y_df], axis=0)
+    # (case x story) values of each metric and direction
+    blocks = [] # (metric, direction, stories, values)
+    if all(drifts_df_dict.get(name) is not None for name in names):
+        for direction in ['x', 'y']:
+            blocks.append(('drift', direction, stories_lst, np.stack([drifts_df_dict[name][f'CM {direction}'].loc[stories_lst].to_numpy() for name in names])))
+    if all(spectra_df_dict.get(name) is not None for name in names):
+        for direction in ['x', 'y']:
+            columns = [f'Story {story} {direction}' for story in stories_lst]
+            blocks.append(('spectra', direction, stories_lst, np.stack([spectra_df_dict[name][columns].iloc[spectra_period_idx].to_numpy() for name in names])))
+    if all(base_shear_df_dict.get(name) is not None for name in names):
+        for direction in ['x', 'y']:
+            blocks.append(('base_shear', direction, [0], np.array([[base_shear_df_dict[name][f'Shear {direction.upper()}'].abs().max()] for name in names])))
+    
+    # Codes of each row, the rows of a block are case major and story minor
+    metrics     = ['drift', 'spectra', 'base_shear']
+    all_stories = [0] + list(stories_lst)
+    case_codes, metric_codes, dir_codes, story_codes, values = [], [], [], [], []
+    for metric, direction, stories, block in blocks:
+        ncases, nstories = block.shape
+        case_codes.append(np.repeat(np.arange(ncases), nstories))
+        metric_codes.append(np.full(block.size, metrics.index(metric)))
+        dir_codes.append(np.full(block.size, ['x', 'y'].index(direction)))
+        story_codes.append(np.tile([all_stories.index(story) for story in stories], ncases))
+        values.append(block.reshape(-1))
+    if not blocks:
+        case_codes, metric_codes, dir_codes, story_codes, values = [np.array([], dtype=int)] * 4 + [np.array([])]
+    case_codes = np.concatenate(case_codes)
     
-    return max_shear_x_df, max_shear_y_df, max_shear_df
+    # Zone of each station, the stations out of the zones are NaN
+    zones       = ['zone1', 'zone2', 'zone3']
+    zone_codes  = np.array([zones.index(assignZonesToStationsInDF(f's{station}')) if station in range(1, 10) else -1 for station in stations])
+    return pd.DataFrame({
+        'Sim_Type' : pd.Categorical.from_codes(grid[case_codes, 0], [sim_type_map[sim_type] for sim_type in sim_types]),
+        'Nsubs'    : pd.Categorical.from_codes(grid[case_codes, 1], [f'20f{nsubs}s' for nsubs in nsubs_lst]),
+        'Iteration': pd.Categorical.from_codes(grid[case_codes, 3], [str(iteration) for iteration in iterations]),
+        'Station'  : pd.Categorical.from_codes(grid[case_codes, 2], [f's{station}' for station in stations]),
+        'Zone'     : pd.Categorical.from_codes(zone_codes[grid[case_codes, 2]], zones),
+        'Metric'   : pd.Categorical.from_codes(np.concatenate(metric_codes), metrics),
+        'Dir'      : pd.Categorical.from_codes(np.concatenate(dir_codes), ['x', 'y']),
+        'Story'    : pd.Categorical.from_codes(np.concatenate(story_codes), all_stories),
+        'Value'    : np.concatenate(values).astype(np.float32),
+        })
+
+def pivotResultsTable(results_df:pd.DataFrame, metric:str, direction:str)->pd.DataFrame:
+    """
+    This function reproduces the legacy wide dataframes (getDriftResultsDF, getSpectraResultsDF and
+    getSBaseResultsDF) of a metric and direction from the table of getResultsTable.
+    """
+    # Select the rows of the metric, the rows are already in the case grid order
+    df     = results_df[(results_df['Metric'] == metric) & (results_df['Dir'] == direction)]
+    wide   = df.pivot(index=['Sim_Type', 'Nsubs', 'Station', 'Iteration'], columns='Story', values='Value').dropna(how='all')
+    wide   = wide.loc[:, wide.notna().any(axis=0)]
+    wide.columns = [f'MaxShear{direction.upper()}' if metric == 'base_shear' else f's{story}' for story in wide.columns]
+    wide   = wide.reset_index()[['Sim_Type', 'Nsubs', 'Iteration', 'Station'] + list(wide.columns)]
+    if metric == 'spectra':
+        wide.insert(4, 'Zone', wide['Station'].astype(str).map(assignZonesToStationsInDF))
+    return wide
+
+
+# ==================================================================================================
+# LOCAL CACHE OF THE QUERY RESULTS
+# ==================================================================================================
+class QueryResultsCache:
+    """
+    This class stores the decoded results of the ProjectQueries class in a local SQLite file,
+    so repeated analysis sessions only hit the database for the cases that are new or were re-uploaded.
+    Every entry is keyed by the metric ('drift', 'spectra' or 'base_shear') and the case tuple
+    (sim_type, linearity, magnitude, rupture_type, iteration, location, stories, subs).
+
+    The invalidation logic is the following:
+    1. The MAX(IDSimulation) of the database is queried once per session.
+    2. If an entry was validated against that same MAX(IDSimulation), nothing was uploaded since then
+       and the entry is served directly.
+    3. If not, the IDSimulation of the case is queried. If it matches the one stored in the entry,
+       the entry is still valid and it's marked as validated.
+    4. Otherwise the results are fetched from the database and the entry is replaced.
+
+    Parameters
+    ----------
+    cache_path : Path
+        Folder where the 'query_cache.sqlite' file is stored.
+    verbose : bool, optional
+        If True, prints which entries are served from the cache. The default is False.
+    """
+    def __init__(self, cache_path:Path, verbose:bool=False):
+        self.cache_path = Path(cache_path)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.file_path  = self.cache_path / 'query_cache.sqlite'
+        self.verbose    = verbose
+        self._max_id    = None
+        self._lock      = threading.Lock()
+        with self._connect() as cnx:
+            cnx.execute("""
+            CREATE TABLE IF NOT EXISTS cached_results (
+                Metric         TEXT    NOT NULL,
+                CaseKey        TEXT    NOT NULL,
+                IDSimulation   INTEGER NOT NULL,
+                ValidatedMaxID INTEGER NOT NULL,
+                Data           BLOB    NOT NULL,
+                PRIMARY KEY (Metric, CaseKey));
+            """)
+
+    def _connect(self):
+        # A new connection per operation keeps the cache usable from several threads
+        return sqlite3.connect(self.file_path, timeout=30)
+
+    @staticmethod
+    def caseKey(values:tuple)->str:
+        return '|'.join(str(value) for value in values)
+
+    def databaseMaxID(self, cursor)->int:
+        """
+        Returns the MAX(IDSimulation) of the database, it's queried only once per session.
+        """
+        with self._lock:
+            if self._max_id is None:
+                cursor.execute('SELECT MAX(IDSimulation) FROM simulation;')
+                self._max_id = cursor.fetchall()[-1][0]
+        return self._max_id
+
+    def fetch(self, metric:str, values:tuple, cursor, simulation_id, loader):
+        """
+        Returns the decoded results of a case, using the cache when the entry is still valid.
+
+        Parameters
+        ----------
+        metric : str
+            Name of the cached metric.
+        values : tuple
+            Case tuple used in the queries.
+        cursor : Cursor
+            Cursor of the database, used to check the MAX(IDSimulation).
+        simulation_id : Callable
+            Function that returns the IDSimulation of the case.
+        loader : Callable
+            Function that queries and decodes the results from the database.
+        """
+        key    = self.caseKey(values)
+        max_id = self.databaseMaxID(cursor)
+        with self._connect() as cnx:
+            entry = cnx.execute('SELECT IDSimulation, ValidatedMaxID, Data FROM cached_results WHERE Metric = ? AND CaseKey = ?',
+                                (metric, key)).fetchone()
+        if entry is not None and entry[1] == max_id:
+            if self.verbose: print(f'Cache hit: {metric} {key}')
+            return pickle.loads(entry[2])
+
+        sim_id = simulation_id()
+        if entry is not None and entry[0] == sim_id:
+            with self._connect() as cnx:
+                cnx.execute('UPDATE cached_results SET ValidatedMaxID = ? WHERE Metric = ? AND CaseKey = ?', (max_id, metric, key))
+            if self.verbose: print(f'Cache hit: {metric} {key}')
+            return pickle.loads(entry[2])
+
+        # New or re-uploaded case
+        data = loader()
+        with self._connect() as cnx:
+            cnx.execute('INSERT OR REPLACE INTO cached_results VALUES (?, ?, ?, ?, ?)',
+                        (metric, key, sim_id, max_id, pickle.dumps(data)))
+        if self.verbose: print(f'Cache miss: {metric} {key}')
+        return data
+
+    def clear(self):
+        with self._connect() as cnx:
+            cnx.execute('DELETE FROM cached_results')
+
+
+# ==================================================================================================
+# OFFLINE EXPORT OF THE QUERY RESULTS
+# ==================================================================================================
+def exportCampaignParquet(
+    # Params
+    store_path  : Path,
+    sim_types   : List[int],
+    stations    : List[int],
+    iterations  : List[int],
+    nsubs_lst   : List[int],
+    mag_map     : Dict[float, str],
+    loc_map     : Dict[int, str],
+    rup_map     : Dict[int, str],
+    # DataBase params
+    user        : str,
+    password    : str,
+    host        : str,
+    database    : str,
+    # Sim params
+    linearity   : int  = 1,
+    stories     : int  = 20,
+    magnitude   : int  = 6.7,
+    rupture_type: int  = 1,
+    # Optional params
+    metrics     : List[str] = ['drift', 'spectra', 'base_shear', 'pga'],
+    overwrite   : bool = False,
+    windows     : bool = True,
+    verbose     : bool = True,
+    cache       : 'QueryResultsCache|None' = None,
+    prefetch    : int  = 4,
+    backend     : str  = 'mysql',
+    )->ParquetResultsStore:
+    """
+    This function exports the decoded drift, story accelerations (the input of the spectra), base shear and
+    input PGA of every case to a Hive partitioned Parquet store (one partition per case), see
+    ParquetResultsStore. The cases already in the store are skipped unless overwrite is True.
+    The store can then be given to executeMainQuery (store_path) or to ProjectQueries (store) to run the
+    analysis offline.
+    """
+    # Init params
+    store = ParquetResultsStore(store_path, verbose=verbose)
+    cases = [(sim_type, nsubs, station, iteration) for sim_type in sim_types for nsubs in nsubs_lst
+                                                   for station in stations for iteration in iterations]
+    def case_values(case):
+        sim_type, nsubs, station, iteration = case
+        return (sim_type, linearity, mag_map.get(magnitude, 'None'), rup_map.get(rupture_type, 'None'),
+                iteration, loc_map.get(station, 'None'), stories, nsubs)
+    def fetch_case(case):
+        values  = case_values(case)
+        missing = [metric for metric in metrics if overwrite or not store.hasCase(metric, values)]
+        if not missing:
+            return {}
+        query = ProjectQueries(user, password, host, database, *values, None, windows=False, verbose=verbose, cache=cache, backend=backend)
+        try:
+            loaders = {'drift': query.story_drift, 'spectra': query.stories_spectra,
+                       'base_shear': query.base_shear, 'pga': query.input_pga}
+            return {metric: loaders[metric]() for metric in missing}
+        finally:
+            query.close_connection()
+
+    # Fetch the cases in a pool of connections and write them in order
+    if windows and isRemoteBackend(backend):
+        initialize_ssh_tunnel(verbose=verbose)
+        time.sleep(1)
+    pbar    = tqdm(total=len(cases), desc='Exporting')
+    results = _prefetchCases(cases, fetch_case, prefetch, pbar) if prefetch > 0 else ((case, fetch_case(case)) for case in cases)
+    for case, fetched in results:
+        for metric, data in fetched.items():
+            store.write(metric, case_values(case), data)
+        pbar.update(1)
+    pbar.close()
+    return store
 
 
 # ==================================================================================================
@@ -613,24 +1213,69 @@ class ProjectQueries:
         subs        :int,
         plotter     :Plotting,
         windows     :bool=True,
-        verbose     :bool=True):
+        verbose     :bool=True,
+        cache       :'QueryResultsCache|None'=None,
+        connect     :bool=True,
+        store       :'ParquetResultsStore|None'=None,
+        backend     :str='mysql'):
 
         # Save attributes
         self.values  = (sim_type, linearity, magnitude, rupture_type, iteration, location, stories, subs)
         self.plotter = plotter
+        self.cache   = cache
+        self.store   = store
 
-        # Connect the model to the database
-        if windows:
+        # Connect the model to the database, a query fed with prefetched results or reading a store doesn't need it
+        self.DataBase = None
+        self.cursor   = None
+        if not connect or store is not None:
+            return
+        if windows and isRemoteBackend(backend):
             initialize_ssh_tunnel(verbose=verbose)
             time.sleep(1)
-        self.DataBase = DataBaseManager(user, password, host, database)
+        self.DataBase = DataBaseManager(user, password, host, database, backend=backend)
         self.cursor = self.DataBase.cursor
 
     def _execute_query(self, query, parameters):
         self.cursor.execute(query, parameters)
         return self.cursor.fetchall()
 
+    def _cached(self, metric:str, loader):
+        # Serve the decoded results from the Parquet store or the local cache when one is attached
+        if self.store is not None:
+            return self.store.fetch(metric, self.values)
+        if self.cache is None:
+            return loader()
+        return self.cache.fetch(metric, self.values, self.cursor, self.simulation_id, loader)
+
+    def simulation_id(self):
+        query = """
+        SELECT MAX(sim.IDSimulation)
+        FROM simulation sim
+        JOIN simulation_sm_input           sminput  ON sim.idSM_Input            = sminput.IDSM_Input
+        JOIN simulation_model              sm       ON sim.idModel 	         = sm.IDModel
+        JOIN model_specs_structure         mss      ON sm.idSpecsStructure       = mss.IDSpecsStructure
+        WHERE sim.idType          = %s AND mss.idLinearity      = %s
+        AND sminput.Magnitude     = %s AND sminput.Rupture_Type = %s
+        AND sminput.RealizationID = %s AND sminput.Location     = %s
+        AND mss.Nstories          = %s AND mss.Nsubs            = %s;
+        """
+        data = self._execute_query(query, self.values)
+        return data[-1][0]
+
     def story_drift(self):
+        return self._cached('drift', self._query_story_drift)
+
+    def stories_spectra(self):
+        return self._cached('spectra', self._query_stories_spectra)
+
+    def base_shear(self):
+        return self._cached('base_shear', self._query_base_shear)
+
+    def input_pga(self):
+        return self._cached('pga', self._query_input_pga)
+
+    def _query_story_drift(self):
         # Init the query
         query = """
         SELECT drift.*
@@ -656,7 +1301,7 @@ class ProjectQueries:
 
         return max_center_x, max_center_y, max_corner_x, max_corner_y
 
-    def stories_spectra(self):
+    def _query_stories_spectra(self):
         query = """
         SELECT msp.*
         FROM simulation sim
@@ -678,7 +1323,7 @@ class ProjectQueries:
 
         return accel_df, story_nodes_df
 
-    def base_shear(self):
+    def _query_base_shear(self):
         query = """
         SELECT sbs.*
         FROM simulation sim
@@ -703,8 +1348,59 @@ class ProjectQueries:
 
         return time_series, shear_x, shear_y, shear_z
 
+    def _query_input_pga(self):
+        query = """
+        SELECT pga.*
+        FROM simulation sim
+        JOIN simulation_sm_input        sminput ON sim.idSM_Input 	     = sminput.IDSM_Input
+        JOIN sm_input_pga               pga     ON sminput.idPGA             = pga.IDPGA
+        JOIN simulation_model           sm      ON sim.idModel 		     = sm.IDModel
+        JOIN model_specs_structure      mss     ON sm.idSpecsStructure       = mss.IDSpecsStructure
+        WHERE sim.idType          = %s AND mss.idLinearity      = %s
+        AND sminput.Magnitude     = %s AND sminput.Rupture_Type = %s
+        AND sminput.RealizationID = %s AND sminput.Location     = %s
+        AND mss.Nstories          = %s AND mss.Nsubs            = %s;
+        """
+        data = self._execute_query(query, self.values)
+
+        # Load the data, the PGA of each direction is a json with its max and min
+        sm_input_pga = data[-1]
+        pga_x = json.loads(sm_input_pga[1]) # type: ignore
+        pga_y = json.loads(sm_input_pga[2]) # type: ignore
+        pga_z = json.loads(sm_input_pga[3]) # type: ignore
+        units = sm_input_pga[4]
+
+        return pga_x, pga_y, pga_z, units
+
     def close_connection(self):
-        self.DataBase.close_connection()
+        if self.DataBase is not None:
+            self.DataBase.close_connection()
+
+    def getAllData(self, get_drift:bool=True, get_spectra:bool=True, get_b_shear:bool=True,
+                   prefetched:Dict[str, tuple|None]|None = None)->Tuple[pd.DataFrame|None, pd.DataFrame|None, pd.DataFrame|None]:
+        """
+        This function returns the drift, spectra and base shear dataframes of the case without plotting them,
+        the results are the same as the ones of getAllResults.
+        """
+        # Query the database
+        if prefetched is None:
+            prefetched = self.fetchAllResults(get_drift or None, get_spectra or None, get_b_shear or None)
+        self.close_connection()
+        
+        # Build the dataframes
+        drift_results_df      = _driftResultsDF(*prefetched['drift'])           if get_drift   else None
+        spectra_results_df    = _spectraResultsDF(*prefetched['spectra'])       if get_spectra else None
+        base_shear_results_df = _baseShearResultsDF(*prefetched['base_shear'])  if get_b_shear else None
+        return drift_results_df, spectra_results_df, base_shear_results_df
+
+    def fetchAllResults(self, save_drift:str|None, save_spectra:str|None, save_b_shear:str|None)->Dict[str, tuple|None]:
+        """
+        This function only fetches and decodes the rows used by getAllResults, so it can run
+        ahead of the plotting in another thread.
+        """
+        return {'drift'     : self.story_drift()     if save_drift   is not None else None,
+                'spectra'   : self.stories_spectra() if save_spectra is not None else None,
+                'base_shear': self.base_shear()      if save_b_shear is not None else None}
 
     # ===================================================================================================
     # ==================================== GET ALL THE RESULTS ==========================================
@@ -728,9 +1424,11 @@ class ProjectQueries:
         fig_size         :Tuple[float, float] = (19.2, 10.8),
         # Optional params
         verbose          :bool  = False,
+        prefetched       :Dict[str, tuple|None]|None = None,
                       )->Tuple[pd.DataFrame, List[pd.DataFrame], pd.DataFrame]:
         """
         This function will execute all the queries to get the results from the database
+        If prefetched is given (the output of fetchAllResults), the database is not queried again.
         """
         
         # Init params
@@ -739,13 +1437,15 @@ class ProjectQueries:
         spectra_results_df    = None
         base_shear_results_df = None
         xlim_sup              = 0.0001
+        if prefetched is None:
+            prefetched = self.fetchAllResults(save_drift, save_spectra, save_b_shear)
         
         # ===================================================================================================
         # ==================================== QUERY THE DRIFT PER FLOOR ====================================
         # ===================================================================================================
         if save_drift is not None:
             # Init the query
-            max_center_x, max_center_y, max_corner_x, max_corner_y = self.story_drift()
+            max_center_x, max_center_y, max_corner_x, max_corner_y = prefetched['drift']
             self.plotter.save_path = Path(save_drift)
 
             # Generate drift direction X plot
@@ -765,11 +1465,7 @@ class ProjectQueries:
                                                      legend   = False, 
                                                      save_fig = save_fig,
                                                      fig_size = fig_size)
-            drift_results_df  = pd.DataFrame({'CM x': max_center_x, 
-                                              'CM y': max_center_y, 
-                                              'Max x': max_corner_x, 
-                                              'Max y': max_corner_y}, 
-                                             index=range(1, len(max_corner_x)+1)).rename_axis('Story')
+            drift_results_df  = _driftResultsDF(max_center_x, max_center_y, max_corner_x, max_corner_y)
             drift_axes = (drift_axes_x, drift_axes_y)
 
         # ===================================================================================================
@@ -777,7 +1473,7 @@ class ProjectQueries:
         # ===================================================================================================
         if save_spectra is not None:
             # Init the query
-            accel_df, story_nodes_df = self.stories_spectra()
+            accel_df, story_nodes_df = prefetched['spectra']
 
             # Plot the data
             self.plotter.save_path = Path(save_spectra)
@@ -806,7 +1502,7 @@ class ProjectQueries:
         # ===================================================================================================
         if save_b_shear is not None:
             # Init the query
-            time_series, shear_x, shear_y, shear_z = self.base_shear()
+            time_series, shear_x, shear_y, shear_z = prefetched['base_shear']
             shear_x = list(np.array(shear_x) / 2.6)
             shear_y = list(np.array(shear_y) / 2.8)
 
@@ -838,10 +1534,7 @@ class ProjectQueries:
                                         fig_size       = fig_size,
                                         mean           = False
                                         )
-            base_shear_results_df = pd.DataFrame({'Shear X': shear_x, 
-                                                  'Shear Y': shear_y, 
-                                                  'Shear Z': shear_z}, 
-                                                 index=time_series).rename_axis('Time Step')
+            base_shear_results_df = _baseShearResultsDF(time_series, shear_x, shear_y, shear_z, scaled=True)
             base_shear_axes = (shear_axes_x, shear_axes_y)
         # ===================================================================================================
         # =========================================== END QUERIES ===========================================
@@ -855,4 +1548,27 @@ class ProjectQueries:
         
 
 
+# ==================================================================================================
+# RESULTS DATAFRAMES
+# ==================================================================================================
+def _driftResultsDF(max_center_x, max_center_y, max_corner_x, max_corner_y)->pd.DataFrame:
+    return pd.DataFrame({'CM x': max_center_x, 
+                         'CM y': max_center_y, 
+                         'Max x': max_corner_x, 
+                         'Max y': max_corner_y}, 
+                        index=range(1, len(max_corner_x)+1)).rename_axis('Story')
+
+def _spectraResultsDF(accel_df:pd.DataFrame, story_nodes_df:pd.DataFrame, stories_lst:List[int]=[1,5,10,15,20])->pd.DataFrame:
+    spa_x_df = computeStoriesSpectra(accel_df, story_nodes_df, 'x', stories_lst)
+    spa_y_df = computeStoriesSpectra(accel_df, story_nodes_df, 'y', stories_lst)
+    return pd.concat([spa_x_df, spa_y_df], axis=1)
 
+def _baseShearResultsDF(time_series, shear_x, shear_y, shear_z, scaled:bool=False)->pd.DataFrame:
+    # The stored shears are scaled the same way getAllResults does before plotting them
+    if not scaled:
+        shear_x = list(np.array(shear_x) / 2.6)
+        shear_y = list(np.array(shear_y) / 2.8)
+    return pd.DataFrame({'Shear X': shear_x, 
+                         'Shear Y': shear_y, 
+                         'Shear Z': shear_z}, 
+                        index=time_series).rename_axis('Time Step')
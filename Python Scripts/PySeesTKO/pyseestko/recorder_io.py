@@ -0,0 +1,101 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from pyseestko.errors import ModelInfoError #type: ignore
+from pathlib          import Path
+from typing           import Dict, List
+
+import pandas as pd
+import numpy  as np
+import json
+# ==================================================================================
+# RECORDING PLAN
+# ==================================================================================
+# Readers of the compact recording plan written by the AlbertisRecorder plugin (-compact option): one multi-node
+# recorder per partition and response and a plan in PartitionsInfo/plan/{response}.json with the nodes of each
+# recorder, the recorded dofs, the recording time step (-dT) and the story (level) and corner of each node (0 to 3
+# for the 4 corner nodes of each level, None for the others).
+# Each row of a multi-node recorder is a time step, with the dofs of every node: [time] n1_dof1 n1_dof2 ... n2_dof1 ...
+DOF_DIRECTIONS = {1: 'x', 2: 'y', 3: 'z'}
+
+def readRecordingPlan(partitions_path:Path, response:str)->dict|None:
+    """
+    Returns the recording plan of the response ('accel', 'disp' or 'reaction') or None if the results
+    were recorded with one recorder per node.
+    """
+    plan_path = Path(partitions_path) / 'plan' / f'{response}.json'
+    if not plan_path.exists():
+        return None
+    with open(plan_path, 'r') as file:
+        return json.load(file)
+
+def storyCornerNodes(stories:dict)->Dict[int, List[int]]:
+    """
+    Returns the corner nodes of each story, sorted by corner, from the story classification of the plugin (the
+    stories of a plan or of the manifest). The stories are numbered from the ground level (z = 0), the
+    subterranean levels are negative.
+    """
+    subs    = len({info['z'] for info in stories.values() if info['z'] < 0})
+    nodes   = [(info['level'] - subs, info['corner'], int(node)) for node, info in stories.items() if info['corner'] is not None]
+    corners = {}
+    for story, _, node in sorted(nodes):
+        corners.setdefault(story, []).append(node)
+    return corners
+
+def readCompactRecorders(run_path:Path, plan:dict, time_steps:np.ndarray|None = None, max_steps:int|None = None,
+                         nodes:List[int]|None = None)->pd.DataFrame:
+    """
+    Reads the multi-node recorders of a recording plan in the layout of the one recorder per node files:
+    a DataFrame indexed by (Time Step, Dir) with one 'Node {id}' column per node, sorted by node id.
+
+    Parameters
+    ----------
+    run_path : Path
+        Folder of the analysis, the recorders files of the plan are relative to it.
+    plan : dict
+        Recording plan, see readRecordingPlan.
+    time_steps : np.ndarray, optional
+        Time of each step. The default is the recorded time (-time) or the steps of the plan dT.
+    max_steps : int, optional
+        Maximum number of steps to read. The default is all of them.
+    nodes : List[int], optional
+        Nodes to read, only their columns of the recorders are parsed. The default is every recorded node.
+
+    Returns
+    -------
+    nodes_df : pd.DataFrame
+        Dataframe with the recorded response of every node.
+    """
+    # Check input
+    if plan['file_type'] != '-file':
+        raise ModelInfoError(f"Only text recorders (-file) can be read, current: {plan['file_type']}")
+
+    # Read the columns of the nodes of every recorder into a (step x node x dof) block
+    ndofs  = len(plan['dofs'])
+    keep   = None if nodes is None else set(nodes)
+    blocks, nodes, times = [], [], None
+    for recorder in plan['recorders']:
+        positions = [i for i, node in enumerate(recorder['nodes']) if keep is None or node in keep]
+        if not positions:
+            continue
+        offset  = 1 if plan['time'] else 0
+        columns = [offset + i * ndofs + dof for i in positions for dof in range(ndofs)]
+        data    = np.loadtxt(Path(run_path) / recorder['file'], ndmin=2, max_rows=max_steps, usecols=([0] if plan['time'] else []) + columns)
+        if plan['time']:
+            times, data = data[:, 0], data[:, 1:]
+        blocks.append(data.reshape(len(data), len(positions), ndofs))
+        nodes += [recorder['nodes'][i] for i in positions]
+    if not blocks:
+        raise ModelInfoError('None of the nodes to read are in the recorders of the plan')
+    nsteps = min(len(block) for block in blocks)
+    nsteps = nsteps if time_steps is None else min(nsteps, len(time_steps))
+    values = np.concatenate([block[:nsteps] for block in blocks], axis=1)
+
+    # Sort the nodes and stack the dofs of each step as rows
+    order  = np.argsort(nodes, kind='stable')
+    values = values[:, order, :].transpose(0, 2, 1).reshape(nsteps * ndofs, len(nodes))
+    if time_steps is None:
+        time_steps = times[:nsteps] if times is not None else np.arange(1, nsteps + 1) * (plan['dT'] or 1.0)
+    directions = [DOF_DIRECTIONS[dof] for dof in plan['dofs']]
+    index      = pd.MultiIndex.from_product([time_steps[:nsteps], directions], names=['Time Step', 'Dir'])
+    return pd.DataFrame(values, index=index, columns=[f'Node {nodes[i]}' for i in order])
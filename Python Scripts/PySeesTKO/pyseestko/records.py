@@ -0,0 +1,130 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from concurrent.futures import ProcessPoolExecutor
+from scipy.signal       import resample_poly
+from fractions          import Fraction
+from pathlib            import Path
+from typing             import Dict, List, Tuple
+
+import numpy as np
+# ==================================================================================
+# GROUND MOTION RECORDS
+# ==================================================================================
+# Preprocessing of external ground motion records (e.g. Valpo_1985_accelerations_[X/Y/Z].txt) into the input files
+# read by ModelSimulation. A record file has a header line with key:value pairs (Event, Station, dt, vs30, Dir)
+# and one acceleration value (in g) per line. The channels e, n and z of a record are loaded together, scaled,
+# resampled to the target dt with an anti-aliasing polyphase filter and written as acceleration_[e/n/z].txt and
+# time_series_[e/n/z].txt, or as the binary input_acceleration.npy read by h5drm.loadInputMotion.
+CHANNELS = ['e', 'n', 'z']
+
+def readRecordHeader(record_path:Path)->Dict[str, str]:
+    """
+    Returns the key:value pairs of the header line of a record file, e.g. {'Station': 'VALP10S', 'dt': '0.005', ...}.
+    """
+    with open(record_path, 'r') as file:
+        header = file.readline()
+    return dict(token.split(':', 1) for token in header.split() if ':' in token)
+
+def loadRecord(record_paths:Dict[str, Path], g:float = 9.81, dt:float|None = None)->Tuple[np.ndarray, float]:
+    """
+    Loads the channels of a record, with a bulk parse of each file, and scales them from g to m/s/s.
+
+    Parameters
+    ----------
+    record_paths : Dict[str, Path]
+        Record file of each channel, e.g. {'e': ..._X.txt, 'n': ..._Y.txt, 'z': ..._Z.txt}.
+    g : float, optional
+        Gravity acceleration used to scale the records. The default is 9.81.
+    dt : float, optional
+        Time step of the record. The default is the dt of the header of the first file.
+
+    Returns
+    -------
+    record : np.ndarray
+        Array of shape (time steps, channels), the channels are cut to the shortest one.
+    dt : float
+        Time step of the record.
+    """
+    paths    = list(record_paths.values())
+    dt       = float(readRecordHeader(paths[0])['dt']) if dt is None else dt
+    channels = [np.loadtxt(path, skiprows=1, ndmin=1) for path in paths]
+    length   = min(len(channel) for channel in channels)
+    return np.column_stack([channel[:length] for channel in channels]) * g, dt
+
+def resampleRecord(record:np.ndarray, dt:float, target_dt:float, max_denominator:int = 1000)->np.ndarray:
+    """
+    Resamples all the channels of a record (time steps in axis 0) from dt to target_dt at once,
+    with the anti-aliasing FIR filter of scipy.signal.resample_poly.
+    """
+    ratio = Fraction(dt / target_dt).limit_denominator(max_denominator)
+    if ratio == 1:
+        return record
+    return resample_poly(record, ratio.numerator, ratio.denominator, axis=0)
+
+def preprocessRecord(
+    record_paths : Dict[str, Path],
+    output_path  : Path,
+    target_dt    : float      = 0.03,
+    g            : float      = 9.81,
+    binary       : bool       = False,
+    dt           : float|None = None,
+    )->Path:
+    """
+    Loads, scales and resamples a record and writes its input files in output_path.
+
+    Parameters
+    ----------
+    record_paths : Dict[str, Path]
+        Record file of each channel e, n and z, in any order (the input files keep the e, n, z order).
+    output_path : Path
+        Folder of the input files, it's created if it doesn't exist.
+    target_dt : float, optional
+        Time step of the input files. The default is 0.03.
+    g : float, optional
+        Gravity acceleration used to scale the records. The default is 9.81.
+    binary : bool, optional
+        If True, writes input_acceleration.npy instead of the text files. The default is False.
+    dt : float, optional
+        Time step of the record. The default is the dt of the record header.
+
+    Returns
+    -------
+    output_path : Path
+        Folder of the input files.
+    """
+    # Check input, the channels are loaded in the e, n, z order read by h5drm.loadInputMotion
+    if sorted(record_paths) != sorted(CHANNELS):
+        raise ValueError(f'The record channels must be {CHANNELS}, current: {list(record_paths)}')
+    record_paths = {channel: record_paths[channel] for channel in CHANNELS}
+    record, dt   = loadRecord(record_paths, g, dt)
+    record       = resampleRecord(record, dt, target_dt)
+    output_path  = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+    if binary:
+        np.save(output_path / 'input_acceleration.npy', record)
+        return output_path
+    time_steps = np.arange(len(record)) * target_dt
+    for channel, values in zip(record_paths, record.T):
+        np.savetxt(output_path / f'acceleration_{channel}.txt', values, fmt='%.10g')
+        np.savetxt(output_path / f'time_series_{channel}.txt', time_steps, fmt='%.10g')
+    return output_path
+
+def preprocessRecords(
+    records      : Dict[str, Dict[str, Path]],
+    output_root  : Path,
+    target_dt    : float    = 0.03,
+    g            : float    = 9.81,
+    binary       : bool     = False,
+    workers      : int|None = None,
+    )->List[Path]:
+    """
+    Preprocesses many records in a pool of processes, each record is written in output_root/{record name}.
+    records maps each record name to the files of its channels, e.g. {'Valpo_1985': {'e': ..., 'n': ..., 'z': ...}}.
+    Returns the output folders in the order of records.
+    """
+    tasks = [(paths, Path(output_root) / name, target_dt, g, binary) for name, paths in records.items()]
+    if workers == 1:
+        return [preprocessRecord(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(preprocessRecord, *zip(*tasks)))
@@ -0,0 +1,193 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from pyseestko.queries    import getReplicaArray        #type: ignore
+from concurrent.futures   import Executor, ProcessPoolExecutor
+from typing               import List, Dict, Tuple
+
+import numpy  as np
+import pandas as pd
+# ==================================================================================
+# RESAMPLING FUNCTIONS
+# ==================================================================================
+# Bootstrap and permutation resampling of the replicas of each case, used to decide how many
+# replicas are needed for the mean of a metric to converge. The functions work on arrays whose
+# last axis is the replica axis, e.g. (case x story x replica). The samples are drawn in batches
+# with numpy fancy indexing, each batch has its own child of the seed SeedSequence so the results
+# only depend on the seed (not on the number of workers nor on the batch order). The functions take an
+# optional executor to share a single pool of processes between the calls.
+def bootstrapMeans(values:np.ndarray, n_replicas:int|None = None, n_samples:int = 2000, seed:int|np.random.SeedSequence|None = None,
+                   workers:int|None = 1, batch_size:int = 500, executor:Executor|None = None)->np.ndarray:
+    """
+    Draws n_samples bootstrap means of n_replicas replicas (with replacement) along the last axis.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Array with the replicas in the last axis.
+    n_replicas : int, optional
+        Number of replicas of each bootstrap sample. The default is all the replicas.
+    n_samples : int, optional
+        Number of bootstrap samples. The default is 2000.
+    seed : int | np.random.SeedSequence, optional
+        Seed of the samples. The default is None (not reproducible).
+    workers : int, optional
+        Number of processes, 1 runs in this process and None uses all the cores. The default is 1.
+    batch_size : int, optional
+        Number of samples drawn at once by each batch. The default is 500.
+    executor : Executor, optional
+        Pool where the batches are run instead of a new one, workers is ignored. The default is None.
+
+    Returns
+    -------
+    means : np.ndarray
+        Array with the shape of values where the last axis are the n_samples means.
+    """
+    values     = np.asarray(values, dtype=float)
+    n_replicas = values.shape[-1] if n_replicas is None else n_replicas
+    return _mapBatches(_bootstrapBatch, values, n_samples, seed, workers, batch_size, executor, n_replicas=n_replicas)
+
+def permutationCummMeans(values:np.ndarray, n_samples:int = 2000, seed:int|np.random.SeedSequence|None = None,
+                         workers:int|None = 1, batch_size:int = 500, executor:Executor|None = None)->np.ndarray:
+    """
+    Draws n_samples random orderings of the replicas and returns the cumulative mean of each ordering,
+    i.e. the cumulative mean curve of getReplicaCummStatistics for every permutation of the replicas.
+
+    Returns
+    -------
+    means : np.ndarray
+        Array of shape values.shape[:-1] + (n_samples, n_replicas), where [..., s, k] is the mean of the
+        first k+1 replicas of the permutation s.
+    """
+    values = np.asarray(values, dtype=float)
+    return _mapBatches(_permutationBatch, values, n_samples, seed, workers, batch_size, executor)
+
+def confidenceBands(samples:np.ndarray, confidence:float = 0.95, axis:int = -1)->Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Percentile confidence band of the samples along axis. Returns the lower bound, the median and the upper bound.
+    """
+    alpha = (1 - confidence) / 2
+    lower, median, upper = np.quantile(samples, [alpha, 0.5, 1 - alpha], axis=axis)
+    return lower, median, upper
+
+def bootstrapConvergenceBands(values:np.ndarray, n_samples:int = 2000, confidence:float = 0.95, seed:int|np.random.SeedSequence|None = None,
+                              workers:int|None = 1, batch_size:int = 500, executor:Executor|None = None)->Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Confidence band of the mean of k replicas for k = 1, ..., n_replicas, drawing the k replicas with replacement
+    from the available ones. Returns (lower, median, upper), each one with the shape of values where the last
+    axis is the number of replicas k. The batches of every k are run in the same pool.
+    """
+    values  = np.asarray(values, dtype=float)
+    seeds   = _seedSequence(seed).spawn(values.shape[-1])
+    tasks   = [_batchTasks(_bootstrapBatch, values, n_samples, seeds[k], batch_size, n_replicas=k + 1) for k in range(values.shape[-1])]
+    results = _runTasks([task for k_tasks in tasks for task in k_tasks], workers, executor)
+    bands, start = [], 0
+    for k_tasks in tasks:
+        bands.append(confidenceBands(np.concatenate(results[start:start + len(k_tasks)], axis=values.ndim - 1), confidence))
+        start += len(k_tasks)
+    return tuple(np.stack([band[i] for band in bands], axis=-1) for i in range(3))
+
+def permutationConvergenceBands(values:np.ndarray, n_samples:int = 2000, confidence:float = 0.95, seed:int|np.random.SeedSequence|None = None,
+                                workers:int|None = 1, batch_size:int = 500, executor:Executor|None = None)->Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Confidence band of the cumulative mean of k replicas for k = 1, ..., n_replicas over random orderings of the
+    replicas (without replacement). Returns (lower, median, upper), each one with the shape of values where the
+    last axis is the number of replicas k.
+    """
+    means = permutationCummMeans(values, n_samples, seed, workers, batch_size, executor)
+    return confidenceBands(means, confidence, axis=-2)
+
+def getReplicaConfidenceBands(metric:str, cases_df_lsts:Dict[str, List[pd.DataFrame]], method:str = 'bootstrap',
+                              n_samples:int = 2000, confidence:float = 0.95, seed:int|None = None,
+                              workers:int|None = None, batch_size:int = 500)->pd.DataFrame:
+    """
+    Confidence bands of the mean of a metric as a function of the number of replicas, for every case and story.
+    It's supposed to be used with the output of queries.groupReplicasByCase.
+
+    Parameters
+    ----------
+    metric : str
+        'drift', 'spectra' or 'base_shear'.
+    cases_df_lsts : Dict[str, List[pd.DataFrame]]
+        Replicas dataframes of each case, all the cases must have the same number of replicas.
+    method : str, optional
+        'bootstrap' (replicas drawn with replacement) or 'permutation' (random orderings of the replicas).
+        The default is 'bootstrap'.
+    n_samples : int, optional
+        Number of samples of each case. The default is 2000.
+    confidence : float, optional
+        Confidence level of the bands. The default is 0.95.
+    seed : int, optional
+        Seed of the samples, the same seed gives the same bands. The default is None.
+    workers : int, optional
+        Number of processes, None uses all the cores. A single pool is used for both directions. The default is None.
+
+    Returns
+    -------
+    df : pd.DataFrame
+        Dataframe indexed by (Case, Dir, Story) with (Band, rep_k) columns, where Band is lower, median or upper.
+    """
+    # Check input
+    if method not in ['bootstrap', 'permutation']:
+        raise ValueError(f'Method must be bootstrap or permutation, current: {method}')
+
+    # Compute the bands of both directions at once, each direction has its own seed
+    bands_func = bootstrapConvergenceBands if method == 'bootstrap' else permutationConvergenceBands
+    seeds      = np.random.SeedSequence(seed).spawn(2)
+    executor   = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None # one pool for every batch
+    dfs = []
+    try:
+        for direction, dir_seed in zip(['x', 'y'], seeds):
+            arrays  = [getReplicaArray(metric, df_lst, direction) for df_lst in cases_df_lsts.values()]
+            stories = arrays[0][0]
+            values  = np.stack([values for _, values in arrays], axis=0) # case x story x replica
+            bands   = bands_func(values, n_samples, confidence, dir_seed, workers, batch_size, executor)
+            nreps   = values.shape[-1]
+            index   = pd.MultiIndex.from_product([list(cases_df_lsts.keys()), [direction], stories], names=['Case', 'Dir', 'Story'])
+            columns = pd.MultiIndex.from_product([['lower', 'median', 'upper'], [f'rep_{k+1}' for k in range(nreps)]], names=['Band', 'Replicas'])
+            dfs.append(pd.DataFrame(np.concatenate([band.reshape(-1, nreps) for band in bands], axis=1), index=index, columns=columns))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return pd.concat(dfs, axis=0).sort_index(level=['Case', 'Dir'], sort_remaining=False)
+
+
+# ==================================================================================
+# BATCH FUNCTIONS
+# ==================================================================================
+def _mapBatches(batch_func, values:np.ndarray, n_samples:int, seed, workers:int|None, batch_size:int, executor:Executor|None = None,
+                **kwargs)->np.ndarray:
+    # Split the samples in batches, each one with its own seed, and run them in a pool of processes
+    results = _runTasks(_batchTasks(batch_func, values, n_samples, seed, batch_size, **kwargs), workers, executor)
+    return np.concatenate(results, axis=values.ndim - 1)
+
+def _batchTasks(batch_func, values:np.ndarray, n_samples:int, seed, batch_size:int, **kwargs)->list:
+    # (function, values, size, seed, kwargs) of each batch of the samples
+    sizes = [min(batch_size, n_samples - start) for start in range(0, n_samples, batch_size)]
+    seeds = _seedSequence(seed).spawn(len(sizes))
+    return [(batch_func, values, size, batch_seed, kwargs) for size, batch_seed in zip(sizes, seeds)]
+
+def _runTasks(tasks:list, workers:int|None, executor:Executor|None = None)->list:
+    # Run the batches in the executor, in this process (workers = 1) or in a new pool of processes
+    if executor is None and workers == 1:
+        return [batch_func(values, size, seed, **kwargs) for batch_func, values, size, seed, kwargs in tasks]
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return _runTasks(tasks, workers, executor)
+    futures = [executor.submit(batch_func, values, size, seed, **kwargs) for batch_func, values, size, seed, kwargs in tasks]
+    return [future.result() for future in futures]
+
+def _seedSequence(seed)->np.random.SeedSequence:
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+def _bootstrapBatch(values:np.ndarray, size:int, seed:np.random.SeedSequence, n_replicas:int)->np.ndarray:
+    rng     = np.random.default_rng(seed)
+    indices = rng.integers(0, values.shape[-1], size=(size, n_replicas))
+    return values[..., indices].mean(axis=-1)
+
+def _permutationBatch(values:np.ndarray, size:int, seed:np.random.SeedSequence)->np.ndarray:
+    rng      = np.random.default_rng(seed)
+    nreps    = values.shape[-1]
+    indices  = np.argsort(rng.random((size, nreps)), axis=1)
+    permuted = values[..., indices]
+    return np.cumsum(permuted, axis=-1) / np.arange(1, nreps + 1)
@@ -0,0 +1,273 @@
+# ==================================================================================
+# IMPORT LIBRARIES
+# ==================================================================================
+from concurrent.futures import ProcessPoolExecutor
+from pathlib            import Path
+from typing             import List, Dict
+
+import numpy as np
+import json
+import h5py
+# ==================================================================================
+# SYNTHETIC CAMPAIGN
+# ==================================================================================
+# Generator of synthetic campaign trees with the layout of the real OpenSees/STKO runs, so ModelInfo,
+# ModelSimulation and the rest of the pipeline can be run (and benchmarked) without a real analysis:
+# root/{FixBase|AbsBound|DRM}/{stories}f{subs}s/m{magnitude}/rup_bl_{iteration}/station_s{station}/
+# Every station has the PartitionsInfo files of the AlbertisRecorder plugin, the recorders of the 4 corner
+# nodes of every level (one file per node or, if compact, one multi-node recorder per partition), run.sh,
+# the log with the 'Elapsed:' line, the acceleration_[e/n/z].txt input files and a main.tcl placeholder.
+# The structure folder has a dummy .scd model.
+# The input is band limited noise with an envelope and the structure responds as its first mode in each
+# direction (frequency domain SDOF response), so the drifts, spectra and base shear have realistic shapes.
+# The records only depend on the seed and the case, not on the order nor the number of workers.
+SIM_TYPE_NAMES = {1: 'FixBase', 2: 'AbsBound', 3: 'DRM'}
+SCALES = {
+    'small'   : {'sim_types': [3],       'nsubs_lst': [2],    'stations': [1],                'iterations': [1],                'nsteps': 800},
+    'medium'  : {'sim_types': [1, 3],    'nsubs_lst': [2, 4], 'stations': [1, 2, 3],          'iterations': [1, 2],             'nsteps': 4000},
+    'campaign': {'sim_types': [1, 2, 3], 'nsubs_lst': [2, 4], 'stations': list(range(1, 10)), 'iterations': list(range(1, 11)), 'nsteps': 16000},
+}
+
+def timeSeries(nsteps:int, time_step:float = 0.0025)->np.ndarray:
+    """
+    Time of each recorded step, computed as ModelSimulation does with total_time = nsteps * time_step.
+    """
+    total_time = nsteps * time_step
+    return np.arange(time_step, total_time + time_step, time_step)
+
+def simulationKwargs(nsteps:int, time_step:float = 0.0025)->Dict[str, float]:
+    """
+    Keyword arguments of ModelSimulation that match the time steps of a synthetic station.
+    """
+    return {'time_step': time_step, 'total_time': nsteps * time_step}
+
+def stationPath(root_path:Path, sim_type:int, stories:int, subs:int, magnitude:float, iteration:int, station:int)->Path:
+    return Path(root_path) / SIM_TYPE_NAMES[sim_type] / f'{stories}f{subs}s' / f'm{magnitude}' / f'rup_bl_{iteration}' / f'station_s{station}'
+
+def generateStation(
+    station_path  : Path,
+    stories       : int   = 20,
+    subs          : int   = 2,
+    partitions    : int   = 4,
+    nsteps        : int   = 16000,
+    time_step     : float = 0.0025,
+    nnodes        : int   = 120000,
+    nelements     : int   = 110000,
+    story_height  : float = 2.6,
+    sub_height    : float = 3.0,
+    pga           : float = 3.0,
+    compact       : bool  = False,
+    manifest      : bool  = False,
+    h5drm         : bool  = False,
+    scd_size      : int   = 65536,
+    seed          : int|None = None,
+    input_seed    : int|None = None,
+    )->Path:
+    """
+    Writes a synthetic station folder.
+
+    Parameters
+    ----------
+    station_path : Path
+        Station folder. The .scd model is written in the structure folder (main_path.parents[3]), as ModelSimulation finds it.
+    stories, subs : int, optional
+        Number of stories and subterranean levels. The defaults are 20 and 2.
+    partitions : int, optional
+        Number of partitions, the levels are split in contiguous blocks. The default is 4.
+    nsteps : int, optional
+        Number of recorded time steps (at most 16000, as the readers). The default is 16000.
+    time_step : float, optional
+        Time step of the analysis. The default is 0.0025.
+    nnodes, nelements : int, optional
+        Global number of nodes and elements of the model info. The defaults are 120000 and 110000.
+    story_height, sub_height : float, optional
+        Height of the stories and of the subterranean levels. The defaults are 2.6 and 3.0.
+    pga : float, optional
+        PGA of the east channel of the input, in m/s/s. The default is 3.0.
+    compact : bool, optional
+        If True, the responses are written as multi-node recorders with their recording plan. The default is False.
+    manifest : bool, optional
+        If True, the PartitionsInfo/manifest.json of the plugin is written too. The default is False.
+    h5drm : bool, optional
+        If True, the input is also written as an input.h5drm file. The default is False.
+    scd_size : int, optional
+        Size in bytes of the dummy .scd model. The default is 65536.
+    seed : int, optional
+        Seed of the structural response. The default is None (not reproducible).
+    input_seed : int, optional
+        Seed of the input motion, the same input_seed gives the same input. The default is seed.
+
+    Returns
+    -------
+    main_path : Path
+        Path of the main.tcl placeholder, to be given to ModelSimulation (with simulationKwargs).
+    """
+    # Init params
+    station_path = Path(station_path)
+    time         = timeSeries(nsteps, time_step)
+    nsteps       = len(time)
+    partitions_path = station_path / 'PartitionsInfo'
+    for folder in ['accel', 'disp', 'coords', 'info']:
+        (partitions_path / folder).mkdir(parents=True, exist_ok=True)
+
+    # Geometry: the 4 corner nodes of every level, from the deepest subterranean level to the roof
+    levels  = [-sub_height * i for i in range(subs, 0, -1)] + [story_height * i for i in range(stories + 1)]
+    corners = [(0.0, 0.0), (0.0, 25.0), (30.0, 0.0), (30.0, 25.0)]
+    nodes   = {10001 + 4 * level + corner: (x, y, round(z, 1)) for level, z in enumerate(levels) for corner, (x, y) in enumerate(corners)}
+    stories_info = {str(node): {'level': (node - 10001) // 4, 'z': coords[2], 'corner': (node - 10001) % 4} for node, coords in nodes.items()}
+    buckets = {pid: [int(node) for level in block for node in range(10001 + 4 * level, 10005 + 4 * level)]
+               for pid, block in enumerate(np.array_split(np.arange(len(levels)), partitions))}
+
+    # PartitionsInfo files of the plugin
+    with open(partitions_path / 'info' / 'model_info.csv', 'w') as file:
+        file.write(f'Number of nodes = {nnodes}\n')
+        file.write(f'Number of elements = {nelements}\n')
+        file.write(f'Number of partitions = {partitions}\n')
+    for pid, partition_nodes in buckets.items():
+        with open(partitions_path / 'coords' / f'coords_{pid}.csv', 'w') as file:
+            file.write('Node ID, X, Y, Z \n')
+            file.writelines(f'{node} {nodes[node][0]} {nodes[node][1]} {nodes[node][2]} \n' for node in partition_nodes)
+        for response in ['accel', 'disp']:
+            with open(partitions_path / response / f'{response}_nodes_part-{pid}.csv', 'w') as file:
+                file.writelines(f'{node}\n' for node in partition_nodes)
+    if manifest:
+        with open(partitions_path / 'manifest.json', 'w') as file:
+            json.dump({'counts'   : {'nodes': nnodes, 'elements': nelements, 'partitions': partitions},
+                       'responses': {response: {str(pid): partition_nodes for pid, partition_nodes in buckets.items()} for response in ['accel', 'disp']},
+                       'coords'   : {str(node): list(coords) for node, coords in nodes.items()},
+                       'stories'  : stories_info}, file)
+
+    # Input motion and structural response
+    input_seed = seed if input_seed is None else input_seed
+    ground     = _groundMotion(np.random.default_rng(input_seed), nsteps, time_step, pga)
+    accel, displ = _structureResponse(np.random.default_rng(seed), ground, time_step, levels, stories, subs)
+    for channel, values in zip(['e', 'n', 'z'], ground.T):
+        np.savetxt(station_path / f'acceleration_{channel}.txt', values, fmt='%.6e')
+    if h5drm:
+        with h5py.File(station_path / 'input.h5drm', 'w') as file:
+            file.create_dataset('DRM_QA_Data/acceleration', data=ground.T)
+            file.create_dataset('DRM_QA_Data/velocity',     data=np.cumsum(ground, axis=0).T * time_step)
+
+    # Recorders, one file per node or one multi-node recorder per partition
+    for response, folder, name, values in [('accel', 'Accelerations', 'accel', accel), ('disp', 'Displacements', 'displ', displ)]:
+        (station_path / folder).mkdir(exist_ok=True)
+        recorders = []
+        for pid, partition_nodes in buckets.items():
+            columns = [node - 10001 for node in partition_nodes]
+            if compact:
+                file_name = f'{folder}/{name}-part_{pid}.out'
+                np.savetxt(station_path / file_name, values[:, columns, :].reshape(nsteps, -1), fmt='%.6e')
+                recorders.append({'partition': pid, 'file': file_name, 'nodes': partition_nodes})
+                continue
+            for node, column in zip(partition_nodes, columns):
+                np.savetxt(station_path / folder / f'{name}-node_{node}-part_{pid}.out', values[:, column, :], fmt='%.6e')
+        if compact:
+            (partitions_path / 'plan').mkdir(exist_ok=True)
+            with open(partitions_path / 'plan' / f'{response}.json', 'w') as file:
+                json.dump({'response': response, 'file_type': '-file', 'dofs': [1, 2, 3], 'time': False,
+                           'dT': time_step, 'recorders': recorders, 'stories': stories_info}, file, indent=1)
+
+    # Job files: run.sh, log, main script and the model of the structure
+    jobname = f'synthetic_{station_path.name}_{stories}f_{subs}s'
+    logname = f'Test_{jobname}.log'
+    with open(station_path / 'run.sh', 'w') as file:
+        file.write(f"#!/bin/bash\n"
+                   f"#SBATCH --job-name={jobname}    # Job name\n"
+                   f"#SBATCH --nodes=1\n"
+                   f"#SBATCH --ntasks-per-node={partitions}\n"
+                   f"#SBATCH --output={logname}   # Standard output and error log\n"
+                   f"mpirun openseesmp main.tcl\n")
+    with open(station_path / logname, 'w') as file:
+        file.write(f'Synthetic analysis of {nsteps} steps\nElapsed: {int(nsteps * time_step * 60)} seconds.\nCode finished succesfully.\n')
+    main_path = station_path / 'main.tcl'
+    main_path.write_text('# Synthetic analysis, see pyseestko.synthetic\n')
+    structure_path = main_path.parents[3] if len(main_path.parents) > 4 else station_path
+    scd_path = structure_path / f'{structure_path.name}.scd'
+    if not scd_path.exists():
+        scd_path.write_bytes(b'\0' * scd_size)
+    return main_path
+
+def _groundMotion(rng:np.random.Generator, nsteps:int, time_step:float, pga:float)->np.ndarray:
+    # Band limited (0.2 - 12 Hz) noise with an envelope that peaks at 20% of the record, channels e, n and z
+    noise = rng.standard_normal((nsteps, 3))
+    freqs = np.fft.rfftfreq(nsteps, time_step)
+    band  = ((freqs > 0.2) & (freqs < 12.0))[:, None]
+    noise = np.fft.irfft(np.fft.rfft(noise, axis=0) * band, n=nsteps, axis=0)
+    t     = np.arange(1, nsteps + 1) * time_step / (0.2 * nsteps * time_step)
+    noise = noise * (t**2 * np.exp(2 * (1 - t)))[:, None]
+    return noise / np.abs(noise).max(axis=0) * pga * np.array([1.0, 0.9, 0.6])
+
+def _structureResponse(rng:np.random.Generator, ground:np.ndarray, time_step:float, levels:List[float],
+                       stories:int, subs:int, damping:float = 0.05)->tuple:
+    # First mode response of each direction in the frequency domain, zero padded to avoid the wrap around
+    nsteps  = len(ground)
+    periods = np.array([0.06, 0.055, 0.01]) * stories * rng.uniform(0.95, 1.05, 3)
+    omega   = 2 * np.pi * np.fft.rfftfreq(2 * nsteps, time_step)[:, None]
+    omega_n = 2 * np.pi / periods
+    H       = -1 / (omega_n**2 - omega**2 + 2j * damping * omega_n * omega)
+    spectrum = np.fft.rfft(ground, n=2 * nsteps, axis=0)
+    displ    = np.fft.irfft(H * spectrum, axis=0)[:nsteps]
+    accel    = np.fft.irfft(-omega**2 * H * spectrum, axis=0)[:nsteps]
+
+    # Mode shape of each level (the subterranean levels move with the ground) and a small torsion: the x response
+    # of each corner depends on its y side and the y response on its x side
+    shape   = np.sin(np.pi / 2 * np.clip(np.repeat(levels, 4), 0, None) / levels[-1])
+    torsion = np.ones((len(levels) * 4, 3))
+    torsion[:, 0] += 0.05 * np.tile([-1, 1, -1, 1], len(levels))
+    torsion[:, 1] += 0.05 * np.tile([-1, -1, 1, 1], len(levels))
+    factors = shape[:, None] * torsion * 1.4 # (node x dof), 1.4 is the participation factor of the first mode
+    return accel[:, None, :] * factors, displ[:, None, :] * factors # (step x node x dof)
+
+def _generateCase(root_path:Path, case:tuple, params:dict, seed:int)->Path:
+    sim_type, nsubs, station, iteration = case
+    path = stationPath(root_path, sim_type, params['stories'], nsubs, params['magnitude'], iteration, station)
+    kwargs = {key: value for key, value in params.items() if key not in ['stories', 'magnitude']}
+    return generateStation(path, params['stories'], nsubs, **kwargs,
+                           seed       = np.random.SeedSequence([seed, sim_type, nsubs, station, iteration]).generate_state(1)[0],
+                           input_seed = np.random.SeedSequence([seed, station, iteration]).generate_state(1)[0])
+
+def generateCampaign(
+    root_path  : Path,
+    scale      : str       = 'small',
+    workers    : int|None  = 1,
+    seed       : int       = 0,
+    **kwargs,
+    )->List[Path]:
+    """
+    Writes a synthetic campaign tree at the small, medium or campaign scale (see SCALES).
+
+    Parameters
+    ----------
+    root_path : Path
+        Root folder of the campaign.
+    scale : str, optional
+        'small', 'medium' or 'campaign'. The default is 'small'.
+    workers : int, optional
+        Number of processes, 1 runs in this process and None uses all the cores. The default is 1.
+    seed : int, optional
+        Seed of the campaign. The stations with the same station and iteration share the input motion.
+        The default is 0.
+    kwargs : dict, optional
+        Overrides of the scale (sim_types, nsubs_lst, stations, iterations, nsteps) and parameters of
+        generateStation (stories, partitions, compact, manifest, ...) plus the magnitude (default 6.7).
+
+    Returns
+    -------
+    main_paths : List[Path]
+        Main paths of the stations, in the order sim_type, nsubs, station, iteration.
+    """
+    # Check input
+    if scale not in SCALES:
+        raise ValueError(f'Scale must be one of {list(SCALES)}, current: {scale}')
+
+    # Init params
+    params = {**SCALES[scale], 'stories': 20, 'magnitude': 6.7, **kwargs}
+    sim_types, nsubs_lst, stations, iterations = [params.pop(key) for key in ['sim_types', 'nsubs_lst', 'stations', 'iterations']]
+    cases  = [(sim_type, nsubs, station, iteration) for sim_type in sim_types for nsubs in nsubs_lst
+                                                    for station in stations for iteration in iterations]
+
+    # Generate the stations
+    if workers == 1:
+        return [_generateCase(root_path, case, params, seed) for case in cases]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_generateCase, [root_path] * len(cases), cases, [params] * len(cases), [seed] * len(cases)))
@@ -620,6 +620,40 @@ def pwl(vector_a, w, chi,step=0.04):
         up_t[i + 1] = A1 * ui + B1 * vi + C1 * pi + D1 * pi1
     return u_t, up_t
 
+def computeStoriesSpectra(accel_df:pd.DataFrame, story_nodes_df:pd.DataFrame, direction:str, stories_lst:List[int],
+                          nu:float=0.05, T:np.ndarray|None=None)->pd.DataFrame:
+    """
+    Compute the pseudo acceleration spectrum of the mean acceleration of each story in stories_lst.
+    The result is a dataframe with the periods as index and one 'Story {story} {direction}' column per story.
+    """
+    T = np.linspace(0.003, 2, 1000) if T is None else T
+    w = 2 * np.pi / np.array(T)
+    spa_lst = []
+    for story in stories_lst:
+        df = accel_df[story_nodes_df.loc[story].index].copy()
+        df.loc[:,'Average'] = df.mean(axis=1) # We use the acceleration in the center of mass
+        adir = df.xs(direction, level='Dir')['Average'][::16]
+        Spe = [max(max(u_x), abs(min(u_x))) * wi**2 for wi in w for u_x, _ in [pwl(adir.values, wi, nu)]]
+        spa_lst.append(np.array(Spe))
+    return pd.DataFrame({f'Story {story} {direction}': spa for story, spa in zip(stories_lst, spa_lst)}, index=T)
+
+def cumulativeStatistics(values:np.ndarray, axis:int=1, ddof:int=1)->tuple[np.ndarray, np.ndarray]:
+    """
+    Running mean and standard deviation along the replica axis of an array, e.g. (story x replica x case).
+    The i-th slice along axis is the statistic of the first i+1 replicas, so the whole convergence
+    study is computed in one pass: the mean with a cumulative sum and the std with the Welford recursion
+    M2_k = M2_k-1 + (x_k - mean_k-1) * (x_k - mean_k), whose increments only depend on the running means.
+    The std of less than ddof+1 replicas is NaN, as in pandas.
+    """
+    x      = np.moveaxis(np.asarray(values, dtype=float), axis, 0)
+    counts = np.arange(1, x.shape[0] + 1, dtype=float).reshape((-1,) + (1,) * (x.ndim - 1))
+    mean   = np.cumsum(x, axis=0) / counts
+    m2     = np.zeros_like(x)
+    np.cumsum((x[1:] - mean[:-1]) * (x[1:] - mean[1:]), axis=0, out=m2[1:])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(np.where(counts > ddof, m2 / (counts - ddof), np.nan))
+    return np.moveaxis(mean, 0, axis), np.moveaxis(std, 0, axis)
+
 def perfomDriftAnova(df, sim_case:str, num_subs:str, stats:List[str], zone:str, direction:str):
     filt_df  = df[(df['Sim_Type'] == sim_case) & (df['Nsubs'] == num_subs) & (df['Station'].isin(stats))]
     model_lm = ols('Mean_Drift ~ C(Iteration)', data=filt_df).fit()
@@ -16,6 +16,9 @@ setup(
     'mysql-connector-python>=8.0.0', 
     'matplotlib>=3.1.0',
     'xlsxwriter>=1.2.8',
+    'h5py>=3.0.0',
+    'scipy>=1.7.0',
+    'pyarrow>=10.0.0',
                     ],
     classifiers=[
         # Clasificadores que describen el estado y la audiencia de tu paquete
@@ -29,4 +32,5 @@ setup(
     ],
     python_requires='>=3.11',  
     include_package_data=True, 
+    package_data={'pyseestko': ['mass_models.json']},
 )
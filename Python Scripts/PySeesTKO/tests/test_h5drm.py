@@ -0,0 +1,15 @@
+from pyseestko.synthetic import generateStation #type: ignore
+from pyseestko.h5drm     import loadInputMotion #type: ignore
+
+import numpy as np
+
+
+def test_sidecar_keeps_every_step(tmp_path):
+    station_path = generateStation(tmp_path / 'station_s1', stories=2, subs=1, nsteps=800, h5drm=True, seed=0).parent
+
+    short  = loadInputMotion(station_path, nsteps=100)
+    motion = loadInputMotion(station_path)
+
+    assert short.shape  == (100, 3)
+    assert motion.shape == (800, 3)
+    np.testing.assert_allclose(motion[:100], short)
@@ -0,0 +1,16 @@
+from pyseestko.model_info import ModelInfo       #type: ignore
+from pyseestko.synthetic  import generateStation #type: ignore
+
+
+def test_manifest_stories_match_the_legacy_files(tmp_path):
+    infos = []
+    for manifest in [False, True]:
+        main_path = generateStation(tmp_path / str(manifest) / 'station_s1', stories=5, subs=2, nsteps=100, manifest=manifest, seed=0)
+        infos.append(ModelInfo(main_path, verbose=False))
+    legacy, info = infos
+
+    assert info.manifest is not None
+    assert (info.stories, info.subs)     == (legacy.stories, legacy.subs) == (5, 2)
+    assert info.drift_nodes              == legacy.drift_nodes
+    assert info.stories_nodes            == legacy.stories_nodes
+    assert info.heights                  == legacy.heights
@@ -0,0 +1,32 @@
+from pyseestko.parquet_store import ParquetResultsStore #type: ignore
+
+import numpy as np
+
+
+def caseValues(magnitude:str)->tuple:
+    # (sim_type, linearity, magnitude, rupture_type, iteration, location, stories, subs)
+    return (3, 1, magnitude, 'Bilateral', 1, 'Near field North', 20, 2)
+
+def driftData(scale:float)->tuple:
+    drifts = list(np.linspace(0.001, 0.002, 20) * scale)
+    return drifts, drifts, drifts, drifts
+
+def test_cases_with_different_magnitudes_are_kept(tmp_path):
+    store = ParquetResultsStore(tmp_path)
+    store.write('drift', caseValues('6.7 Mw'), driftData(1.0))
+    store.write('drift', caseValues('7.0 Mw'), driftData(2.0))
+
+    assert store.hasCase('drift', caseValues('6.7 Mw'))
+    assert store.hasCase('drift', caseValues('7.0 Mw'))
+    assert not store.hasCase('drift', caseValues('6.5 Mw'))
+    np.testing.assert_allclose(store.fetch('drift', caseValues('6.7 Mw'))[0], driftData(1.0)[0])
+    np.testing.assert_allclose(store.fetch('drift', caseValues('7.0 Mw'))[0], driftData(2.0)[0])
+
+def test_rewriting_a_case_only_replaces_that_case(tmp_path):
+    store = ParquetResultsStore(tmp_path)
+    store.write('drift', caseValues('6.7 Mw'), driftData(1.0))
+    store.write('drift', caseValues('7.0 Mw'), driftData(2.0))
+    store.write('drift', caseValues('7.0 Mw'), driftData(3.0))
+
+    np.testing.assert_allclose(store.fetch('drift', caseValues('6.7 Mw'))[0], driftData(1.0)[0])
+    np.testing.assert_allclose(store.fetch('drift', caseValues('7.0 Mw'))[0], driftData(3.0)[0])
@@ -0,0 +1,21 @@
+from pyseestko.recorder_io import readRecordingPlan, readCompactRecorders, storyCornerNodes #type: ignore
+from pyseestko.synthetic   import generateStation                                          #type: ignore
+
+
+def test_story_corner_nodes_skip_the_other_nodes():
+    stories = {'1': {'level': 0, 'z': -3.0, 'corner': 1},
+               '2': {'level': 0, 'z': -3.0, 'corner': 0},
+               '3': {'level': 0, 'z': -3.0, 'corner': None},
+               '4': {'level': 1, 'z':  0.0, 'corner': 0},
+               '5': {'level': 1, 'z':  0.0, 'corner': None}}
+    assert storyCornerNodes(stories) == {-1: [2, 1], 0: [4]}
+
+def test_compact_recorders_read_only_the_given_nodes(tmp_path):
+    station_path = generateStation(tmp_path / 'station_s1', stories=2, subs=1, nsteps=50, compact=True, seed=0).parent
+    plan  = readRecordingPlan(station_path / 'PartitionsInfo', 'accel')
+    full  = readCompactRecorders(station_path, plan)
+    nodes = [10002, 10007, 10016]
+    part  = readCompactRecorders(station_path, plan, nodes=nodes)
+
+    assert list(part.columns) == [f'Node {node}' for node in nodes]
+    assert part.equals(full[part.columns])
@@ -0,0 +1,30 @@
+#%% ================================================================================
+# IMPORT MODULES
+# ==================================================================================
+from pathlib          import Path
+from pyseestko.h5drm  import extractCampaignInputs # type: ignore
+
+#%% ================================================================================
+# DEFINE INIT PARAMETERS
+# ==================================================================================
+# Define the root path of the campaign (sim_type/structure/magnitude/rup_bl_N/station_sK/input.h5drm)
+# and the store with the input motions of every station. Then pass the store to ModelSimulation
+# with the 'input_store' parameter in main_sql.py.
+root_path   = Path(__file__).parent
+store_path  = root_path / 'campaign_inputs.h5'
+input_types = ['acceleration', 'velocity']
+nsteps      = 16000
+workers     = None  # None uses all the cores
+
+#%% ================================================================================
+# EXTRACT ALL THE INPUTS
+# ==================================================================================
+if __name__ == '__main__':
+    keys = extractCampaignInputs(
+        root_path   = root_path,
+        store_path  = store_path,
+        input_types = input_types,
+        nsteps      = nsteps,
+        workers     = workers)
+    print(f'{len(keys)} stations extracted in {store_path}')
+# %%
@@ -38,6 +38,9 @@ parameters = {
 'gspecs_comments'   : f'Global: {sim_keys}'                     , # This value is the global specs comments
 'box_comments'      : box_comments                              , # This value is the soil box comments
 'windows_os'        : True                                      , # This value is True if the OS is Windows, False if Linux
+'db_backend'        : 'mysql'                                   , # Database backend, 'sqlite' uses the database param as the path of a local SQLite file
+'profile'           : False                                     , # True measures the time, memory and I/O of each stage (Model.profiler.summary())
+'save_profile'      : False                                     , # True saves the profile of the stages as profile.json next to the results
 'sim_type'          : st                                        , # This value is the simulation type, 1=Fix Base, 2=Absorbing Boundaries, 3=DRM
 'linearity'         : 1                                         , # This value is the linearity of the analysis, 1=Linear, 2=Nonlinear
 'jump'              : 8                                         , # This value is the jumper between rows in the series, for example if a range has 10 values and jump=2, then the list will be [0,2,4,6,8]
@@ -3,12 +3,10 @@
 from pyseestko            import queries as query             #type: ignore
 from pathlib              import Path
 from pyseestko.utilities  import getMappings, load_module     #type: ignore
-from pyseestko.utilities  import getDriftResultsDF            #type: ignore
-from pyseestko.utilities  import getSpectraResultsDF          #type: ignore
-from pyseestko.utilities  import getSBaseResultsDF            #type: ignore
 from pyseestko.utilities  import getGroupedManovaDFs            #type: ignore
-from pyseestko.plotting   import analyze_manova_assumptions   #type: ignore
-from pyseestko.plotting   import analyze_anova_assumptions    #type: ignore
+from pyseestko.plotting   import plotAssumptionTests          #type: ignore
+from pyseestko.anova      import tidyFromResultsDFs           #type: ignore
+from pyseestko.anova      import runAssumptionTests           #type: ignore
 
 # Temp imports
 import pandas as pd
@@ -20,6 +18,7 @@ user     = 'omarson'
 password = 'Mackbar2112!'
 host     = 'localhost'
 database = 'stkodatabase'
+backend  = 'mysql' # 'sqlite' to use a local SQLite file as the database (database is its path)
 
 # Debugging
 path_to_queries = Path("C:/Users/oioya/OneDrive - miuandes.cl/Escritorio/Git-Updated/Thesis-Project-Simulation-Data-Analysis/Python Scripts/PySeesTKO/pyseestko/queries.py")
@@ -39,93 +38,117 @@ stations   = [i for i in range(1,10)]  # Can be: {0,1,2,3,4,5,6,7,8,9}
 windows    = True  # True if the OS is Windows, False if Linux
 save_csvs  = False # True if you want to save the results, False if not
 show_plots = False # True if you want to show the plots, False if not
+cache_path = project_path.parent / '.query_cache' # Local cache of the queried results, None to always query the database
+render     = True  # False to only query the data, the plots can be made later with query.renderGridPlots
+render_workers = 0 # > 0 to render each grid figure in a pool of processes after the query
+usetex     = True  # False to render fast drafts with mathtext instead of LaTeX
+test_workers = None # Processes of the assumption tests, None uses all the cores
 mag_map, loc_map, rup_map = getMappings()
 
 
 #%% =========================================== QUERY DATA ===========================================
+# The cells run under the __main__ guard: the pools of processes of the render and of the assumption
+# tests import this script again in each worker on Windows.
 # Get the drifts, spectra and base shear dataframes for the selected simulation types, nsubs,
 # iterations and stations
 # -------------------------------------- Execyte the main query --------------------------------------
-drifts_df_dict, spectra_df_dict, base_shear_df_dict = query.executeMainQuery(
-    # Main params
-    sim_types    = sim_types,
-    nsubs_lst    = nsubs_lst,
-    iterations   = iterations,
-    stations     = stations,
-    mag_map      = mag_map,
-    loc_map      = loc_map,
-    rup_map      = rup_map,
-    # DataBase params
-    user         = user,
-    password     = password,
-    host         = host,
-    database     = database,
-    # Save params
-    save_drift   = False,
-    save_spectra = True,
-    save_b_shear = False,
-    save_results = save_csvs,
-    # Plot params
-    show_plots   = show_plots,
-    xlim_sup     = 0.003, #0.025 NOTE: see how to put it as a tuple for x,y
-    grid         = True,
-    fig_size     = (8.25, 11),
-    dpi          = 150,
-    file_type    = 'pdf',
-    # Extra params
-    project_path = project_path,
-    verbose      = False,
-    )
-
-winsound.Beep(1000, 500)
+if __name__ == '__main__':
+    drifts_df_dict, spectra_df_dict, base_shear_df_dict = query.executeMainQuery(
+        # Main params
+        sim_types    = sim_types,
+        nsubs_lst    = nsubs_lst,
+        iterations   = iterations,
+        stations     = stations,
+        mag_map      = mag_map,
+        loc_map      = loc_map,
+        rup_map      = rup_map,
+        # DataBase params
+        user         = user,
+        password     = password,
+        host         = host,
+        database     = database,
+        backend      = backend,
+        # Save params
+        save_drift   = False,
+        save_spectra = True,
+        save_b_shear = False,
+        save_results = save_csvs,
+        # Plot params
+        show_plots   = show_plots,
+        xlim_sup     = 0.003, #0.025 NOTE: see how to put it as a tuple for x,y
+        grid         = True,
+        fig_size     = (8.25, 11),
+        dpi          = 150,
+        file_type    = 'pdf',
+        # Extra params
+        project_path = project_path,
+        cache_path   = cache_path,
+        render       = render,
+        render_workers = render_workers,
+        usetex       = usetex,
+        verbose      = False,
+        )
+
+    winsound.Beep(1000, 500)
 
 
 # %%
 # ----------------------------------------------------------------------------------------------------
 # --------------------------------------- LOAD DATA FOR ANOVA ----------------------------------------
 # ----------------------------------------------------------------------------------------------------
-# --------------------------------------- DRIFT ----------------------------------------
-# Compute Drift Results
-if all(isinstance(value, pd.DataFrame) for value in drifts_df_dict.values()):
-    drift_df_x, drift_df_y = getDriftResultsDF(drifts_df_dict)
-else:
-    drift_df_x = pd.read_csv(project_path / 'ANOVA Output' / 'drift_per_story_X_df.csv', index_col=0)
-    drift_df_y = pd.read_csv(project_path / 'ANOVA Output' / 'drift_per_story_Y_df.csv', index_col=0)
+# Long format table with all the queried results, the wide dataframes are views of it
+if __name__ == '__main__':
+    results_df = query.getResultsTable(drifts_df_dict, spectra_df_dict, base_shear_df_dict,
+                                       sim_types, nsubs_lst, stations, iterations)
+    queried    = set(results_df['Metric'].unique())
+
+    # --------------------------------------- DRIFT ----------------------------------------
+    # Compute Drift Results
+    if 'drift' in queried:
+        drift_df_x = query.pivotResultsTable(results_df, 'drift', 'x')
+        drift_df_y = query.pivotResultsTable(results_df, 'drift', 'y')
+    else:
+        drift_df_x = pd.read_csv(project_path / 'ANOVA Output' / 'drift_per_story_X_df.csv', index_col=0)
+        drift_df_y = pd.read_csv(project_path / 'ANOVA Output' / 'drift_per_story_Y_df.csv', index_col=0)
 
 #%% Compute Spectra Results
 # --------------------------------------- SPECTRUM ----------------------------------------
 # We will have the acceleration at the period equal to mode 3 = 0.83s
-if all(isinstance(value, pd.DataFrame) for value in spectra_df_dict.values()):
-    spectra_df_x, spectra_df_y = getSpectraResultsDF(spectra_df_dict)
-
-else:
-    spectra_df_x = pd.read_csv(project_path / 'ANOVA Output' / 'spectra_per_story_X_df.csv', index_col=0)
-    spectra_df_y = pd.read_csv(project_path / 'ANOVA Output' / 'spectra_per_story_Y_df.csv', index_col=0)
+if __name__ == '__main__':
+    if 'spectra' in queried:
+        spectra_df_x = query.pivotResultsTable(results_df, 'spectra', 'x')
+        spectra_df_y = query.pivotResultsTable(results_df, 'spectra', 'y')
+    else:
+        spectra_df_x = pd.read_csv(project_path / 'ANOVA Output' / 'spectra_per_story_X_df.csv', index_col=0)
+        spectra_df_y = pd.read_csv(project_path / 'ANOVA Output' / 'spectra_per_story_Y_df.csv', index_col=0)
 
 #%% Compute Base Shear Results
 # --------------------------------------- BASE SHEAR ----------------------------------------
-if all(isinstance(value, pd.DataFrame) for value in base_shear_df_dict.values()):
-    base_shear_df_x, base_shear_df_y = getSBaseResultsDF(base_shear_df_dict)
-else:
-    base_shear_df_x = pd.read_csv(project_path / 'ANOVA Output' / 'max_base_shear_X_df.csv', index_col=0)
-    base_shear_df_y = pd.read_csv(project_path / 'ANOVA Output' / 'max_base_shear_Y_df.csv', index_col=0)
-
-
-# %% ========================================== ANOVA ==========================================
-analyze_anova_assumptions(base_shear_df_x, ['MaxShearX'], project_path=project_path)
-analyze_anova_assumptions(base_shear_df_y, ['MaxShearY'], project_path=project_path)
-
-
-# %% ========================================== MANOVA ==========================================
-# perform MANOVA
-drift_covar_x_df = analyze_manova_assumptions(drift_df_x, ['s1','s5','s10','s15','s20'], ['Sim_Type', 'Nsubs', 'Station'],
-                                      project_path=project_path, drift=True, xdir=True)
-drift_covar_y_df = analyze_manova_assumptions(drift_df_y, ['s1','s5','s10','s15','s20'], ['Sim_Type', 'Nsubs', 'Station'],
-                                        project_path=project_path, drift=True, xdir=False)
-spectra_covar_x_df = analyze_manova_assumptions(spectra_df_x, ['s1','s5','s10','s15','s20'], ['Sim_Type', 'Nsubs', 'Station'],
-                                        project_path=project_path, drift=False, xdir=True)
-spectra_covar_y_df = analyze_manova_assumptions(spectra_df_y, ['s1','s5','s10','s15','s20'], ['Sim_Type', 'Nsubs', 'Station'],
-                                        project_path=project_path, drift=False, xdir=False)
+if __name__ == '__main__':
+    if 'base_shear' in queried:
+        base_shear_df_x = query.pivotResultsTable(results_df, 'base_shear', 'x')
+        base_shear_df_y = query.pivotResultsTable(results_df, 'base_shear', 'y')
+    else:
+        base_shear_df_x = pd.read_csv(project_path / 'ANOVA Output' / 'max_base_shear_X_df.csv', index_col=0)
+        base_shear_df_y = pd.read_csv(project_path / 'ANOVA Output' / 'max_base_shear_Y_df.csv', index_col=0)
+
+
+# %% ==================================== ANOVA/MANOVA ASSUMPTIONS ====================================
+# Run the assumptions tests of all the metrics, directions and stories at once
+if __name__ == '__main__':
+    if queried == {'drift', 'spectra', 'base_shear'}:
+        tidy_df = results_df
+    else:
+        tidy_df = tidyFromResultsDFs((drift_df_x, drift_df_y), (spectra_df_x, spectra_df_y), (base_shear_df_x, base_shear_df_y))
+    assumptions_df,       transformed_df       = runAssumptionTests(tidy_df, workers=test_workers)                 # MANOVA (replicas)
+    anova_assumptions_df, anova_transformed_df = runAssumptionTests(tidy_df, aggregate=True, workers=test_workers) # ANOVA (mean of the replicas)
+    print(assumptions_df)
+    print(anova_assumptions_df)
+
+    # Plot the normality figures (optional)
+    plot_assumptions = True
+    if plot_assumptions:
+        plotAssumptionTests(transformed_df, project_path / 'ANOVA Output', usetex=usetex)
 
 
 
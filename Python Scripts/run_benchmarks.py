@@ -0,0 +1,40 @@
+#%% ================================================================================
+# IMPORT MODULES
+# ==================================================================================
+from pathlib              import Path
+from pyseestko.benchmarks import runBenchmarks, loadHistory, compareRuns # type: ignore
+
+#%% ================================================================================
+# DEFINE INIT PARAMETERS
+# ==================================================================================
+# The benchmarks run on a synthetic station (see pyseestko/synthetic.py), the scale defines its steps and
+# the case grid of the reshape and plot stages. Every run is appended to the history file, so a change can
+# be compared with the previous commit. The upload and query stages use a new local SQLite database unless
+# a database (and its backend) is given.
+root_path    = Path(__file__).parent
+work_path    = root_path / 'benchmarks'
+history_path = root_path / 'benchmarks_history.json'
+scale        = 'small'  # 'small', 'medium' or 'campaign'
+stages       = None     # None runs all the stages
+repeat       = 3
+label        = ''
+database     = None     # e.g. {'user': 'omarson', 'password': '...', 'host': 'localhost', 'database': 'stkodatabase'}
+backend      = 'sqlite' # 'sqlite' or 'mysql'
+
+#%% ================================================================================
+# RUN THE BENCHMARKS
+# ==================================================================================
+if __name__ == '__main__':
+    runBenchmarks(
+        work_path    = work_path,
+        scale        = scale,
+        stages       = stages,
+        repeat       = repeat,
+        database     = database,
+        backend      = backend,
+        history_path = history_path,
+        label        = label)
+    history = loadHistory(history_path)
+    if len(history) > 1:
+        print(compareRuns(history).to_string(float_format='{:.4f}'.format))
+# %%